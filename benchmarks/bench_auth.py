@@ -0,0 +1,104 @@
+# Copyright (c) 2014 Yubico AB
+# All rights reserved.
+#
+#   Redistribution and use in source and binary forms, with or
+#   without modification, are permitted provided that the following
+#   conditions are met:
+#
+#    1. Redistributions of source code must retain the above copyright
+#       notice, this list of conditions and the following disclaimer.
+#    2. Redistributions in binary form must reproduce the above
+#       copyright notice, this list of conditions and the following
+#       disclaimer in the documentation and/or other materials provided
+#       with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+"""Measures the per-call cost of building request arguments.
+
+Compares the previous approach, which copied extra_args and called the auth
+plugin for every request, with the precomputed request template used by
+Client, for GET and JSON POST requests.
+
+    python benchmarks/bench_auth.py [--number N]
+"""
+
+from __future__ import print_function
+
+from u2fval_client.auth import ApiToken, HttpAuth
+from u2fval_client.client import Client
+import argparse
+import json
+import timeit
+
+EXTRA_ARGS = {'headers': {'User-Agent': 'bench'}, 'verify': True}
+
+
+class OldApiToken(object):
+    def __init__(self, api_token):
+        self._token = api_token
+
+    def __call__(self, kwargs):
+        headers = kwargs.get('headers', {})
+        headers['Authorization'] = 'Bearer %s' % self._token
+        kwargs['headers'] = headers
+        return kwargs
+
+
+def old_build_args(auth, extra_args, json_body=None, **kwargs):
+    args = dict(extra_args)
+    args.update(kwargs)
+    headers = dict(extra_args.get('headers', {}))
+    headers.update(kwargs.get('headers', {}))
+    args['headers'] = headers
+    args = auth(args)
+    if json_body is not None:
+        args['headers']['Content-type'] = 'application/json'
+        args['data'] = json.dumps(json_body)
+    return args
+
+
+def bench(func, number):
+    return min(timeit.repeat(func, number=number, repeat=3)) / number * 1e9
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--number', type=int, default=200000)
+    args = parser.parse_args()
+
+    body = {'signResponse': {}}
+    old_auth = OldApiToken('abc123')
+    cases = [
+        ('ApiToken', ApiToken('abc123'), old_auth),
+        ('HttpAuth', HttpAuth('user', 'pass'),
+         lambda kwargs: dict(kwargs, auth=('user', 'pass'))),
+    ]
+    print('%-20s %12s %12s' % ('case', 'before (ns)', 'after (ns)'))
+    for name, auth, old in cases:
+        client = Client('http://localhost/', auth=auth,
+                        extra_args=EXTRA_ARGS)
+        print('%-20s %12.0f %12.0f' % (
+            name + ' GET',
+            bench(lambda: old_build_args(old, EXTRA_ARGS), args.number),
+            bench(client._build_args, args.number)))
+        print('%-20s %12.0f %12.0f' % (
+            name + ' POST',
+            bench(lambda: old_build_args(old, EXTRA_ARGS, body),
+                  args.number),
+            bench(lambda: client._build_args(body), args.number)))
+
+
+if __name__ == '__main__':
+    main()
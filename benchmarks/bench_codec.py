@@ -0,0 +1,115 @@
+# Copyright (c) 2014 Yubico AB
+# All rights reserved.
+#
+#   Redistribution and use in source and binary forms, with or
+#   without modification, are permitted provided that the following
+#   conditions are met:
+#
+#    1. Redistributions of source code must retain the above copyright
+#       notice, this list of conditions and the following disclaimer.
+#    2. Redistributions in binary form must reproduce the above
+#       copyright notice, this list of conditions and the following
+#       disclaimer in the documentation and/or other materials provided
+#       with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+"""Measures the JSON encode and decode cost per client operation.
+
+For each available codec, times building the request body of
+register_complete and auth_complete (both by parsing and re-serializing the
+browser response, and by splicing it in with passthrough), and decoding
+typical responses.
+
+    python benchmarks/bench_codec.py [--number N]
+"""
+
+from __future__ import print_function
+
+from u2fval_client import codec
+from u2fval_client.client import Client
+import argparse
+import json
+import timeit
+
+REGISTER_RESPONSE = json.dumps({
+    'registrationData': 'BQ' + 'A' * 1000,
+    'clientData': 'eyJ0' + 'B' * 300,
+    'version': 'U2F_V2',
+})
+SIGN_RESPONSE = json.dumps({
+    'keyHandle': 'k' * 86,
+    'signatureData': 'AQ' + 'C' * 140,
+    'clientData': 'eyJ0' + 'D' * 300,
+})
+DEVICE = {
+    'handle': 'e' * 32,
+    'metadata': {'displayName': 'YubiKey', 'vendor': 'Yubico'},
+    'properties': {'name': 'Security key'},
+    'created': '2017-01-01T00:00:00Z',
+    'lastUsed': '2017-01-02T00:00:00Z',
+    'compromised': False,
+}
+RESPONSES = {
+    'auth_begin': {
+        'challenge': 'f' * 43,
+        'registeredKeys': [{'keyHandle': 'k' * 86, 'version': 'U2F_V2',
+                            'appId': 'https://example.com'}] * 3,
+    },
+    'auth_complete': DEVICE,
+    'list_devices': [DEVICE] * 10,
+}
+
+
+def bench(func, number):
+    return min(timeit.repeat(func, number=number, repeat=3)) / number * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--number', type=int, default=20000)
+    args = parser.parse_args()
+
+    codecs = [('json', codec.JsonCodec())]
+    try:
+        codecs.append(('orjson', codec.OrjsonCodec()))
+    except ImportError:
+        pass
+
+    print('%-40s %-8s %10s' % ('operation', 'codec', 'us/call'))
+    for name, impl in codecs:
+        for passthrough in (False, True):
+            client = Client('http://localhost/', codec=impl,
+                            passthrough=passthrough)
+            mode = 'passthrough' if passthrough else 'reparse'
+            for op, key, response in (
+                    ('register_complete', 'registerResponse',
+                     REGISTER_RESPONSE),
+                    ('auth_complete', 'signResponse', SIGN_RESPONSE)):
+                def encode():
+                    data = client._completion(key, response, {'a': 1})
+                    if not isinstance(data, bytes):
+                        impl.dumps(data)
+                print('%-40s %-8s %10.2f' % (
+                    'encode %s (%s)' % (op, mode), name,
+                    bench(encode, args.number)))
+        for op, obj in sorted(RESPONSES.items()):
+            data = impl.dumps(obj)
+            print('%-40s %-8s %10.2f' % (
+                'decode %s' % op, name,
+                bench(lambda: impl.loads(data), args.number)))
+
+
+if __name__ == '__main__':
+    main()
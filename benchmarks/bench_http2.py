@@ -0,0 +1,92 @@
+# Copyright (c) 2014 Yubico AB
+# All rights reserved.
+#
+#   Redistribution and use in source and binary forms, with or
+#   without modification, are permitted provided that the following
+#   conditions are met:
+#
+#    1. Redistributions of source code must retain the above copyright
+#       notice, this list of conditions and the following disclaimer.
+#    2. Redistributions in binary form must reproduce the above
+#       copyright notice, this list of conditions and the following
+#       disclaimer in the documentation and/or other materials provided
+#       with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+"""Compares the default HTTP/1.1 transport with HTTP/2 under concurrency.
+
+Runs interleaved auth_begin and auth_complete calls from many threads
+against local fake servers with some latency, first over pooled HTTP/1.1
+connections, then multiplexed over HTTP/2 (requires httpx and h2), and
+reports throughput, latency percentiles and the number of connections
+opened.
+
+    python benchmarks/bench_http2.py [--requests N] [--concurrency N]
+        [--latency S] [--connections N]
+"""
+
+from __future__ import print_function
+
+from u2fval_client.client import Client
+from u2fval_client.fake import FakeServer
+from u2fval_client.http2 import Http2Transport
+import argparse
+import itertools
+import run
+import stub
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--concurrency', type=int, default=64)
+    parser.add_argument('--latency', type=float, default=0.005,
+                        help='server latency in seconds')
+    parser.add_argument('--connections', type=int, default=64,
+                        help='maximum number of connections per transport')
+    args = parser.parse_args()
+
+    calls = itertools.cycle([lambda c: c.auth_begin(run.USER),
+                             lambda c: c.auth_complete(run.USER, '{}')])
+
+    def func(client):
+        return next(calls)(client)
+
+    results = []
+    for name, http2 in [('http/1.1', False), ('http/2', True)]:
+        server = run.make_server(
+            args.latency,
+            server_class=stub.Http2FakeServer if http2 else FakeServer)
+        server.start(subprocess=True)
+        if http2:
+            client = Client(server.endpoint, transport=Http2Transport(
+                args.connections, prior_knowledge=True))
+        else:
+            client = Client(server.endpoint, pool_maxsize=args.connections)
+        try:
+            with client:
+                results.append((name, run.measure_throughput(
+                    client, server, func, args.requests, args.concurrency)))
+        finally:
+            server.stop()
+
+    for name, result in results:
+        print('%-10s %8.1f ops/s  p50 %6.2f  p99 %6.2f ms  %4d connections'
+              % (name, result['ops_per_sec'], result['p50_ms'],
+                 result['p99_ms'], result['connections']))
+
+
+if __name__ == '__main__':
+    main()
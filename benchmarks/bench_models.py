@@ -0,0 +1,97 @@
+# Copyright (c) 2014 Yubico AB
+# All rights reserved.
+#
+#   Redistribution and use in source and binary forms, with or
+#   without modification, are permitted provided that the following
+#   conditions are met:
+#
+#    1. Redistributions of source code must retain the above copyright
+#       notice, this list of conditions and the following disclaimer.
+#    2. Redistributions in binary form must reproduce the above
+#       copyright notice, this list of conditions and the following
+#       disclaimer in the documentation and/or other materials provided
+#       with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+"""Compares the memory used by cached devices as dicts and as models.
+
+Holds N devices (100000 by default) in memory as plain dicts (as returned
+by Client), as models created from those dicts, as models loaded from
+to_bytes() output with their nested fields still undecoded, and as the
+to_bytes() output itself.
+
+    python benchmarks/bench_models.py [--devices N]
+"""
+
+from __future__ import print_function
+
+from u2fval_client.models import Device
+import argparse
+import gc
+import json
+import tracemalloc
+
+
+def make_device(i):
+    # Decode from JSON, as the client does, so no strings are shared.
+    return json.loads(json.dumps({
+        'handle': '%032x' % i,
+        'created': '2017-01-01T00:00:00Z',
+        'lastUsed': '2017-01-02T00:00:00Z',
+        'compromised': False,
+        'metadata': {
+            'displayName': 'YubiKey 4',
+            'vendor': 'Yubico',
+            'url': 'https://www.yubico.com',
+            'icon': 'data:image/png;base64,' + 'A' * 64,
+        },
+        'properties': {'name': 'Key %d' % i},
+    }))
+
+
+def measure(build):
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    data = build()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return data, after - before
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--devices', type=int, default=100000)
+    args = parser.parse_args()
+    n = args.devices
+
+    dicts, dict_size = measure(lambda: [make_device(i) for i in range(n)])
+    blobs = [Device.from_dict(d).to_bytes() for d in dicts]
+    results = [
+        ('dict', dict_size),
+        ('model (from_dict)', measure(
+            lambda: [Device.from_dict(make_device(i)) for i in range(n)])[1]),
+        ('model (from_bytes)', measure(
+            lambda: [Device.from_bytes(b) for b in blobs])[1]),
+        ('to_bytes()', measure(
+            lambda: [bytes(bytearray(b)) for b in blobs])[1]),
+    ]
+    print('%-20s %12s %10s' % ('representation', 'total', 'per device'))
+    for name, size in results:
+        print('%-20s %10.1f MB %8d B' % (name, size / 1e6, size // n))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+# Copyright (c) 2014 Yubico AB
+# All rights reserved.
+#
+#   Redistribution and use in source and binary forms, with or
+#   without modification, are permitted provided that the following
+#   conditions are met:
+#
+#    1. Redistributions of source code must retain the above copyright
+#       notice, this list of conditions and the following disclaimer.
+#    2. Redistributions in binary form must reproduce the above
+#       copyright notice, this list of conditions and the following
+#       disclaimer in the documentation and/or other materials provided
+#       with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+"""Compares request throughput with and without connection pooling.
+
+Starts a local fake server speaking HTTP/1.1 keep-alive and drives it with a
+number of threads, first opening a new connection per call (the behaviour of
+calling requests.request directly), then through a pooled Client.
+
+    python benchmarks/bench_pool.py [--requests N] [--threads N]
+"""
+
+from __future__ import print_function
+
+from u2fval_client.client import Client
+from u2fval_client.fake import FakeServer
+from concurrent.futures import ThreadPoolExecutor
+import argparse
+import requests
+import time
+
+
+def run(func, server, n_requests, n_threads):
+    connections = server.stats()['connections']
+    start = time.time()
+    with ThreadPoolExecutor(n_threads) as executor:
+        list(executor.map(lambda _: func(), range(n_requests)))
+    elapsed = time.time() - start
+    return n_requests / elapsed, server.stats()['connections'] - connections
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--threads', type=int, default=8)
+    args = parser.parse_args()
+
+    server = FakeServer().start(subprocess=True)
+
+    def unpooled():
+        requests.request('GET', server.endpoint).json()
+
+    with Client(server.endpoint, pool_maxsize=args.threads) as client:
+        results = [
+            ('unpooled', run(unpooled, server, args.requests, args.threads)),
+            ('pooled', run(client.get_trusted_facets, server,
+                           args.requests, args.threads)),
+        ]
+
+    server.stop()
+    for name, (rate, connections) in results:
+        print('%-10s %8.1f req/s %6d connections' % (name, rate, connections))
+
+
+if __name__ == '__main__':
+    main()
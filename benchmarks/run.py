@@ -0,0 +1,204 @@
+# Copyright (c) 2014 Yubico AB
+# All rights reserved.
+#
+#   Redistribution and use in source and binary forms, with or
+#   without modification, are permitted provided that the following
+#   conditions are met:
+#
+#    1. Redistributions of source code must retain the above copyright
+#       notice, this list of conditions and the following disclaimer.
+#    2. Redistributions in binary form must reproduce the above
+#       copyright notice, this list of conditions and the following
+#       disclaimer in the documentation and/or other materials provided
+#       with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+"""Runs every Client operation against a local fake server.
+
+For each operation, reports throughput, latency percentiles, failed calls
+and the number of new connections opened while making the requests from a
+number of threads, along with the peak memory allocated and the number of
+memory blocks retained per call, measured on sequential calls. Results are
+printed, and optionally written as JSON for comparison between runs.
+
+The server is a u2fval_client.fake.FakeServer running in a subprocess, so
+that it does not affect the measurements. It is populated with enough
+devices and users for every unregister and delete_user call to succeed.
+
+    python benchmarks/run.py [--requests N] [--concurrency N]
+        [--latency S] [--jitter S] [--error-rate F] [--output FILE] [OP...]
+"""
+
+from __future__ import print_function, division
+
+from u2fval_client import __version__, exc
+from u2fval_client.client import Client
+from u2fval_client.fake import FakeServer, constant, uniform
+from concurrent.futures import ThreadPoolExecutor
+import argparse
+import itertools
+import json
+import platform
+import sys
+import time
+import tracemalloc
+
+USER = 'user'
+HANDLE = 'e' * 32
+_unregistered = itertools.count()
+_deleted = itertools.count()
+OPERATIONS = [
+    ('get_trusted_facets', lambda c: c.get_trusted_facets()),
+    ('list_devices', lambda c: c.list_devices(USER)),
+    ('get_device', lambda c: c.get_device(USER, HANDLE)),
+    ('get_certificate', lambda c: c.get_certificate(USER, HANDLE)),
+    ('update_device', lambda c: c.update_device(USER, HANDLE,
+                                                {'name': 'key'})),
+    ('register_begin', lambda c: c.register_begin(USER)),
+    ('register_complete', lambda c: c.register_complete('new_user', '{}')),
+    ('auth_begin', lambda c: c.auth_begin(USER)),
+    ('auth_complete', lambda c: c.auth_complete(USER, '{}')),
+    ('unregister', lambda c: c.unregister(
+        'unregister', 'h%d' % next(_unregistered))),
+    ('delete_user', lambda c: c.delete_user('delete%d' % next(_deleted))),
+]
+
+
+def make_server(latency=0, jitter=0, error_rate=0, calls=0,
+                server_class=FakeServer):
+    """Creates a fake server with USER owning three devices, and enough
+    devices and users for calls calls to unregister and delete_user.
+    """
+    if jitter:
+        latency = uniform(latency, latency + jitter)
+    elif latency:
+        latency = constant(latency)
+    else:
+        latency = None
+    server = server_class(latency=latency,
+                          errors={503: error_rate} if error_rate else None)
+    server.add_device(USER, HANDLE, {'name': 'Security key'})
+    server.add_device(USER)
+    server.add_device(USER)
+    for i in range(calls):
+        server.add_device('unregister', 'h%d' % i)
+        server.add_device('delete%d' % i)
+    return server
+
+
+def _percentile(values, p):
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+
+def _timed(func, client):
+    start = time.perf_counter()
+    try:
+        func(client)
+        failed = False
+    except exc.U2fValClientException:
+        failed = True
+    return time.perf_counter() - start, failed
+
+
+def measure_throughput(client, server, func, n_requests, concurrency):
+    connections = server.stats()['connections']
+    start = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as executor:
+        results = list(executor.map(lambda _: _timed(func, client),
+                                    range(n_requests)))
+    elapsed = time.perf_counter() - start
+    latencies = sorted(r[0] for r in results)
+    return {
+        'ops_per_sec': n_requests / elapsed,
+        'errors': sum(1 for r in results if r[1]),
+        'p50_ms': _percentile(latencies, 0.5) * 1000,
+        'p95_ms': _percentile(latencies, 0.95) * 1000,
+        'p99_ms': _percentile(latencies, 0.99) * 1000,
+        'max_ms': latencies[-1] * 1000,
+        'connections': server.stats()['connections'] - connections,
+    }
+
+
+def measure_allocations(client, func, n_calls):
+    _timed(func, client)  # Warm up
+    blocks = sys.getallocatedblocks()
+    peak = 0
+    tracemalloc.start()
+    try:
+        for _ in range(n_calls):
+            tracemalloc.reset_peak()
+            current = tracemalloc.get_traced_memory()[0]
+            _timed(func, client)
+            peak += tracemalloc.get_traced_memory()[1] - current
+    finally:
+        tracemalloc.stop()
+    return {
+        'peak_bytes_per_call': peak / n_calls,
+        'retained_blocks_per_call': (sys.getallocatedblocks() - blocks) /
+        n_calls,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('ops', nargs='*', metavar='OP',
+                        help='operations to run (default: all)')
+    parser.add_argument('--requests', type=int, default=1000)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--allocation-calls', type=int, default=100)
+    parser.add_argument('--latency', type=float, default=0,
+                        help='server latency in seconds')
+    parser.add_argument('--jitter', type=float, default=0,
+                        help='additional random server latency in seconds')
+    parser.add_argument('--error-rate', type=float, default=0,
+                        help='fraction of requests failing with 503')
+    parser.add_argument('--output', help='write results as JSON to a file')
+    args = parser.parse_args()
+
+    operations = [(n, f) for n, f in OPERATIONS
+                  if not args.ops or n in args.ops]
+    server = make_server(args.latency, args.jitter, args.error_rate,
+                         args.requests + args.allocation_calls + 1)
+    server.start(subprocess=True)
+    results = {}
+    try:
+        with Client(server.endpoint, pool_maxsize=args.concurrency) as client:
+            for name, func in operations:
+                result = measure_throughput(client, server, func,
+                                            args.requests, args.concurrency)
+                result.update(measure_allocations(client, func,
+                                                  args.allocation_calls))
+                results[name] = result
+                print('%-18s %8.1f ops/s  p50 %6.2f  p99 %6.2f ms  '
+                      '%4d errors  %4d conns  %7.0f B/call' % (
+                          name, result['ops_per_sec'], result['p50_ms'],
+                          result['p99_ms'], result['errors'],
+                          result['connections'],
+                          result['peak_bytes_per_call']))
+    finally:
+        server.stop()
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({
+                'version': __version__,
+                'python': platform.python_version(),
+                'config': vars(args),
+                'results': results,
+            }, f, indent=2, sort_keys=True)
+
+
+if __name__ == '__main__':
+    main()
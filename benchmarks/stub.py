@@ -0,0 +1,96 @@
+# Copyright (c) 2014 Yubico AB
+# All rights reserved.
+#
+#   Redistribution and use in source and binary forms, with or
+#   without modification, are permitted provided that the following
+#   conditions are met:
+#
+#    1. Redistributions of source code must retain the above copyright
+#       notice, this list of conditions and the following disclaimer.
+#    2. Redistributions in binary form must reproduce the above
+#       copyright notice, this list of conditions and the following
+#       disclaimer in the documentation and/or other materials provided
+#       with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+"""HTTP/2 variant of the fake U2FVAL server, used by bench_http2.py.
+
+Http2FakeServer is a u2fval_client.fake.FakeServer speaking HTTP/2 with
+prior knowledge (which requires the h2 package) instead of HTTP/1.1. Each
+request is answered by FakeServer, with its users, devices, latency and
+error injection, so delayed responses do not hold up other streams on the
+same connection.
+"""
+
+from u2fval_client.fake import FakeServer
+import asyncio
+
+
+class _H2Protocol(asyncio.Protocol):
+
+    def __init__(self, server):
+        import h2.config
+        import h2.connection
+        self._server = server
+        self._conn = h2.connection.H2Connection(h2.config.H2Configuration(
+            client_side=False, header_encoding='utf-8'))
+        self._streams = {}
+
+    def connection_made(self, transport):
+        self._transport = transport
+        self._server._connections.value += 1
+        self._conn.initiate_connection()
+        transport.write(self._conn.data_to_send())
+
+    def data_received(self, data):
+        import h2.events
+        for event in self._conn.receive_data(data):
+            if isinstance(event, h2.events.RequestReceived):
+                self._streams[event.stream_id] = (dict(event.headers), [])
+            elif isinstance(event, h2.events.DataReceived):
+                self._streams[event.stream_id][1].append(event.data)
+                self._conn.acknowledge_received_data(
+                    event.flow_controlled_length, event.stream_id)
+            elif isinstance(event, h2.events.StreamEnded):
+                headers, body = self._streams.pop(event.stream_id)
+                asyncio.ensure_future(self._respond(
+                    event.stream_id, headers, b''.join(body)))
+            elif isinstance(event, h2.events.ConnectionTerminated):
+                self._transport.close()
+        self._transport.write(self._conn.data_to_send())
+
+    async def _respond(self, stream_id, headers, body):
+        self._server._requests.value += 1
+        status, extra, content = await self._server._respond(
+            headers[':method'], headers[':path'], headers, body)
+        if self._transport.is_closing():
+            return
+        response = [(':status', str(status)),
+                    ('content-length', str(len(content)))]
+        response.extend((k.lower(), v) for k, v in extra.items())
+        self._conn.send_headers(stream_id, response, end_stream=not content)
+        if content:
+            self._conn.send_data(stream_id, content, end_stream=True)
+        self._transport.write(self._conn.data_to_send())
+
+
+class Http2FakeServer(FakeServer):
+
+    """FakeServer speaking HTTP/2 with prior knowledge."""
+
+    def _listen(self, loop):
+        return loop.run_until_complete(loop.create_server(
+            lambda: _H2Protocol(self), self._host, self._port,
+            backlog=self._backlog))
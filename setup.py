@@ -37,10 +37,20 @@ setup(
     maintainer_email='ossmaint@yubico.com',
     url='https://github.com/Yubico/u2fval-client-python',
     license='BSD 2 clause',
-    install_requires=['requests'],
-    test_suite='test',
+    install_requires=[
+        'requests',
+        'futures; python_version < "3.2"',
+    ],
+    extras_require={
+        'async': ['aiohttp'],
+        'fast': ['orjson'],
+        'http2': ['httpx[http2]'],
+        'compression': ['brotli', 'zstandard'],
+    },
+    test_suite='test.suite',
     tests_require=[
         'httpretty',
+        'mock; python_version < "3.3"',
     ],
     classifiers=[
         'License :: OSI Approved :: BSD License',
@@ -0,0 +1,17 @@
+import os
+import sys
+import unittest
+
+
+# Modules using async syntax, which Python versions before 3.5 cannot compile.
+_ASYNC_MODULES = ('test_aio',)
+
+
+def suite():
+    """Collects the test modules which can be imported by this Python."""
+    names = sorted(name[:-3] for name in os.listdir(os.path.dirname(__file__))
+                   if name.startswith('test_') and name.endswith('.py'))
+    if sys.version_info < (3, 5):
+        names = [name for name in names if name not in _ASYNC_MODULES]
+    return unittest.TestLoader().loadTestsFromNames(
+        [__name__ + '.' + name for name in names])
@@ -0,0 +1,219 @@
+import asyncio
+import json
+import unittest
+
+try:
+    from aiohttp import web
+    from aiohttp.test_utils import TestServer
+    from u2fval_client.aio import AsyncClient
+except ImportError:
+    web = None
+
+from u2fval_client import deadline
+from u2fval_client.auth import ApiToken, HttpAuth
+from u2fval_client.coalesce import AsyncSingleFlight
+from u2fval_client.exc import (
+    BadAuthException,
+    BadInputException,
+    NoEligableDevicesException,
+    ServerUnreachableException,
+    TimeoutException,
+    U2fValClientException,
+)
+
+
+class TestTaskLocal(unittest.TestCase):
+    def test_per_task(self):
+        local = deadline._TaskLocal()
+        token = local.set('thread')
+        steps = []
+
+        async def task(value, wait):
+            self.assertIsNone(local.get())
+            token = local.set(value)
+            await wait.wait()
+            steps.append(local.get())
+            local.reset(token)
+            self.assertIsNone(local.get())
+
+        async def main():
+            first, second = asyncio.Event(), asyncio.Event()
+            tasks = [asyncio.ensure_future(task('first', first)),
+                     asyncio.ensure_future(task('second', second))]
+            await asyncio.sleep(0)
+            # Reset out of order.
+            second.set()
+            await tasks[1]
+            first.set()
+            await tasks[0]
+            steps.append(local.get())
+
+        loop = asyncio.new_event_loop()
+        try:
+            loop.run_until_complete(main())
+        finally:
+            loop.close()
+        self.assertEqual(steps, ['second', 'first', None])
+        self.assertEqual(local.get(), 'thread')
+        local.reset(token)
+        self.assertIsNone(local.get())
+
+
+@unittest.skipIf(web is None, 'aiohttp not installed')
+class TestAsyncClient(unittest.TestCase):
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        self.requests = []
+        app = web.Application()
+        app.router.add_route('*', '/{tail:.*}', self._handle)
+        self.responses = {}
+        self.server = TestServer(app)
+        self.await_(self.server.start_server())
+        self.client = AsyncClient(str(self.server.make_url('/')))
+
+    def tearDown(self):
+        self.await_(self.client.close())
+        self.await_(self.server.close())
+        self.loop.close()
+
+    def await_(self, coro):
+        return self.loop.run_until_complete(coro)
+
+    async def _handle(self, request):
+        if request.path == '/slow':
+            await asyncio.sleep(1)
+        body = await request.read()
+        self.requests.append((request, body))
+        status, text = self.responses.get((request.method, request.path),
+                                          (404, ''))
+        return web.Response(status=status, text=text)
+
+    def respond(self, method, path, body='{}', status=200):
+        self.responses[(method, path)] = (status, body)
+
+    def test_get_trusted_facets(self):
+        self.respond('GET', '/', '{"trustedFacets": []}')
+        self.assertEqual(self.await_(self.client.get_trusted_facets()),
+                         {'trustedFacets': []})
+
+    def test_error_code(self):
+        self.respond('GET', '/', '{"errorCode": 10}', 400)
+        self.assertRaises(BadInputException,
+                          self.await_, self.client.get_trusted_facets())
+
+    def test_unauthorized(self):
+        self.respond('GET', '/', '', 401)
+        self.assertRaises(BadAuthException,
+                          self.await_, self.client.get_trusted_facets())
+
+    def test_not_found(self):
+        self.assertRaises(U2fValClientException,
+                          self.await_,
+                          self.client.list_devices('black_knight'))
+
+    def test_server_unreachable(self):
+        client = AsyncClient('http://127.0.0.1:1')
+        self.assertRaises(ServerUnreachableException,
+                          self.await_, client.get_trusted_facets())
+        self.await_(client.close())
+
+    def test_get_certificate(self):
+        self.respond('GET', '/black_knight/abc123', 'PEM')
+        self.assertEqual(
+            self.await_(self.client.get_certificate('black_knight', 'abc123')),
+            b'PEM')
+
+    def test_auth_begin_handles(self):
+        self.respond('GET', '/black_knight/sign')
+        self.assertEqual(self.await_(self.client.auth_begin(
+            'black_knight', challenge='c', handles=['a', 'b'])), {})
+        request = self.requests[-1][0]
+        self.assertEqual(request.query.getall('handle'), ['a', 'b'])
+        self.assertEqual(request.query['challenge'], 'c')
+
+    def test_auth_begin_no_devices(self):
+        self.respond('GET', '/black_knight/sign',
+                     '{"errorCode": 11, "errorData": false}', 400)
+        self.assertRaises(NoEligableDevicesException, self.await_,
+                          self.client.auth_begin('black_knight'))
+
+    def test_register_complete(self):
+        self.respond('POST', '/black_knight/register')
+        self.assertEqual(self.await_(self.client.register_complete(
+            'black_knight', '{}', {'name': 'key'})), {})
+        request, body = self.requests[-1]
+        self.assertEqual(json.loads(body.decode('utf-8')),
+                         {'registerResponse': {},
+                          'properties': {'name': 'key'}})
+        self.assertEqual(request.headers['Content-Type'], 'application/json')
+
+    def test_unregister(self):
+        self.respond('DELETE', '/black_knight/abc123', '', 204)
+        self.assertIsNone(
+            self.await_(self.client.unregister('black_knight', 'abc123')))
+
+    def test_api_token(self):
+        self.respond('GET', '/')
+        client = AsyncClient(str(self.server.make_url('/')),
+                             auth=ApiToken('abc123'))
+        self.await_(client.get_trusted_facets())
+        self.await_(client.close())
+        self.assertEqual(self.requests[-1][0].headers['Authorization'],
+                         'Bearer abc123')
+
+    def test_extra_headers_not_modified(self):
+        self.respond('GET', '/')
+        extra_args = {'headers': {'X-Foo': 'bar'}}
+        client = AsyncClient(str(self.server.make_url('/')),
+                             auth=ApiToken('abc123'), extra_args=extra_args)
+        self.await_(client.get_trusted_facets())
+        self.await_(client.close())
+        self.assertEqual(self.requests[-1][0].headers['X-Foo'], 'bar')
+        self.assertEqual(extra_args, {'headers': {'X-Foo': 'bar'}})
+
+    def test_http_auth(self):
+        self.respond('GET', '/')
+        client = AsyncClient(str(self.server.make_url('/')),
+                             auth=HttpAuth('black_knight', 'flesh wound'))
+        self.await_(client.get_trusted_facets())
+        self.await_(client.close())
+        self.assertTrue(self.requests[-1][0].headers['Authorization']
+                        .startswith('Basic '))
+
+    def test_single_flight(self):
+        self.respond('GET', '/black_knight/', '[]')
+        single_flight = AsyncSingleFlight()
+        client = AsyncClient(str(self.server.make_url('/')),
+                             single_flight=single_flight)
+
+        async def gather():
+            return await asyncio.gather(*[client.list_devices('black_knight')
+                                          for _ in range(5)])
+        self.assertEqual(self.await_(gather()), [[]] * 5)
+        self.await_(client.close())
+        self.assertEqual(len(self.requests), 1)
+        self.assertEqual(single_flight.stats(), {'calls': 1, 'coalesced': 4})
+
+    def test_single_flight_skipped_within_deadline(self):
+        self.respond('GET', '/black_knight/', '[]')
+        single_flight = AsyncSingleFlight()
+        client = AsyncClient(str(self.server.make_url('/')),
+                             single_flight=single_flight)
+
+        async def gather():
+            with deadline.scope(5):
+                return await asyncio.gather(
+                    *[client.list_devices('black_knight') for _ in range(2)])
+        self.assertEqual(self.await_(gather()), [[]] * 2)
+        self.await_(client.close())
+        self.assertEqual(len(self.requests), 2)
+        self.assertEqual(single_flight.stats(), {'calls': 0, 'coalesced': 0})
+
+    def test_deadline(self):
+        self.respond('GET', '/slow')
+
+        async def call():
+            with deadline.scope(0.1):
+                return await self.client._req(
+                    'GET', str(self.server.make_url('/slow')))
+        self.assertRaises(TimeoutException, self.await_, call())
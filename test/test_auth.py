@@ -1,8 +1,12 @@
+import threading
 import unittest
 
+from requests.auth import HTTPDigestAuth
+
 from u2fval_client.auth import (
     ApiToken,
     HttpAuth,
+    RotatingApiToken,
     no_auth,
 )
 
@@ -12,6 +16,9 @@ class TestNoAuth(unittest.TestCase):
         self.assertEqual(no_auth({}), {})
         self.assertEqual(no_auth({'foo': 'bar'}), {'foo': 'bar'})
 
+    def test_static_args(self):
+        self.assertEqual(no_auth.static_args(), {})
+
 
 class TestApiToken(unittest.TestCase):
     def setUp(self):
@@ -26,6 +33,10 @@ class TestApiToken(unittest.TestCase):
                          {'headers': {'Authorization': 'Bearer abc123',
                                       'foo': 'bar'}})
 
+    def test_static_args(self):
+        self.assertEqual(self.api_token.static_args(),
+                         {'headers': {'Authorization': 'Bearer abc123'}})
+
 
 class TestHttpAuth(unittest.TestCase):
     def test_without_authtype(self):
@@ -33,3 +44,44 @@ class TestHttpAuth(unittest.TestCase):
         self.assertEqual(http_auth({}),
                          {'auth': ('black_knight', 'Just a flesh wound!')})
 
+    def test_static_args_basic(self):
+        http_auth = HttpAuth('black_knight', 'Just a flesh wound!')
+        self.assertEqual(http_auth.static_args(), {'headers': {
+            'Authorization':
+            'Basic YmxhY2tfa25pZ2h0Okp1c3QgYSBmbGVzaCB3b3VuZCE='}})
+
+    def test_static_args_authtype(self):
+        http_auth = HttpAuth('black_knight', 'Just a flesh wound!',
+                             HTTPDigestAuth)
+        self.assertIsInstance(http_auth.static_args()['auth'], HTTPDigestAuth)
+
+
+class TestRotatingApiToken(unittest.TestCase):
+    def test_rotation(self):
+        tokens = iter(['first', 'second'])
+        auth = RotatingApiToken(lambda: next(tokens, 'second'),
+                                interval=0.01)
+        self.assertFalse(hasattr(auth, 'static_args'))
+        for _ in range(100):
+            header = auth({})['headers']['Authorization']
+            if header == 'Bearer second':
+                break
+            self.assertEqual(header, 'Bearer first')
+            threading.Event().wait(0.01)
+        auth.close()
+        self.assertEqual(header, 'Bearer second')
+
+    def test_failed_refresh_keeps_token(self):
+        calls = []
+
+        def fetch():
+            calls.append(1)
+            if len(calls) > 1:
+                raise ValueError('unavailable')
+            return 'first'
+        auth = RotatingApiToken(fetch, interval=0.01, retry_interval=0.01)
+        while len(calls) < 3:
+            threading.Event().wait(0.01)
+        auth.close()
+        self.assertEqual(auth({})['headers']['Authorization'],
+                         'Bearer first')
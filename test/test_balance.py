@@ -0,0 +1,132 @@
+import unittest
+
+try:
+    from unittest import mock
+except ImportError:
+    import mock
+
+import httpretty
+
+from u2fval_client.balance import (
+    BalancedClient,
+    Balancer,
+    EWMA,
+    LEAST_OUTSTANDING,
+)
+from u2fval_client.breaker import CircuitBreaker, CLOSED
+from u2fval_client.exc import (
+    CircuitOpenException,
+    ServerUnreachableException,
+    U2fValClientException,
+)
+
+
+class TestBalancer(unittest.TestCase):
+    def test_round_robin(self):
+        balancer = Balancer(['a', 'b'])
+        picked = []
+        for _ in range(4):
+            replica = balancer.acquire()
+            picked.append(replica.endpoint)
+            balancer.release(replica, 0.1)
+        self.assertEqual(picked, ['a', 'b', 'a', 'b'])
+
+    def test_least_outstanding(self):
+        balancer = Balancer(['a', 'b'], LEAST_OUTSTANDING)
+        first = balancer.acquire()
+        second = balancer.acquire()
+        self.assertNotEqual(first, second)
+        balancer.release(second, 0.1)
+        self.assertIs(balancer.acquire(), second)
+
+    def test_ewma(self):
+        balancer = Balancer(['a', 'b'], EWMA)
+        a, b = balancer.replicas
+        a.latency = 0.5
+        b.latency = 0.1
+        self.assertIs(balancer.acquire(), b)
+        balancer.release(b, 1.1)
+        self.assertAlmostEqual(b.latency, 0.4)
+        self.assertIs(balancer.acquire(), b)
+
+    def test_ejection(self):
+        balancer = Balancer(['a', 'b'], LEAST_OUTSTANDING)
+        a, b = balancer.replicas
+        balancer.acquire()
+        balancer.release(a, failed=True)
+        for _ in range(3):
+            self.assertIs(balancer.acquire(), b)
+
+    def test_all_ejected(self):
+        balancer = Balancer(['a'])
+        replica = balancer.acquire()
+        balancer.release(replica, failed=True)
+        self.assertIs(balancer.acquire(), replica)
+
+    def test_exclude(self):
+        balancer = Balancer(['a'])
+        self.assertIsNone(balancer.acquire(balancer.replicas))
+
+    def test_unknown_strategy(self):
+        self.assertRaises(ValueError, Balancer, ['a'], 'random')
+
+
+@httpretty.activate
+class TestBalancedClient(unittest.TestCase):
+    def setUp(self):
+        self.client = BalancedClient(['https://one', 'https://two'])
+
+    def test_spreads_requests(self):
+        httpretty.register_uri('GET', 'https://one/black_knight/', body='[]')
+        httpretty.register_uri('GET', 'https://two/black_knight/', body='[]')
+        self.client.list_devices('black_knight')
+        self.client.list_devices('black_knight')
+        self.assertEqual(
+            sorted(r.headers['Host'] for r in httpretty.latest_requests()),
+            ['one', 'two'])
+
+    def test_failover_on_server_error(self):
+        httpretty.register_uri('GET', 'https://one/', status=503)
+        httpretty.register_uri('GET', 'https://two/', body='{}')
+        for _ in range(3):
+            self.assertEqual(self.client.get_trusted_facets(), {})
+
+    def test_failover_on_unreachable(self):
+        httpretty.register_uri('GET', 'https://two/', body='{}')
+        for _ in range(3):
+            self.assertEqual(self.client.get_trusted_facets(), {})
+
+    def test_all_unreachable(self):
+        self.assertRaises(ServerUnreachableException,
+                          self.client.get_trusted_facets)
+
+    def test_post_not_failed_over(self):
+        httpretty.register_uri('POST', 'https://one/black_knight/sign',
+                               status=503)
+        httpretty.register_uri('POST', 'https://two/black_knight/sign',
+                               status=503)
+        self.assertRaises(U2fValClientException, self.client.auth_complete,
+                          'black_knight', '{}')
+        hosts = set(r.headers['Host'] for r in httpretty.latest_requests())
+        self.assertEqual(len(hosts), 1)
+
+    def test_unexpected_error_releases_replica(self):
+        self.client._transport.request = mock.Mock(
+            side_effect=ValueError('bad'))
+        self.assertRaises(ValueError, self.client.get_trusted_facets)
+        self.assertEqual(
+            [r.outstanding for r in self.client._balancer.replicas], [0, 0])
+
+    def test_health_check_uses_balancer(self):
+        breaker = CircuitBreaker(failure_threshold=1)
+        client = BalancedClient(['https://one', 'https://two'],
+                                breaker=breaker)
+        self.assertRaises(CircuitOpenException, client.get_trusted_facets)
+        httpretty.register_uri('GET', 'https://two/', body='{}')
+        httpretty.register_uri('GET', 'https://two/black_knight/',
+                               body='[]')
+        breaker._opened_at -= 60
+        self.assertEqual(client.list_devices('black_knight'), [])
+        self.assertEqual(breaker.state, CLOSED)
+        self.assertEqual(
+            [r.outstanding for r in client._balancer.replicas], [0, 0])
@@ -0,0 +1,107 @@
+import threading
+import time
+import unittest
+
+from u2fval_client.batch import BulkOperation, RateLimiter, run_batch
+from u2fval_client.exc import BadInputException, ServerUnreachableException
+
+
+class TestRunBatch(unittest.TestCase):
+    def test_results(self):
+        results = dict(run_batch(lambda x: x * 2, range(100), workers=4))
+        self.assertEqual(results, dict((x, x * 2) for x in range(100)))
+
+    def test_errors_inline(self):
+        def func(x):
+            if x % 2:
+                raise BadInputException('odd')
+            return x
+        results = dict(run_batch(func, range(10)))
+        self.assertIsInstance(results[1], BadInputException)
+        self.assertEqual(results[2], 2)
+
+    def test_other_errors_raised(self):
+        def func(x):
+            raise KeyError(x)
+        self.assertRaises(KeyError, list, run_batch(func, range(3)))
+
+    def test_items_consumed_lazily(self):
+        consumed = []
+        lock = threading.Lock()
+
+        def items():
+            for i in range(1000):
+                with lock:
+                    consumed.append(i)
+                yield i
+
+        results = run_batch(lambda x: x, items(), workers=2)
+        next(results)
+        self.assertLessEqual(len(consumed), 6)
+        results.close()
+
+    def test_client_errors_inline(self):
+        def func(x):
+            raise ServerUnreachableException('down')
+        item, result = next(run_batch(func, ['black_knight']))
+        self.assertEqual(item, 'black_knight')
+        self.assertIsInstance(result, ServerUnreachableException)
+
+
+class TestRateLimiter(unittest.TestCase):
+    def test_rate(self):
+        limiter = RateLimiter(100)
+        start = time.time()
+        for _ in range(11):
+            limiter.acquire()
+        self.assertGreaterEqual(time.time() - start, 0.09)
+
+    def test_burst(self):
+        limiter = RateLimiter(1, burst=5)
+        start = time.time()
+        for _ in range(5):
+            limiter.acquire()
+        self.assertLess(time.time() - start, 0.5)
+
+
+class TestBulkOperation(unittest.TestCase):
+    def test_report(self):
+        def func(x):
+            if x == 3:
+                raise BadInputException('bad')
+        operation = BulkOperation(func, range(10), workers=3)
+        failures = operation.run()
+        self.assertEqual([item for item, _ in failures], [3])
+        self.assertEqual(operation.report(),
+                         {'succeeded': 9, 'failed': 1, 'checkpoint': 10})
+
+    def test_checkpoint_resume(self):
+        seen = []
+        operation = BulkOperation(seen.append, range(10), workers=1)
+        for _ in operation:
+            if operation.checkpoint >= 5:
+                break
+        self.assertEqual(operation.checkpoint, 5)
+
+        resumed = BulkOperation(seen.append, range(10),
+                                checkpoint=operation.checkpoint)
+        resumed.run()
+        self.assertEqual(sorted(set(seen)), list(range(10)))
+        self.assertEqual(resumed.report(),
+                         {'succeeded': 5, 'failed': 0, 'checkpoint': 10})
+
+    def test_checkpoint_waits_for_earlier_items(self):
+        release = threading.Event()
+
+        def func(x):
+            if x == 0:
+                release.wait()
+
+        operation = BulkOperation(func, range(3), workers=3)
+        results = iter(operation)
+        next(results)
+        next(results)
+        self.assertEqual(operation.checkpoint, 0)
+        release.set()
+        list(results)
+        self.assertEqual(operation.checkpoint, 3)
@@ -0,0 +1,121 @@
+import unittest
+
+import httpretty
+
+try:
+    from unittest import mock
+except ImportError:
+    import mock
+
+from u2fval_client.breaker import CircuitBreaker, CLOSED, OPEN, HALF_OPEN
+from u2fval_client.client import Client
+from u2fval_client.exc import (
+    CircuitOpenException,
+    ServerUnreachableException,
+    U2fValClientException,
+)
+
+
+class TestCircuitBreaker(unittest.TestCase):
+    def setUp(self):
+        self.changes = []
+        self.breaker = CircuitBreaker(
+            failure_threshold=2, reset_timeout=60,
+            on_state_change=lambda old, new: self.changes.append((old, new)))
+
+    def test_opens_after_threshold(self):
+        self.breaker.record_failure()
+        self.breaker.before_request()
+        self.breaker.record_failure()
+        self.assertEqual(self.breaker.state, OPEN)
+        self.assertRaises(CircuitOpenException, self.breaker.before_request)
+        self.assertEqual(self.changes, [(CLOSED, OPEN)])
+
+    def test_success_resets_failures(self):
+        self.breaker.record_failure()
+        self.breaker.record_success()
+        self.breaker.record_failure()
+        self.assertEqual(self.breaker.state, CLOSED)
+
+    def test_success_while_open_ignored(self):
+        self.breaker.record_failure()
+        self.breaker.record_failure()
+        self.breaker.record_success()
+        self.assertEqual(self.breaker.state, OPEN)
+        self.assertRaises(CircuitOpenException, self.breaker.before_request)
+        self.assertEqual(self.changes, [(CLOSED, OPEN)])
+
+    def test_half_open_trial(self):
+        self.breaker.record_failure()
+        self.breaker.record_failure()
+        self.breaker._opened_at -= 60
+        self.breaker.before_request()
+        self.assertEqual(self.breaker.state, HALF_OPEN)
+        self.assertRaises(CircuitOpenException, self.breaker.before_request)
+        self.breaker.record_failure()
+        self.assertEqual(self.breaker.state, OPEN)
+        self.assertEqual(self.changes, [(CLOSED, OPEN), (OPEN, HALF_OPEN),
+                                        (HALF_OPEN, OPEN)])
+
+    def test_probe(self):
+        self.breaker.record_failure()
+        self.breaker.record_failure()
+        self.breaker._opened_at -= 60
+        probes = []
+        self.breaker.before_request(lambda: probes.append(1))
+        self.assertEqual(probes, [1])
+        self.assertEqual(self.breaker.state, CLOSED)
+
+    def test_failed_probe(self):
+        self.breaker.record_failure()
+        self.breaker.record_failure()
+        self.breaker._opened_at -= 60
+
+        def probe():
+            raise ServerUnreachableException('down')
+        self.assertRaises(ServerUnreachableException,
+                          self.breaker.before_request, probe)
+        self.assertEqual(self.breaker.state, OPEN)
+
+
+@httpretty.activate
+class TestClientBreaker(unittest.TestCase):
+    def setUp(self):
+        self.breaker = CircuitBreaker(failure_threshold=2)
+        self.client = Client('https://example', breaker=self.breaker)
+
+    def test_server_errors_open_circuit(self):
+        httpretty.register_uri('GET', 'https://example/', status=503)
+        for _ in range(2):
+            self.assertRaises(U2fValClientException,
+                              self.client.get_trusted_facets)
+        self.assertRaises(CircuitOpenException,
+                          self.client.get_trusted_facets)
+        self.assertEqual(len(httpretty.latest_requests()), 2)
+
+    def test_unreachable_opens_circuit(self):
+        for _ in range(2):
+            self.assertRaises(ServerUnreachableException,
+                              self.client.get_trusted_facets)
+        self.assertEqual(self.breaker.state, OPEN)
+
+    def test_health_check_closes_circuit(self):
+        httpretty.register_uri('GET', 'https://example/', body='{}')
+        httpretty.register_uri('GET', 'https://example/black_knight/',
+                               body='[]')
+        self.breaker.record_failure()
+        self.breaker.record_failure()
+        self.breaker._opened_at -= 60
+        self.assertEqual(self.client.list_devices('black_knight'), [])
+        self.assertEqual(self.breaker.state, CLOSED)
+        self.assertEqual([r.path for r in httpretty.latest_requests()],
+                         ['/', '/black_knight/'])
+
+    def test_unexpected_error_fails_trial(self):
+        breaker = CircuitBreaker(failure_threshold=1, probe=False)
+        client = Client('https://example', breaker=breaker)
+        breaker.record_failure()
+        breaker._opened_at -= 60
+        client._transport.request = mock.Mock(side_effect=ValueError('bad'))
+        self.assertRaises(ValueError, client.get_trusted_facets)
+        self.assertEqual(breaker.state, OPEN)
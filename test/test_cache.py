@@ -0,0 +1,359 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import httpretty
+
+from u2fval_client.cache import (DeviceCache, FacetCache, MemoryBackend,
+                                 MmapBackend, NegativeCache)
+from u2fval_client.client import Client
+from u2fval_client.exc import (
+    DeviceCompromisedException,
+    NoEligableDevicesException,
+    NotFoundException,
+)
+
+
+@httpretty.activate
+class TestFacetCache(unittest.TestCase):
+    def setUp(self):
+        self.cache = FacetCache(ttl=60, stale_ttl=60)
+        self.client = Client('https://example', facet_cache=self.cache)
+
+    def test_cached_within_ttl(self):
+        httpretty.register_uri('GET', 'https://example/', body='{"a": 1}')
+        self.assertEqual(self.client.get_trusted_facets(), {'a': 1})
+        self.assertEqual(self.client.get_trusted_facets(), {'a': 1})
+        self.assertEqual(len(httpretty.latest_requests()), 1)
+
+    def test_invalidate(self):
+        httpretty.register_uri('GET', 'https://example/', body='{"a": 1}')
+        self.client.get_trusted_facets()
+        self.cache.invalidate()
+        self.client.get_trusted_facets()
+        self.assertEqual(len(httpretty.latest_requests()), 2)
+
+    def test_stale_served_while_revalidating(self):
+        httpretty.register_uri('GET', 'https://example/', body='{"a": 1}',
+                               adding_headers={'ETag': '"v1"'})
+        self.client.get_trusted_facets()
+        httpretty.register_uri('GET', 'https://example/', body='{"a": 2}',
+                               adding_headers={'ETag': '"v2"'})
+        self.cache._fetched -= 90
+        self.assertEqual(self.client.get_trusted_facets(), {'a': 1})
+        self.cache._thread.join()
+        req = httpretty.last_request()
+        self.assertEqual(req.headers['If-None-Match'], '"v1"')
+        self.assertEqual(self.client.get_trusted_facets(), {'a': 2})
+
+    def test_not_modified(self):
+        httpretty.register_uri('GET', 'https://example/', body='{"a": 1}',
+                               adding_headers={'ETag': '"v1"'})
+        self.client.get_trusted_facets()
+        httpretty.register_uri('GET', 'https://example/', body='',
+                               status=304)
+        self.cache._fetched -= 150
+        self.assertEqual(self.client.get_trusted_facets(), {'a': 1})
+        self.assertEqual(httpretty.last_request().headers['If-None-Match'],
+                         '"v1"')
+        self.assertEqual(self.client.get_trusted_facets(), {'a': 1})
+        self.assertEqual(len(httpretty.latest_requests()), 2)
+
+    def test_shared_backend(self):
+        httpretty.register_uri('GET', 'https://example/', body='{"a": 1}')
+        backend = MemoryBackend()
+        self.cache._backend = backend
+        self.client.get_trusted_facets()
+        other = Client('https://example',
+                       facet_cache=FacetCache(ttl=60, backend=backend))
+        self.assertEqual(other.get_trusted_facets(), {'a': 1})
+        self.assertEqual(len(httpretty.latest_requests()), 1)
+
+
+class TestMemoryBackend(unittest.TestCase):
+    def test_lru_eviction(self):
+        backend = MemoryBackend(maxsize=2)
+        backend.set('a', 1)
+        backend.set('b', 2)
+        backend.get('a')
+        backend.set('c', 3)
+        self.assertEqual(backend.get('a'), 1)
+        self.assertIsNone(backend.get('b'))
+        self.assertEqual(backend.get('c'), 3)
+        self.assertEqual(backend.evictions, 1)
+
+    def test_expiry(self):
+        backend = MemoryBackend(ttl=-1)
+        backend.set('a', 1)
+        self.assertIsNone(backend.get('a'))
+
+    def test_zero_ttl(self):
+        backend = MemoryBackend(ttl=60)
+        backend.set('a', 1, ttl=0)
+        self.assertIsNone(backend.get('a'))
+
+    def test_delete(self):
+        backend = MemoryBackend()
+        backend.set('a', 1)
+        backend.delete('a')
+        self.assertIsNone(backend.get('a'))
+
+    def test_set_after_delete_skipped(self):
+        backend = MemoryBackend()
+        generation = backend.generation('a')
+        backend.delete('a')
+        backend.set('a', 1, generation=generation)
+        self.assertIsNone(backend.get('a'))
+        backend.set('a', 1, generation=backend.generation('a'))
+        self.assertEqual(backend.get('a'), 1)
+
+
+@unittest.skipUnless(hasattr(os, 'fork'), 'Requires a POSIX system')
+class TestMmapBackend(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, 'cache')
+        self.backend = MmapBackend(self.path, slots=16, slot_size=256)
+
+    def tearDown(self):
+        self.backend.close()
+        shutil.rmtree(self.dir)
+
+    def test_set_get_delete(self):
+        self.backend.set('a', {'devices': [{'handle': 'abc'}]})
+        self.backend.set('b', 2)
+        self.assertEqual(self.backend.get('a'),
+                         {'devices': [{'handle': 'abc'}]})
+        self.assertEqual(self.backend.get('b'), 2)
+        self.backend.set('a', 3)
+        self.assertEqual(self.backend.get('a'), 3)
+        self.backend.delete('a')
+        self.assertIsNone(self.backend.get('a'))
+        self.assertEqual(self.backend.get('b'), 2)
+
+    def test_expiry(self):
+        self.backend.set('a', 1, ttl=-1)
+        self.assertIsNone(self.backend.get('a'))
+
+    def test_too_large(self):
+        self.backend.set('a', 1)
+        self.backend.set('a', 'x' * 256)
+        self.assertIsNone(self.backend.get('a'))
+
+    def test_eviction(self):
+        for i in range(32):
+            self.backend.set(str(i), i)
+        self.assertEqual(self.backend.get('31'), 31)
+        self.assertEqual(self.backend.evictions, 16)
+
+    def test_shared_between_instances(self):
+        self.backend.set('a', 1)
+        other = MmapBackend(self.path, slots=16, slot_size=256)
+        self.assertEqual(other.get('a'), 1)
+        other.close()
+        self.assertRaises(ValueError, MmapBackend, self.path, slots=8)
+
+    def test_fork(self):
+        self.backend.set('a', 1)
+        pid = os.fork()
+        if pid == 0:
+            try:
+                self.backend.set('b', self.backend.get('a') + 1)
+            finally:
+                os._exit(0)
+        os.waitpid(pid, 0)
+        self.assertEqual(self.backend.get('b'), 2)
+
+    def test_set_after_delete_in_child_skipped(self):
+        generation = self.backend.generation('a')
+        pid = os.fork()
+        if pid == 0:
+            try:
+                MmapBackend(self.path, slots=16, slot_size=256).delete('a')
+            finally:
+                os._exit(0)
+        os.waitpid(pid, 0)
+        self.backend.set('a', 1, generation=generation)
+        self.assertIsNone(self.backend.get('a'))
+        self.backend.set('a', 1, generation=self.backend.generation('a'))
+        self.assertEqual(self.backend.get('a'), 1)
+
+    def test_device_cache(self):
+        cache = DeviceCache(backend=self.backend)
+        cache.set_devices('user', [{'handle': 'abc'}])
+        other = DeviceCache(backend=MmapBackend(self.path, slots=16,
+                                                slot_size=256))
+        self.assertEqual(other.get_device('user', 'abc'), {'handle': 'abc'})
+        generation = cache.generation('user')
+        other.invalidate('user')
+        self.assertIsNone(cache.get_devices('user'))
+        cache.set_devices('user', [{'handle': 'abc'}], generation)
+        self.assertIsNone(cache.get_devices('user'))
+
+
+DEVICES = '[{"handle": "abc123"}, {"handle": "def456"}]'
+
+
+@httpretty.activate
+class TestDeviceCache(unittest.TestCase):
+    def setUp(self):
+        self.cache = DeviceCache()
+        self.client = Client('https://example', device_cache=self.cache)
+
+    def test_list_devices_cached(self):
+        httpretty.register_uri('GET', 'https://example/black_knight/',
+                               body=DEVICES)
+        self.client.list_devices('black_knight')
+        self.assertEqual(len(self.client.list_devices('black_knight')), 2)
+        self.assertEqual(len(httpretty.latest_requests()), 1)
+        self.assertEqual(self.cache.stats(),
+                         {'hits': 1, 'misses': 1, 'evictions': 0})
+
+    def test_get_device_from_list(self):
+        httpretty.register_uri('GET', 'https://example/black_knight/',
+                               body=DEVICES)
+        self.client.list_devices('black_knight')
+        self.assertEqual(self.client.get_device('black_knight', 'def456'),
+                         {'handle': 'def456'})
+        self.assertEqual(len(httpretty.latest_requests()), 1)
+
+    def test_get_device_cached(self):
+        httpretty.register_uri('GET', 'https://example/black_knight/abc123',
+                               body='{"handle": "abc123"}')
+        self.client.get_device('black_knight', 'abc123')
+        self.client.get_device('black_knight', 'abc123')
+        self.assertEqual(len(httpretty.latest_requests()), 1)
+
+    def test_unregister_invalidates(self):
+        httpretty.register_uri('GET', 'https://example/black_knight/',
+                               body=DEVICES)
+        httpretty.register_uri('DELETE',
+                               'https://example/black_knight/abc123',
+                               body='', status=204)
+        self.client.list_devices('black_knight')
+        self.client.unregister('black_knight', 'abc123')
+        self.client.list_devices('black_knight')
+        self.assertEqual(len(httpretty.latest_requests()), 3)
+
+    def test_failed_auth_complete_invalidates(self):
+        httpretty.register_uri('GET', 'https://example/black_knight/',
+                               body=DEVICES)
+        httpretty.register_uri('POST', 'https://example/black_knight/sign',
+                               body='{"errorCode": 12}', status=400)
+        self.client.list_devices('black_knight')
+        self.assertRaises(DeviceCompromisedException,
+                          self.client.auth_complete,
+                          'black_knight', '{}')
+        self.assertIsNone(self.cache.get_devices('black_knight'))
+
+    def test_invalidated_during_fetch(self):
+        def respond(request, uri, headers):
+            # As done by a concurrent unregister of the same user.
+            self.cache.invalidate('black_knight')
+            return [200, headers, DEVICES]
+        httpretty.register_uri('GET', 'https://example/black_knight/',
+                               body=respond)
+        self.client.list_devices('black_knight')
+        self.assertIsNone(self.cache.get_devices('black_knight'))
+
+    def test_set_after_invalidate_skipped(self):
+        generation = self.cache.generation('black_knight')
+        self.cache.invalidate('black_knight')
+        self.cache.set_device('black_knight', 'abc123', {}, generation)
+        self.assertIsNone(self.cache.get_device('black_knight', 'abc123'))
+        self.cache.set_device('black_knight', 'abc123', {},
+                              self.cache.generation('black_knight'))
+        self.assertEqual(self.cache.get_device('black_knight', 'abc123'), {})
+
+    def test_ttl_with_backend(self):
+        cache = DeviceCache(ttl=-1, backend=MemoryBackend(ttl=60))
+        cache.set_devices('black_knight', [])
+        self.assertIsNone(cache.get_devices('black_knight'))
+
+
+NO_DEVICES = '{"errorCode": 11, "errorMessage": "No devices"}'
+
+
+@httpretty.activate
+class TestNegativeCache(unittest.TestCase):
+    def setUp(self):
+        self.cache = NegativeCache()
+        self.client = Client('https://example', negative_cache=self.cache)
+
+    def test_no_devices_cached(self):
+        httpretty.register_uri('GET', 'https://example/black_knight/sign',
+                               body=NO_DEVICES, status=400)
+        for _ in range(3):
+            self.assertRaises(NoEligableDevicesException,
+                              self.client.auth_begin, 'black_knight')
+        self.assertEqual(len(httpretty.latest_requests()), 1)
+        stats = self.cache.stats()
+        self.assertEqual((stats['hits'], stats['misses']), (2, 1))
+        self.assertAlmostEqual(stats['hit_rate'], 2 / 3.0)
+
+    def test_unknown_user_cached(self):
+        httpretty.register_uri('GET', 'https://example/arthur/', status=404)
+        self.assertRaises(NotFoundException, self.client.list_devices,
+                          'arthur')
+        self.assertRaises(NotFoundException, self.client.list_devices,
+                          'arthur')
+        self.assertEqual(len(httpretty.latest_requests()), 1)
+
+    def test_ineligible_devices_not_cached(self):
+        httpretty.register_uri(
+            'GET', 'https://example/black_knight/sign', status=400,
+            body='{"errorCode": 11, "errorData": ["abc123"]}')
+        for _ in range(2):
+            self.assertRaises(NoEligableDevicesException,
+                              self.client.auth_begin, 'black_knight')
+        self.assertEqual(len(httpretty.latest_requests()), 2)
+
+    def test_register_complete_invalidates(self):
+        httpretty.register_uri('GET', 'https://example/black_knight/sign',
+                               body=NO_DEVICES, status=400)
+        httpretty.register_uri('POST',
+                               'https://example/black_knight/register',
+                               body='{"handle": "abc123"}')
+        self.assertRaises(NoEligableDevicesException,
+                          self.client.auth_begin, 'black_knight')
+        self.client.register_complete('black_knight', '{}')
+        httpretty.register_uri('GET', 'https://example/black_knight/sign',
+                               body='{"challenge": "c"}')
+        self.assertEqual(self.client.auth_begin('black_knight'),
+                         {'challenge': 'c'})
+
+    def test_external_invalidation(self):
+        httpretty.register_uri('GET', 'https://example/black_knight/sign',
+                               body=NO_DEVICES, status=400)
+        self.assertRaises(NoEligableDevicesException,
+                          self.client.auth_begin, 'black_knight')
+        self.cache.invalidate('black_knight')
+        self.assertRaises(NoEligableDevicesException,
+                          self.client.auth_begin, 'black_knight')
+        self.assertEqual(len(httpretty.latest_requests()), 2)
+
+    def test_invalidated_during_call(self):
+        def respond(request, uri, headers):
+            # As done by a concurrent register_complete of the same user.
+            self.cache.invalidate('black_knight')
+            return [400, headers, NO_DEVICES]
+        httpretty.register_uri('GET', 'https://example/black_knight/sign',
+                               body=respond)
+        self.assertRaises(NoEligableDevicesException,
+                          self.client.auth_begin, 'black_knight')
+        self.assertIsNone(self.cache.get('black_knight', 'auth_begin'))
+
+    def test_bounded(self):
+        cache = NegativeCache(maxsize=2)
+        for user in ['a', 'b', 'c']:
+            cache.add(user, 'list_devices', NotFoundException('Not found'))
+        self.assertIsNone(cache.get('a', 'list_devices'))
+        self.assertIsInstance(cache.get('c', 'list_devices'),
+                              NotFoundException)
+        self.assertEqual(cache.stats()['evictions'], 1)
+
+    def test_ttl_with_backend(self):
+        cache = NegativeCache(ttl=-1, backend=MemoryBackend(ttl=60))
+        cache.add('a', 'list_devices', NotFoundException('Not found'))
+        self.assertIsNone(cache.get('a', 'list_devices'))
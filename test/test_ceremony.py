@@ -0,0 +1,103 @@
+import threading
+import unittest
+
+try:
+    from unittest import mock
+except ImportError:
+    import mock
+
+from u2fval_client.ceremony import LoginCeremony, LoginState
+from u2fval_client.exc import (
+    NoEligableDevicesException,
+    ServerUnreachableException,
+)
+
+
+class TestLoginCeremony(unittest.TestCase):
+    def setUp(self):
+        self.client = mock.Mock()
+        self.client.auth_begin.return_value = {'challenge': 'c'}
+        self.client.list_devices.return_value = [{'handle': 'abc'}]
+        self.ceremony = LoginCeremony(self.client)
+
+    def tearDown(self):
+        self.ceremony.close()
+
+    def test_begin(self):
+        login = self.ceremony.begin('black_knight', {'a': 1})
+        self.assertEqual(login.sign_request.result(), {'challenge': 'c'})
+        self.assertTrue(login.has_devices())
+        self.assertIsNone(login.devices)
+        self.client.auth_begin.assert_called_once_with(
+            'black_knight', {'a': 1}, None, None)
+        self.assertFalse(self.client.list_devices.called)
+
+    def test_devices_fetched_concurrently(self):
+        started = threading.Event()
+        release = threading.Event()
+
+        def auth_begin(*args):
+            started.set()
+            release.wait(5)
+            return {'challenge': 'c'}
+        self.client.auth_begin.side_effect = auth_begin
+        login = self.ceremony.begin('black_knight', devices=True)
+        started.wait(5)
+        self.assertEqual(login.devices.result(5), [{'handle': 'abc'}])
+        release.set()
+        self.assertTrue(login.has_devices())
+
+    def test_no_devices(self):
+        started = threading.Event()
+        release = threading.Event()
+
+        def auth_begin(*args):
+            started.wait(5)
+            raise NoEligableDevicesException('No devices', [])
+
+        def list_devices(username):
+            started.set()
+            release.wait(5)
+            return []
+        self.client.auth_begin.side_effect = auth_begin
+        self.client.list_devices.side_effect = list_devices
+        login = self.ceremony.begin('black_knight', devices=True)
+        self.assertFalse(login.has_devices())
+        release.set()
+        self.assertEqual(login.devices.result(5), [])
+        self.client.list_devices.assert_called_once_with('black_knight')
+
+    def test_devices_skipped(self):
+        ceremony = LoginCeremony(self.client, workers=1)
+        self.client.auth_begin.side_effect = NoEligableDevicesException(
+            'No devices', [])
+        login = ceremony.begin('black_knight', devices=True)
+        self.assertEqual(login.devices.result(), [])
+        self.assertFalse(self.client.list_devices.called)
+        ceremony.close()
+
+    def test_ineligible_devices(self):
+        self.client.auth_begin.side_effect = NoEligableDevicesException(
+            'Compromised', [{'handle': 'abc'}])
+        login = self.ceremony.begin('black_knight')
+        self.assertTrue(login.has_devices())
+
+    def test_errors_propagate(self):
+        self.client.auth_begin.side_effect = ServerUnreachableException()
+        self.client.list_devices.side_effect = ServerUnreachableException()
+        login = self.ceremony.begin('black_knight', devices=True)
+        self.assertRaises(ServerUnreachableException, login.has_devices)
+        self.assertRaises(ServerUnreachableException, login.devices.result)
+
+    def test_complete(self):
+        login = self.ceremony.begin('black_knight', {'a': 1})
+        data = login.state.to_bytes()
+        self.assertEqual(data, b'["black_knight",{"a":1}]')
+        self.ceremony.complete(data, '{"signatureData": "x"}')
+        self.client.auth_complete.assert_called_once_with(
+            'black_knight', '{"signatureData": "x"}', {'a': 1})
+
+    def test_state_round_trip(self):
+        state = LoginState('black_knight')
+        self.assertEqual(state.to_bytes(), b'["black_knight"]')
+        self.assertEqual(LoginState.from_bytes(state.to_bytes()), state)
@@ -1,7 +1,17 @@
+import io
+import tarfile
+import threading
+import time
 import unittest
 
+try:
+    from unittest import mock
+except ImportError:
+    import mock
+
 import httpretty
 
+from u2fval_client.auth import ApiToken, HttpAuth
 from u2fval_client.client import (
     Client,
 )
@@ -90,3 +100,198 @@ class TestClient(unittest.TestCase):
         self.assertEqual(self.client.auth_complete('black_knight', '{}'), {})
         req = httpretty.last_request()
         self.assertEqual(req.parsed_body, {'signResponse': {}})
+
+
+class TestClientPool(unittest.TestCase):
+
+    def test_owns_session(self):
+        client = Client('https://example', pool_maxsize=4)
+        session = client._transport._get_session()
+        adapter = session.get_adapter('https://example/')
+        self.assertEqual(adapter._pool_maxsize, 4)
+        self.assertTrue(client._transport._owns_session)
+
+    def test_context_manager_closes_session(self):
+        with Client('https://example') as client:
+            session = client._transport._get_session()
+            session.close = mock.Mock()
+        session.close.assert_called_once_with()
+
+    def test_custom_session_not_closed(self):
+        session = mock.Mock()
+        with Client('https://example', session=session):
+            pass
+        self.assertFalse(session.close.called)
+
+    @httpretty.activate
+    def test_idle_connections_evicted(self):
+        httpretty.register_uri('GET', 'https://example/', body='{}')
+        client = Client('https://example', idle_timeout=60)
+        session = client._transport._get_session()
+        adapter = session.get_adapter('https://example/')
+        adapter.close = mock.Mock()
+
+        client.get_trusted_facets()
+        self.assertFalse(adapter.close.called)
+
+        client._last_used -= 120
+        client.get_trusted_facets()
+        adapter.close.assert_called_once_with()
+
+
+@httpretty.activate
+class TestClientBatch(unittest.TestCase):
+    def setUp(self):
+        self.client = Client('https://example')
+
+    def test_list_devices_many(self):
+        httpretty.register_uri('GET', 'https://example/black_knight/',
+                               body='[]')
+        httpretty.register_uri('GET', 'https://example/arthur/', status=404)
+        results = dict(self.client.list_devices_many(['black_knight',
+                                                      'arthur']))
+        self.assertEqual(results['black_knight'], [])
+        self.assertIsInstance(results['arthur'], U2fValClientException)
+
+    def test_get_device_many(self):
+        httpretty.register_uri('GET', 'https://example/black_knight/abc123',
+                               body='{"handle": "abc123"}')
+        results = list(self.client.get_device_many([('black_knight',
+                                                     'abc123')]))
+        self.assertEqual(results, [(('black_knight', 'abc123'),
+                                    {'handle': 'abc123'})])
+
+    def test_delete_user_many(self):
+        httpretty.register_uri('DELETE', 'https://example/black_knight/',
+                               body='', status=204)
+        httpretty.register_uri('DELETE', 'https://example/arthur/',
+                               status=404)
+        operation = self.client.delete_user_many(['black_knight', 'arthur'],
+                                                 rate=100)
+        failures = operation.run()
+        self.assertEqual([item for item, _ in failures], ['arthur'])
+        self.assertEqual(operation.report(),
+                         {'succeeded': 1, 'failed': 1, 'checkpoint': 2})
+
+    def test_unregister_many(self):
+        httpretty.register_uri('DELETE', 'https://example/black_knight/abc123',
+                               body='', status=204)
+        operation = self.client.unregister_many([('black_knight', 'abc123')])
+        self.assertEqual(operation.run(), [])
+
+
+@httpretty.activate
+class TestClientCertificates(unittest.TestCase):
+    def setUp(self):
+        self.client = Client('https://example')
+
+    def test_iter_certificate(self):
+        httpretty.register_uri('GET', 'https://example/black_knight/abc123',
+                               body=b'x' * 100)
+        chunks = list(self.client.iter_certificate('black_knight', 'abc123',
+                                                   chunk_size=30))
+        self.assertEqual(b''.join(chunks), b'x' * 100)
+        self.assertTrue(all(len(c) <= 30 for c in chunks))
+
+    def test_iter_certificate_not_found(self):
+        httpretty.register_uri('GET', 'https://example/black_knight/abc123',
+                               status=404)
+        self.assertRaises(U2fValClientException, self.client.iter_certificate,
+                          'black_knight', 'abc123')
+
+    def test_download_certificate(self):
+        httpretty.register_uri('GET', 'https://example/black_knight/abc123',
+                               body=b'PEM')
+        buf = io.BytesIO()
+        self.assertEqual(
+            self.client.download_certificate('black_knight', 'abc123', buf),
+            3)
+        self.assertEqual(buf.getvalue(), b'PEM')
+
+    def test_export_certificates(self):
+        httpretty.register_uri('GET', 'https://example/black_knight/',
+                               body='[{"handle": "a"}, {"handle": "b"}]')
+        httpretty.register_uri('GET', 'https://example/arthur/', status=404)
+        httpretty.register_uri('GET', 'https://example/black_knight/a',
+                               body=b'cert a')
+        httpretty.register_uri('GET', 'https://example/black_knight/b',
+                               status=500)
+        buf = io.BytesIO()
+        failures = self.client.export_certificates(['black_knight', 'arthur'],
+                                                   buf)
+        self.assertEqual(sorted((item for item, _ in failures), key=str),
+                         sorted(['arthur', ('black_knight', 'b')], key=str))
+        buf.seek(0)
+        archive = tarfile.open(fileobj=buf)
+        self.assertEqual(archive.getnames(), ['black_knight/a.crt'])
+        self.assertEqual(archive.extractfile('black_knight/a.crt').read(),
+                         b'cert a')
+
+    def test_export_certificates_shares_workers(self):
+        lock = threading.Lock()
+        in_flight = [0, 0]
+
+        def call(result):
+            with lock:
+                in_flight[0] += 1
+                in_flight[1] = max(in_flight)
+            time.sleep(0.01)
+            with lock:
+                in_flight[0] -= 1
+            return result
+
+        self.client.list_devices = lambda username: call(
+            [{'handle': h} for h in 'abc'])
+        self.client.get_certificate = lambda username, handle: call(b'PEM')
+        failures = self.client.export_certificates(
+            ['user%d' % i for i in range(8)], io.BytesIO(), workers=4)
+        self.assertEqual(failures, [])
+        self.assertLessEqual(in_flight[1], 4)
+
+
+@httpretty.activate
+class TestClientAuth(unittest.TestCase):
+    def setUp(self):
+        httpretty.register_uri('GET', 'https://example/', body='{}')
+        httpretty.register_uri('POST', 'https://example/black_knight/sign',
+                               body='{}')
+
+    def test_api_token(self):
+        client = Client('https://example', auth=ApiToken('abc123'),
+                        extra_args={'headers': {'X-Foo': 'bar'}})
+        client.get_trusted_facets()
+        req = httpretty.last_request()
+        self.assertEqual(req.headers['Authorization'], 'Bearer abc123')
+        self.assertEqual(req.headers['X-Foo'], 'bar')
+
+    def test_http_auth(self):
+        client = Client('https://example', auth=HttpAuth('black_knight',
+                                                         'flesh wound'))
+        client.get_trusted_facets()
+        self.assertEqual(httpretty.last_request().headers['Authorization'],
+                         'Basic YmxhY2tfa25pZ2h0OmZsZXNoIHdvdW5k')
+
+    def test_dynamic_auth_does_not_leak(self):
+        calls = []
+
+        def auth(kwargs):
+            calls.append(1)
+            kwargs['headers']['X-Call'] = str(len(calls))
+            return kwargs
+        client = Client('https://example', auth=auth)
+        client.get_trusted_facets()
+        client.auth_complete('black_knight', '{}')
+        client.get_trusted_facets()
+        req = httpretty.last_request()
+        self.assertEqual(req.headers['X-Call'], '3')
+        self.assertNotIn('Content-type', req.headers)
+        self.assertEqual(client._headers, {})
+
+    def test_json_headers(self):
+        client = Client('https://example', auth=ApiToken('abc123'))
+        client.auth_complete('black_knight', '{}')
+        req = httpretty.last_request()
+        self.assertEqual(req.headers['Content-Type'], 'application/json')
+        self.assertEqual(req.headers['Authorization'], 'Bearer abc123')
+        client.get_trusted_facets()
+        self.assertNotIn('Content-Type', httpretty.last_request().headers)
@@ -0,0 +1,220 @@
+import threading
+import time
+import unittest
+
+try:
+    import asyncio
+except ImportError:
+    asyncio = None
+
+import httpretty
+
+from u2fval_client import deadline
+from u2fval_client.cache import DeviceCache, NegativeCache
+from u2fval_client.client import Client
+from u2fval_client.coalesce import AsyncSingleFlight, SingleFlight, freeze
+from u2fval_client.exc import (BadInputException, NotFoundException,
+                               TimeoutException)
+
+
+class TestFreeze(unittest.TestCase):
+    def test_freeze(self):
+        self.assertEqual(freeze({'b': [1, 2], 'a': {'c': 3}}),
+                         freeze({'a': {'c': 3}, 'b': [1, 2]}))
+        hash(freeze({'params': {'handle': ['a', 'b']}}))
+
+
+class TestSingleFlight(unittest.TestCase):
+    def setUp(self):
+        self.single_flight = SingleFlight()
+        self.release = threading.Event()
+
+    def run_concurrently(self, func, n=5):
+        results = []
+        errors = []
+
+        def worker():
+            try:
+                results.append(self.single_flight.do('key', func))
+            except Exception as e:
+                errors.append(e)
+        threads = [threading.Thread(target=worker) for _ in range(n)]
+        for thread in threads:
+            thread.start()
+        while self.single_flight.coalesced < n - 1:
+            time.sleep(0.001)
+        self.release.set()
+        for thread in threads:
+            thread.join()
+        return results, errors
+
+    def test_shared_result(self):
+        calls = []
+
+        def func():
+            calls.append(1)
+            self.release.wait()
+            return 'result'
+        results, errors = self.run_concurrently(func)
+        self.assertEqual(results, ['result'] * 5)
+        self.assertEqual(calls, [1])
+        self.assertEqual(self.single_flight.stats(),
+                         {'calls': 1, 'coalesced': 4})
+
+    def test_shared_error(self):
+        def func():
+            self.release.wait()
+            raise BadInputException('bad')
+        results, errors = self.run_concurrently(func)
+        self.assertEqual(len(errors), 5)
+        self.assertEqual(len(set(map(id, errors))), 5)
+        for error in errors:
+            self.assertIsInstance(error, BadInputException)
+            self.assertEqual(error.message, 'bad')
+        self.assertEqual(self.single_flight.stats()['calls'], 1)
+
+    def test_waiter_timeout(self):
+        leader = threading.Thread(target=self.single_flight.do,
+                                  args=('key', self.release.wait))
+        leader.start()
+        while not self.single_flight._calls:
+            time.sleep(0.001)
+        start = time.time()
+        self.assertRaises(TimeoutException, self.single_flight.do, 'key',
+                          lambda: 'unused', 0.05)
+        self.assertLess(time.time() - start, 0.5)
+        self.release.set()
+        leader.join()
+
+    def test_timeout_not_shared(self):
+        calls = []
+
+        def func():
+            calls.append(1)
+            if len(calls) == 1:
+                self.release.wait()
+                raise TimeoutException('Deadline exceeded')
+            return 'result'
+        results, errors = self.run_concurrently(func, n=2)
+        self.assertEqual(results, ['result'])
+        self.assertEqual(len(errors), 1)
+        self.assertIsInstance(errors[0], TimeoutException)
+        self.assertEqual(calls, [1, 1])
+
+    def test_sequential_not_coalesced(self):
+        self.single_flight.do('key', lambda: 1)
+        self.single_flight.do('key', lambda: 2)
+        self.assertEqual(self.single_flight.stats(),
+                         {'calls': 2, 'coalesced': 0})
+
+
+@unittest.skipIf(asyncio is None, 'asyncio not available')
+class TestAsyncSingleFlight(unittest.TestCase):
+    def test_shared_result(self):
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        single_flight = AsyncSingleFlight()
+        calls = []
+
+        def func():
+            calls.append(1)
+            return asyncio.sleep(0.01, 'result')
+
+        def gather():
+            return asyncio.gather(*[single_flight.do('key', func)
+                                    for _ in range(5)])
+        try:
+            results = loop.run_until_complete(gather())
+        finally:
+            asyncio.set_event_loop(None)
+            loop.close()
+        self.assertEqual(results, ['result'] * 5)
+        self.assertEqual(calls, [1])
+        self.assertEqual(single_flight.stats(), {'calls': 1, 'coalesced': 4})
+
+
+@httpretty.activate
+class TestClientSingleFlight(unittest.TestCase):
+    def test_get_coalesced(self):
+        single_flight = SingleFlight()
+        client = Client('https://example', single_flight=single_flight)
+        httpretty.register_uri('GET', 'https://example/black_knight/',
+                               body='[]')
+        self.assertEqual(client.list_devices('black_knight'), [])
+        self.assertEqual(single_flight.stats(), {'calls': 1, 'coalesced': 0})
+        self.assertEqual(single_flight._calls, {})
+
+    def test_deadline_while_coalesced(self):
+        release = threading.Event()
+        client = Client('https://example', single_flight=SingleFlight())
+        client._request = lambda *args, **kwargs: release.wait()
+        leader = threading.Thread(target=client.list_devices,
+                                  args=('black_knight',))
+        leader.start()
+        while not client._single_flight._calls:
+            time.sleep(0.001)
+        start = time.time()
+        with deadline.scope(0.05):
+            self.assertRaises(TimeoutException, client.list_devices,
+                              'black_knight')
+        self.assertLess(time.time() - start, 0.5)
+        release.set()
+        leader.join()
+
+    def join_across_invalidation(self, client, result):
+        """Has a caller join a list_devices call made before the devices of
+        the user were invalidated, returning the exceptions raised.
+        """
+        started = threading.Event()
+        release = threading.Event()
+
+        def request(*args, **kwargs):
+            started.set()
+            release.wait()
+            if isinstance(result, Exception):
+                raise result
+            return result
+        client._request = request
+        errors = []
+
+        def list_devices():
+            try:
+                client.list_devices('black_knight')
+            except NotFoundException as e:
+                errors.append(e)
+        leader = threading.Thread(target=list_devices)
+        leader.start()
+        started.wait()
+        client._invalidate_devices('black_knight')
+        waiter = threading.Thread(target=list_devices)
+        waiter.start()
+        while client._single_flight.coalesced < 1:
+            time.sleep(0.001)
+        release.set()
+        leader.join()
+        waiter.join()
+        return errors
+
+    def test_device_cache_across_invalidation(self):
+        device_cache = DeviceCache()
+        client = Client('https://example', single_flight=SingleFlight(),
+                        device_cache=device_cache)
+        self.join_across_invalidation(client, [])
+        self.assertIsNone(device_cache.get_devices('black_knight'))
+
+    def test_negative_cache_across_invalidation(self):
+        negative_cache = NegativeCache()
+        client = Client('https://example', single_flight=SingleFlight(),
+                        negative_cache=negative_cache)
+        errors = self.join_across_invalidation(
+            client, NotFoundException('gone'))
+        self.assertEqual(len(errors), 2)
+        self.assertIsNone(negative_cache.get('black_knight', 'list_devices'))
+
+    def test_post_not_coalesced(self):
+        single_flight = SingleFlight()
+        client = Client('https://example', single_flight=single_flight)
+        httpretty.register_uri('POST', 'https://example/black_knight/sign',
+                               body='{}')
+        client.auth_complete('black_knight', '{}')
+        self.assertEqual(single_flight.stats()['calls'], 0)
@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+import json
+import unittest
+
+import httpretty
+
+from u2fval_client.client import Client
+from u2fval_client.codec import (
+    JsonCodec,
+    OrjsonCodec,
+    best_available,
+    splice,
+)
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+class TestCodecs(unittest.TestCase):
+    def check_roundtrip(self, codec):
+        obj = {'handle': 'abc123', 'properties': {'name': u'sv\xe4rd'}}
+        data = codec.dumps(obj)
+        self.assertIsInstance(data, bytes)
+        self.assertEqual(codec.loads(data), obj)
+
+    def test_json(self):
+        self.check_roundtrip(JsonCodec())
+
+    @unittest.skipIf(orjson is None, 'orjson not installed')
+    def test_orjson(self):
+        self.check_roundtrip(OrjsonCodec())
+        self.assertIsInstance(best_available(), OrjsonCodec)
+
+    def test_best_available(self):
+        self.check_roundtrip(best_available())
+
+
+class TestSplice(unittest.TestCase):
+    def test_response_only(self):
+        body = splice(JsonCodec(), 'signResponse', u'{"a": "\xe4"}')
+        self.assertEqual(json.loads(body.decode('utf-8')),
+                         {'signResponse': {'a': u'\xe4'}})
+
+    def test_properties(self):
+        body = splice(JsonCodec(), 'registerResponse', b'{}', {'a': 1})
+        self.assertEqual(json.loads(body.decode('utf-8')),
+                         {'registerResponse': {}, 'properties': {'a': 1}})
+
+    def test_rejects_injected_keys(self):
+        response = '{"registrationData": "x", "clientData": "y"}, ' \
+            '"properties": {"admin": true}'
+        self.assertRaises(ValueError, splice, JsonCodec(), 'registerResponse',
+                          response)
+
+    def test_rejects_non_objects(self):
+        for response in ('', '[]', '"x"', '{} {}', '{"a": 1', ' {}x'):
+            self.assertRaises(ValueError, splice, JsonCodec(), 'signResponse',
+                              response)
+        body = splice(JsonCodec(), 'signResponse', b' {"a": "}"}\n')
+        self.assertEqual(json.loads(body.decode('utf-8')),
+                         {'signResponse': {'a': '}'}})
+
+
+@httpretty.activate
+class TestClientCodec(unittest.TestCase):
+    def test_passthrough(self):
+        httpretty.register_uri('POST', 'https://example/black_knight/sign',
+                               body='{}')
+        client = Client('https://example', passthrough=True)
+        response = '{"clientData": "x", "keyHandle": "y"}'
+        client.auth_complete('black_knight', response, {'a': 1})
+        req = httpretty.last_request()
+        self.assertEqual(req.body.decode('utf-8'),
+                         '{"signResponse": ' + response +
+                         ', "properties": {"a": 1}}')
+        self.assertEqual(req.headers['Content-Type'], 'application/json')
+
+    def test_passthrough_injection(self):
+        httpretty.register_uri('POST', 'https://example/black_knight/register',
+                               body='{}')
+        client = Client('https://example', passthrough=True)
+        response = '{"registrationData": "x", "clientData": "y"}, ' \
+            '"properties": {"admin": true}'
+        self.assertRaises(ValueError, client.register_complete,
+                          'black_knight', response)
+        self.assertIsNone(httpretty.last_request().method)
+
+    def test_custom_codec(self):
+        class Codec(JsonCodec):
+            def loads(self, data):
+                return ('decoded', JsonCodec.loads(self, data))
+        httpretty.register_uri('GET', 'https://example/', body='{}')
+        client = Client('https://example', codec=Codec())
+        self.assertEqual(client.get_trusted_facets(), ('decoded', {}))
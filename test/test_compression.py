@@ -0,0 +1,112 @@
+import gzip
+import json
+import unittest
+import zlib
+
+import httpretty
+
+from u2fval_client.client import Client
+from u2fval_client.compression import (Compression, Decompressor,
+                                       available_encodings)
+from u2fval_client.transport import HttpClientTransport
+
+
+def _decompress(encoding, data, chunk_size=7):
+    decoder = Decompressor(encoding)
+    chunks = [decoder.decompress(data[i:i + chunk_size])
+              for i in range(0, len(data), chunk_size)]
+    return b''.join(chunks) + decoder.flush()
+
+
+class TestDecompressor(unittest.TestCase):
+    data = b'{"handle": "abc"}' * 100
+
+    def test_gzip(self):
+        self.assertEqual(_decompress('gzip', gzip.compress(self.data)),
+                         self.data)
+
+    def test_deflate(self):
+        compressed = zlib.compress(self.data)
+        self.assertEqual(_decompress('deflate', compressed), self.data)
+        raw = compressed[2:-4]
+        self.assertEqual(_decompress('deflate', raw), self.data)
+
+    def test_unsupported(self):
+        self.assertRaises(ValueError, Decompressor, 'compress')
+
+    def test_available(self):
+        self.assertEqual(available_encodings()[-2:], ['gzip', 'deflate'])
+
+
+class TestCompression(unittest.TestCase):
+    def test_threshold(self):
+        compression = Compression(compress_requests=True, min_size=100)
+        self.assertEqual(compression.compress(b'x' * 99), (b'x' * 99, None))
+        data, encoding = compression.compress(b'x' * 1000)
+        self.assertEqual(encoding, 'gzip')
+        self.assertEqual(gzip.decompress(data), b'x' * 1000)
+        stats = compression.stats()
+        self.assertEqual(stats['bytes_out'], 1099)
+        self.assertEqual(stats['wire_bytes_out'], 99 + len(data))
+        self.assertEqual(stats['bytes_saved'], 1000 - len(data))
+
+    def test_not_requested(self):
+        compression = Compression()
+        self.assertEqual(compression.compress(b'x' * 5000),
+                         (b'x' * 5000, None))
+
+    def test_accept_encoding(self):
+        self.assertEqual(Compression().accept_encoding(), 'gzip, deflate')
+        self.assertEqual(Compression().accept_encoding(('br', 'gzip')),
+                         'br, gzip')
+        self.assertEqual(Compression(accept=['zstd']).accept_encoding(
+            ('gzip', 'deflate')), 'zstd')
+
+
+@httpretty.activate
+class TestClientCompression(unittest.TestCase):
+    def test_request_compressed(self):
+        httpretty.register_uri('POST', 'https://example/user/register',
+                               body='{}')
+        compression = Compression(accept=['gzip'], compress_requests=True,
+                                  min_size=100)
+        client = Client('https://example', compression=compression)
+        client.register_complete('user', json.dumps({'data': 'x' * 1000}))
+        req = httpretty.last_request()
+        self.assertEqual(req.headers['Accept-Encoding'], 'gzip')
+        self.assertEqual(req.headers['Content-Encoding'], 'gzip')
+        body = json.loads(gzip.decompress(req.body).decode('utf-8'))
+        self.assertEqual(body['registerResponse'], {'data': 'x' * 1000})
+
+    def test_accept_encoding_of_transport(self):
+        httpretty.register_uri('GET', 'https://example/', body='{}')
+        Client('https://example',
+               compression=Compression()).get_trusted_facets()
+        self.assertEqual(httpretty.last_request().headers['Accept-Encoding'],
+                         'gzip, deflate')
+        client = Client('https://example', compression=Compression(),
+                        transport=HttpClientTransport())
+        self.assertEqual(client._headers['Accept-Encoding'],
+                         ', '.join(available_encodings()))
+
+    def test_small_request_not_compressed(self):
+        httpretty.register_uri('POST', 'https://example/user/abc',
+                               body='{}')
+        client = Client('https://example', compression=Compression(
+            compress_requests=True))
+        client.update_device('user', 'abc', {'a': 1})
+        self.assertNotIn('Content-Encoding', httpretty.last_request().headers)
+
+    def test_response_savings(self):
+        devices = [{'handle': 'h%d' % i} for i in range(100)]
+        body = gzip.compress(json.dumps(devices).encode('utf-8'))
+        httpretty.register_uri('GET', 'https://example/user/', body=body,
+                               adding_headers={'Content-Encoding': 'gzip'})
+        compression = Compression()
+        client = Client('https://example', compression=compression)
+        self.assertEqual(client.list_devices('user'), devices)
+        stats = compression.stats()
+        self.assertEqual(stats['wire_bytes_in'], len(body))
+        self.assertGreater(stats['bytes_in'], len(body))
+        self.assertEqual(stats['bytes_saved'],
+                         stats['bytes_in'] - len(body))
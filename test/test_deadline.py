@@ -0,0 +1,111 @@
+import time
+import unittest
+
+try:
+    from unittest import mock
+except ImportError:
+    import mock
+
+import requests
+
+from u2fval_client import deadline
+from u2fval_client.client import Client
+from u2fval_client.exc import ServerUnreachableException, TimeoutException
+from u2fval_client.retry import RetryPolicy
+
+
+class TestDeadline(unittest.TestCase):
+    def test_no_deadline(self):
+        self.assertIsNone(deadline.remaining())
+        self.assertIsNone(deadline.expiry())
+        self.assertEqual(deadline.clamp(5, None), 5)
+
+    def test_scope(self):
+        with deadline.scope(10):
+            self.assertTrue(9 < deadline.remaining() <= 10)
+            with deadline.scope(20):
+                self.assertTrue(9 < deadline.remaining() <= 10)
+            with deadline.scope(1):
+                self.assertTrue(0 < deadline.remaining() <= 1)
+            self.assertTrue(9 < deadline.remaining() <= 10)
+        self.assertIsNone(deadline.remaining())
+
+    def test_expiry(self):
+        with deadline.scope(10):
+            self.assertTrue(deadline.left(deadline.expiry(1)) <= 1)
+            self.assertTrue(deadline.left(deadline.expiry(100)) <= 10)
+
+    def test_clamp(self):
+        expires = deadline.expiry(2)
+        self.assertTrue(1 < deadline.clamp(None, expires) <= 2)
+        self.assertEqual(deadline.clamp(1, expires), 1)
+        connect, read = deadline.clamp((1, None), expires)
+        self.assertEqual(connect, 1)
+        self.assertTrue(1 < read <= 2)
+
+    def test_clamp_expired(self):
+        self.assertRaises(TimeoutException, deadline.clamp, 1,
+                          deadline.expiry(-1))
+
+
+class TestClientTimeouts(unittest.TestCase):
+    def setUp(self):
+        self.session = mock.Mock()
+        self.session.request.return_value = mock.Mock(
+            status_code=200, content=b'{}', headers={})
+
+    def test_connect_read_timeout(self):
+        client = Client('https://example', session=self.session,
+                        connect_timeout=1, read_timeout=5)
+        client.get_trusted_facets()
+        self.assertEqual(self.session.request.call_args[1]['timeout'],
+                         (1, 5))
+
+    def test_extra_args_timeout(self):
+        client = Client('https://example', session=self.session,
+                        extra_args={'timeout': 3})
+        client.get_trusted_facets()
+        self.assertEqual(self.session.request.call_args[1]['timeout'], 3)
+
+    def test_total_timeout(self):
+        client = Client('https://example', session=self.session,
+                        read_timeout=5, total_timeout=2)
+        client.get_trusted_facets()
+        connect, read = self.session.request.call_args[1]['timeout']
+        self.assertTrue(1 < connect <= 2)
+        self.assertTrue(1 < read <= 2)
+
+    def test_scoped_deadline(self):
+        client = Client('https://example', session=self.session)
+        with deadline.scope(1):
+            client.get_trusted_facets()
+        self.assertTrue(0 < self.session.request.call_args[1]['timeout'] <= 1)
+
+    def test_expired_deadline(self):
+        client = Client('https://example', session=self.session)
+        with deadline.scope(-1):
+            self.assertRaises(TimeoutException, client.get_trusted_facets)
+        self.assertFalse(self.session.request.called)
+
+    def test_read_timeout(self):
+        self.session.request.side_effect = requests.ReadTimeout('slow')
+        client = Client('https://example', session=self.session)
+        self.assertRaises(TimeoutException, client.get_trusted_facets)
+
+    def test_timeout_is_unreachable(self):
+        self.assertTrue(issubclass(TimeoutException,
+                                   ServerUnreachableException))
+
+    def test_retry_within_deadline(self):
+        self.session.request.side_effect = requests.ConnectionError('down')
+        policy = RetryPolicy(max_attempts=10, backoff_base=10,
+                             backoff_cap=10)
+        policy.delay = lambda attempt, retry_after=None: 0.5
+        client = Client('https://example', session=self.session,
+                        retry=policy)
+        start = time.time()
+        with deadline.scope(1.2):
+            self.assertRaises(ServerUnreachableException,
+                              client.get_trusted_facets)
+        self.assertLess(time.time() - start, 1.2)
+        self.assertEqual(self.session.request.call_count, 3)
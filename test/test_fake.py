@@ -0,0 +1,160 @@
+import json
+import multiprocessing
+import sys
+import time
+import unittest
+
+try:
+    from unittest import mock
+except ImportError:
+    import mock
+
+from u2fval_client.auth import ApiToken
+from u2fval_client.batch import run_batch
+from u2fval_client.cache import FacetCache
+from u2fval_client.client import Client
+from u2fval_client.compression import Compression
+from u2fval_client.exc import (
+    BadAuthException,
+    BadInputException,
+    DeviceCompromisedException,
+    InvalidResponseException,
+    NoEligableDevicesException,
+    U2fValClientException,
+)
+
+if sys.version_info >= (3, 5):
+    from u2fval_client.fake import FakeServer, constant, lognormal
+else:
+    FakeServer = None
+
+
+@unittest.skipIf(FakeServer is None, 'u2fval_client.fake requires Python 3.5+')
+class TestFakeServer(unittest.TestCase):
+    def setUp(self):
+        self.server = FakeServer().start()
+        self.client = Client(self.server.endpoint)
+
+    def tearDown(self):
+        self.client.close()
+        self.server.stop()
+
+    def test_device_lifecycle(self):
+        self.assertRaises(U2fValClientException, self.client.list_devices,
+                          'black_knight')
+        request = self.client.register_begin('black_knight')
+        self.assertEqual(len(request['registerRequests']), 1)
+        device = self.client.register_complete('black_knight', '{}',
+                                               {'name': 'key'})
+        self.assertEqual(device['properties'], {'name': 'key'})
+        self.assertEqual(self.client.list_devices('black_knight'), [device])
+
+        handle = device['handle']
+        request = self.client.auth_begin('black_knight')
+        self.assertEqual(request['registeredKeys'][0]['keyHandle'], handle)
+        device = self.client.auth_complete(
+            'black_knight', json.dumps({'keyHandle': handle}))
+        self.assertIsNotNone(device['lastUsed'])
+        device = self.client.update_device('black_knight', handle,
+                                           {'name': None, 'color': 'red'})
+        self.assertEqual(device['properties'], {'color': 'red'})
+
+        self.client.unregister('black_knight', handle)
+        self.assertEqual(self.client.list_devices('black_knight'), [])
+        self.client.delete_user('black_knight')
+        self.assertRaises(U2fValClientException, self.client.delete_user,
+                          'black_knight')
+
+    def test_no_eligable_devices(self):
+        with self.assertRaises(NoEligableDevicesException) as cm:
+            self.client.auth_begin('black_knight')
+        self.assertFalse(cm.exception.has_devices())
+
+        device = self.server.add_device('black_knight', compromised=True)
+        with self.assertRaises(NoEligableDevicesException) as cm:
+            self.client.auth_begin('black_knight')
+        self.assertTrue(cm.exception.has_devices())
+        self.assertRaises(DeviceCompromisedException,
+                          self.client.auth_complete, 'black_knight',
+                          json.dumps({'keyHandle': device['handle']}))
+
+    def test_unknown_handle(self):
+        self.server.add_device('black_knight')
+        self.assertRaises(BadInputException, self.client.auth_complete,
+                          'black_knight', '{"keyHandle": "abc"}')
+
+    def test_facets_etag(self):
+        cache = FacetCache(ttl=0, stale_ttl=0)
+        client = Client(self.server.endpoint, facet_cache=cache)
+        facets = client.get_trusted_facets()
+        self.assertEqual(facets['trustedFacets'][0]['ids'],
+                         ['https://example.com'])
+        self.assertEqual(client.get_trusted_facets(), facets)
+        self.assertEqual(self.server.stats()['requests'], 2)
+
+    def test_compression(self):
+        for _ in range(20):
+            self.server.add_device('black_knight')
+        compression = Compression(accept=['gzip'])
+        client = Client(self.server.endpoint, compression=compression)
+        self.assertEqual(len(client.list_devices('black_knight')), 20)
+        stats = compression.stats()
+        self.assertLess(stats['wire_bytes_in'], stats['bytes_in'])
+
+    def test_concurrent(self):
+        users = ['user%d' % i for i in range(200)]
+        for user in users:
+            self.server.add_device(user)
+        client = Client(self.server.endpoint, pool_maxsize=50)
+        results = list(run_batch(client.list_devices, users, 50))
+        self.assertTrue(all(len(devices) == 1 for _, devices in results))
+        self.assertLessEqual(self.server.stats()['connections'], 51)
+
+
+@unittest.skipIf(FakeServer is None, 'u2fval_client.fake requires Python 3.5+')
+class TestFakeServerOptions(unittest.TestCase):
+    def test_error_injection(self):
+        with FakeServer(errors={10: 1.0}) as server:
+            self.assertRaises(BadInputException,
+                              Client(server.endpoint).get_trusted_facets)
+        with FakeServer(errors={503: 1.0}) as server:
+            self.assertRaises(InvalidResponseException,
+                              Client(server.endpoint).get_trusted_facets)
+
+    def test_api_token(self):
+        with FakeServer(api_token='secret') as server:
+            self.assertRaises(BadAuthException,
+                              Client(server.endpoint).get_trusted_facets)
+            Client(server.endpoint, ApiToken('secret')).get_trusted_facets()
+
+    def test_latency(self):
+        with FakeServer(latency=constant(0.1)) as server:
+            start = time.time()
+            Client(server.endpoint).get_trusted_facets()
+            self.assertGreaterEqual(time.time() - start, 0.1)
+
+    def test_lognormal(self):
+        sample = sorted(lognormal(0.01, 0.5)() for _ in range(1000))
+        self.assertAlmostEqual(sample[500], 0.01, delta=0.002)
+
+    def test_subprocess(self):
+        server = FakeServer().start(subprocess=True)
+        try:
+            client = Client(server.endpoint)
+            client.register_complete('black_knight', '{}')
+            self.assertEqual(len(client.list_devices('black_knight')), 1)
+            self.assertEqual(server.stats()['requests'], 2)
+            self.assertRaises(ValueError, server.add_device, 'arthur')
+        finally:
+            server.stop()
+
+    def test_subprocess_spawn(self):
+        spawn = multiprocessing.get_context('spawn')
+        with mock.patch('u2fval_client.fake.multiprocessing', spawn):
+            server = FakeServer(latency=lognormal(0.001, 0.5))
+            server.start(subprocess=True)
+        try:
+            self.assertEqual(server._process.__class__, spawn.Process)
+            Client(server.endpoint).get_trusted_facets()
+        finally:
+            server.stop()
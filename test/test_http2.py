@@ -0,0 +1,121 @@
+import asyncio
+import json
+import sys
+import unittest
+
+try:
+    if sys.version_info < (3, 5):
+        raise ImportError('u2fval_client.http2 requires Python 3.5+')
+    import httpx
+    from u2fval_client.http2 import AsyncHttp2Session, Http2Transport
+except ImportError:
+    httpx = None
+
+try:
+    from u2fval_client.aio import AsyncClient
+except ImportError:
+    AsyncClient = None
+
+from u2fval_client.auth import ApiToken, HttpAuth
+from u2fval_client.client import Client
+from u2fval_client.compression import Compression, available_encodings
+from u2fval_client.exc import (
+    BadInputException,
+    ServerUnreachableException,
+    TimeoutException,
+)
+
+
+@unittest.skipIf(httpx is None, 'httpx not installed')
+class TestHttp2Transport(unittest.TestCase):
+    def setUp(self):
+        self.requests = []
+        self.response = httpx.Response(200, json={})
+
+    def handle(self, request):
+        self.requests.append(request)
+        if isinstance(self.response, Exception):
+            raise self.response
+        return self.response
+
+    def client(self, **kwargs):
+        transport = Http2Transport(client=httpx.Client(
+            transport=httpx.MockTransport(self.handle)))
+        return Client('https://example', transport=transport, **kwargs)
+
+    def test_auth_and_json(self):
+        client = self.client(auth=ApiToken('foo'))
+        self.response = httpx.Response(200, json={'handle': 'abc'})
+        self.assertEqual(client.update_device('user', 'abc', {'a': 1}),
+                         {'handle': 'abc'})
+        request = self.requests[0]
+        self.assertEqual(request.method, 'POST')
+        self.assertEqual(str(request.url), 'https://example/user/abc')
+        self.assertEqual(request.headers['Authorization'], 'Bearer foo')
+        self.assertEqual(request.headers['Content-type'], 'application/json')
+        self.assertEqual(json.loads(request.content), {'a': 1})
+
+    def test_basic_auth_and_params(self):
+        client = self.client(auth=HttpAuth('user', 'pass'))
+        client.auth_begin('user', handles=['a', 'b'])
+        request = self.requests[0]
+        self.assertEqual(request.headers['Authorization'],
+                         'Basic dXNlcjpwYXNz')
+        self.assertEqual(request.url.params.get_list('handle'), ['a', 'b'])
+
+    def test_error_response(self):
+        self.response = httpx.Response(400, json={'errorCode': 10})
+        self.assertRaises(BadInputException, self.client().list_devices,
+                          'user')
+
+    def test_transport_errors(self):
+        client = self.client()
+        self.response = httpx.ConnectError('refused')
+        self.assertRaises(ServerUnreachableException,
+                          client.get_trusted_facets)
+        self.response = httpx.ReadTimeout('slow')
+        self.assertRaises(TimeoutException, client.get_trusted_facets)
+
+    def test_timeouts(self):
+        self.client(connect_timeout=1, read_timeout=2).get_trusted_facets()
+        timeout = self.requests[0].extensions['timeout']
+        self.assertEqual(timeout['connect'], 1)
+        self.assertEqual(timeout['read'], 2)
+        self.client().get_trusted_facets()
+        self.assertIsNone(self.requests[1].extensions['timeout']['read'])
+
+    def test_iter_certificate(self):
+        self.response = httpx.Response(200, content=b'x' * 10)
+        chunks = list(self.client().iter_certificate('user', 'abc', 4))
+        self.assertEqual(b''.join(chunks), b'x' * 10)
+
+    def test_accept_encoding(self):
+        self.client(compression=Compression()).get_trusted_facets()
+        accept = self.requests[0].headers['Accept-Encoding'].split(', ')
+        self.assertIn('gzip', accept)
+        self.assertLessEqual(set(accept), set(available_encodings()))
+
+
+@unittest.skipIf(httpx is None or AsyncClient is None,
+                 'httpx or aiohttp not installed')
+class TestAsyncHttp2Session(unittest.TestCase):
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+
+    def tearDown(self):
+        self.loop.close()
+
+    def test_request(self):
+        requests = []
+
+        def handle(request):
+            requests.append(request)
+            return httpx.Response(200, json={'trustedFacets': []})
+        session = AsyncHttp2Session(client=httpx.AsyncClient(
+            transport=httpx.MockTransport(handle)))
+        client = AsyncClient('https://example', ApiToken('foo'),
+                             session=session)
+        result = self.loop.run_until_complete(client.get_trusted_facets())
+        self.loop.run_until_complete(session.close())
+        self.assertEqual(result, {'trustedFacets': []})
+        self.assertEqual(requests[0].headers['Authorization'], 'Bearer foo')
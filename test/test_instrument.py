@@ -0,0 +1,119 @@
+import time
+import unittest
+from datetime import timedelta
+
+import httpretty
+
+from u2fval_client.client import Client
+from u2fval_client.exc import BadInputException
+from u2fval_client.instrument import Instrument, LatencyHistogram
+from u2fval_client.retry import RetryPolicy
+
+
+class Recorder(Instrument):
+    def __init__(self):
+        self.before = []
+        self.after = []
+
+    def before_request(self, event):
+        self.before.append(event.operation)
+
+    def after_request(self, event):
+        self.after.append(event)
+
+
+class SlowBodyTransport(object):
+    """Receives the headers after 10 ms and the body 50 ms later."""
+
+    def request(self, method, url, **kwargs):
+        time.sleep(0.06)
+        return SlowBodyResponse()
+
+
+class SlowBodyResponse(object):
+    status_code = 200
+    headers = {'Content-Type': 'application/json'}
+    content = b'[]'
+    elapsed = timedelta(seconds=0.01)
+
+
+class Event(object):
+    def __init__(self, operation, total_time, exception=None):
+        self.operation = operation
+        self.total_time = total_time
+        self.exception = exception
+
+
+@httpretty.activate
+class TestClientInstrument(unittest.TestCase):
+    def setUp(self):
+        self.recorder = Recorder()
+        self.client = Client('https://example', instrument=self.recorder,
+                             retry=RetryPolicy(backoff_base=0))
+
+    def test_event(self):
+        httpretty.register_uri('POST', 'https://example/black_knight/sign',
+                               body='{"handle": "abc123"}')
+        self.client.auth_complete('black_knight', '{}')
+        self.assertEqual(self.recorder.before, ['auth_complete'])
+        event = self.recorder.after[0]
+        self.assertEqual(event.operation, 'auth_complete')
+        self.assertEqual(event.method, 'POST')
+        self.assertEqual(event.status, 200)
+        self.assertEqual(event.bytes_out, len('{"signResponse": {}}'))
+        self.assertEqual(event.bytes_in, len('{"handle": "abc123"}'))
+        self.assertEqual(event.retries, 0)
+        self.assertIsNone(event.exception)
+        self.assertGreaterEqual(event.total_time, event.transport_time)
+
+    def test_error_and_retries(self):
+        httpretty.register_uri('GET', 'https://example/', responses=[
+            httpretty.Response(body='', status=503),
+            httpretty.Response(body='{"errorCode": 10}', status=400),
+        ])
+        self.assertRaises(BadInputException, self.client.get_trusted_facets)
+        event = self.recorder.after[0]
+        self.assertEqual(event.retries, 1)
+        self.assertEqual(event.status, 400)
+        self.assertIs(event.exception, BadInputException)
+
+    def test_headers_and_read_time(self):
+        client = Client('https://example', instrument=self.recorder,
+                        transport=SlowBodyTransport())
+        client.get_trusted_facets()
+        event = self.recorder.after[0]
+        self.assertEqual(event.headers_time, 0.01)
+        self.assertGreaterEqual(event.read_time, 0.05)
+        self.assertAlmostEqual(event.headers_time + event.read_time,
+                               event.transport_time)
+
+
+class TestLatencyHistogram(unittest.TestCase):
+    def test_percentiles(self):
+        histogram = LatencyHistogram()
+        for i in range(1, 101):
+            histogram.after_request(Event('auth_begin', i / 1000.0))
+        p50 = histogram.percentile('auth_begin', 50)
+        p99 = histogram.percentile('auth_begin', 99)
+        self.assertGreaterEqual(p50, 0.05)
+        self.assertLess(p50, 0.05 * 1.11)
+        self.assertGreaterEqual(p99, 0.099)
+        self.assertLess(p99, 0.099 * 1.11)
+
+    def test_summary(self):
+        histogram = LatencyHistogram()
+        histogram.after_request(Event('auth_begin', 0.01))
+        histogram.after_request(Event('auth_begin', 0.02, ValueError))
+        summary = histogram.summary()['auth_begin']
+        self.assertEqual(summary['count'], 2)
+        self.assertEqual(summary['errors'], 1)
+
+    def test_unknown_operation(self):
+        self.assertIsNone(LatencyHistogram().percentile('auth_begin', 50))
+
+    def test_out_of_range(self):
+        histogram = LatencyHistogram(max_latency=1)
+        histogram.after_request(Event('auth_begin', 0))
+        histogram.after_request(Event('auth_begin', 100))
+        self.assertEqual(histogram.percentile('auth_begin', 50), 0.0001)
+        self.assertGreaterEqual(histogram.percentile('auth_begin', 100), 1)
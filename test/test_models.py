@@ -0,0 +1,115 @@
+import pickle
+import unittest
+
+import httpretty
+
+from u2fval_client.cache import DeviceCache
+from u2fval_client.client import Client
+from u2fval_client.models import Device, SignRequest, TrustedFacets, wrap
+
+DEVICE = {
+    'handle': 'abc123',
+    'created': '2017-01-01T00:00:00Z',
+    'lastUsed': '2017-01-02T00:00:00Z',
+    'compromised': False,
+    'metadata': {'displayName': 'Holy Hand Grenade'},
+    'properties': {'name': 'Antioch'},
+}
+
+
+class TestModels(unittest.TestCase):
+    def test_from_dict(self):
+        device = Device.from_dict(DEVICE)
+        self.assertEqual(device.handle, 'abc123')
+        self.assertEqual(device.last_used, '2017-01-02T00:00:00Z')
+        self.assertIs(device.compromised, False)
+        self.assertEqual(device.properties, {'name': 'Antioch'})
+        self.assertEqual(device.to_dict(), DEVICE)
+
+    def test_slots(self):
+        device = Device.from_dict(DEVICE)
+        self.assertFalse(hasattr(device, '__dict__'))
+        self.assertRaises(AttributeError, setattr, device, 'foo', 1)
+
+    def test_item_access(self):
+        device = Device.from_dict(dict(DEVICE, extraField=1))
+        self.assertEqual(device['handle'], 'abc123')
+        self.assertEqual(device['lastUsed'], '2017-01-02T00:00:00Z')
+        self.assertEqual(device['extraField'], 1)
+        self.assertEqual(device.get('missing', 2), 2)
+        self.assertRaises(KeyError, device.__getitem__, 'missing')
+        self.assertIn('metadata', device)
+
+    def test_bytes_roundtrip(self):
+        device = Device.from_dict(dict(DEVICE, extraField=1))
+        data = device.to_bytes()
+        self.assertIsInstance(data, bytes)
+        self.assertEqual(Device.from_bytes(data), device)
+
+    def test_lazy_nested(self):
+        device = Device.from_bytes(Device.from_dict(DEVICE).to_bytes())
+        self.assertIsInstance(device._metadata, bytes)
+        self.assertEqual(device.metadata,
+                         {'displayName': 'Holy Hand Grenade'})
+        self.assertIsInstance(device._metadata, dict)
+        self.assertIsInstance(device._properties, bytes)
+        self.assertEqual(Device.from_bytes(device.to_bytes()).to_dict(),
+                         DEVICE)
+
+    def test_null_fields(self):
+        data = dict(DEVICE, lastUsed=None, metadata=None, extraField=None)
+        device = Device.from_dict(data)
+        self.assertIsNone(device['lastUsed'])
+        self.assertIsNone(device['metadata'])
+        self.assertIsNone(device['extraField'])
+        self.assertIn('lastUsed', device)
+        self.assertEqual(device.to_dict(), data)
+        device = Device.from_bytes(device.to_bytes())
+        self.assertIn('lastUsed', device)
+        self.assertEqual(device.to_dict(), data)
+
+    def test_missing_fields(self):
+        data = dict(DEVICE)
+        del data['lastUsed'], data['metadata']
+        device = Device.from_dict(data)
+        self.assertIsNone(device.last_used)
+        self.assertIsNone(device.metadata)
+        self.assertNotIn('lastUsed', device)
+        self.assertRaises(KeyError, device.__getitem__, 'metadata')
+        for copy in (Device.from_bytes(device.to_bytes()),
+                     pickle.loads(pickle.dumps(device))):
+            self.assertNotIn('lastUsed', copy)
+            self.assertEqual(copy.to_dict(), data)
+
+    def test_wrap(self):
+        self.assertEqual(wrap(Device, [DEVICE]), [Device.from_dict(DEVICE)])
+        self.assertEqual(wrap(Device, DEVICE), Device.from_dict(DEVICE))
+
+
+@httpretty.activate
+class TestClientModels(unittest.TestCase):
+    def setUp(self):
+        self.client = Client('https://example', models=True,
+                             device_cache=DeviceCache())
+
+    def test_list_devices(self):
+        httpretty.register_uri('GET', 'https://example/black_knight/',
+                               body='[{"handle": "abc123"}]')
+        devices = self.client.list_devices('black_knight')
+        self.assertEqual(devices, [Device.from_dict({'handle': 'abc123'})])
+        self.assertEqual(self.client.get_device('black_knight', 'abc123'),
+                         devices[0])
+
+    def test_auth_begin(self):
+        httpretty.register_uri('GET', 'https://example/black_knight/sign',
+                               body='{"challenge": "c", "appId": "a"}')
+        request = self.client.auth_begin('black_knight')
+        self.assertIsInstance(request, SignRequest)
+        self.assertEqual(request.challenge, 'c')
+
+    def test_trusted_facets(self):
+        httpretty.register_uri('GET', 'https://example/',
+                               body='{"trustedFacets": []}')
+        facets = self.client.get_trusted_facets()
+        self.assertIsInstance(facets, TrustedFacets)
+        self.assertEqual(facets.trusted_facets, [])
@@ -0,0 +1,91 @@
+import threading
+import unittest
+
+try:
+    from unittest import mock
+except ImportError:
+    import mock
+
+from u2fval_client.exc import (
+    NoEligableDevicesException,
+    ServerUnreachableException,
+)
+from u2fval_client.prefetch import Prefetcher
+
+
+class TestPrefetcher(unittest.TestCase):
+    def setUp(self):
+        self.client = mock.Mock()
+        self.counter = iter(range(1000))
+        self.client.auth_begin.side_effect = \
+            lambda *args: {'challenge': next(self.counter)}
+        self.client.register_begin.side_effect = \
+            lambda *args: {'challenge': next(self.counter)}
+        self.prefetcher = Prefetcher(self.client)
+
+    def tearDown(self):
+        self.prefetcher.close()
+
+    def test_prefetched(self):
+        self.prefetcher.prefetch_auth('black_knight')
+        self.assertEqual(self.prefetcher.auth_begin('black_knight'),
+                         {'challenge': 0})
+        self.assertEqual(self.client.auth_begin.call_count, 1)
+        self.assertEqual(self.prefetcher.hits, 1)
+
+    def test_single_use(self):
+        self.prefetcher.prefetch_auth('black_knight')
+        self.prefetcher.auth_begin('black_knight')
+        self.assertEqual(self.prefetcher.auth_begin('black_knight'),
+                         {'challenge': 1})
+        self.assertEqual(self.prefetcher.misses, 1)
+
+    def test_expired(self):
+        prefetcher = Prefetcher(self.client, lifetime=-1)
+        prefetcher.prefetch_auth('black_knight')
+        prefetcher.auth_begin('black_knight')
+        self.assertEqual(self.client.auth_begin.call_count, 2)
+        prefetcher.close()
+
+    def test_arguments_must_match(self):
+        self.prefetcher.prefetch_auth('black_knight', handles=['a'])
+        self.prefetcher.auth_begin('black_knight', handles=['b'])
+        self.client.auth_begin.assert_called_with('black_knight', None, None,
+                                                  ['b'])
+        self.assertEqual(self.prefetcher.misses, 1)
+
+    def test_bounded(self):
+        prefetcher = Prefetcher(self.client, maxsize=2)
+        for name in ['a', 'b', 'c']:
+            prefetcher.prefetch_register(name)
+        self.assertEqual(list(prefetcher._entries),
+                         [('register', 'b'), ('register', 'c')])
+        prefetcher.close()
+
+    def test_waits_for_in_flight(self):
+        release = threading.Event()
+
+        def auth_begin(*args):
+            release.wait()
+            return {'challenge': 'late'}
+        self.client.auth_begin.side_effect = auth_begin
+        self.prefetcher.prefetch_auth('black_knight')
+        threading.Timer(0.05, release.set).start()
+        self.assertEqual(self.prefetcher.auth_begin('black_knight'),
+                         {'challenge': 'late'})
+        self.assertEqual(self.client.auth_begin.call_count, 1)
+
+    def test_server_error_reraised(self):
+        self.client.auth_begin.side_effect = \
+            NoEligableDevicesException('none', False)
+        self.prefetcher.prefetch_auth('black_knight')
+        self.assertRaises(NoEligableDevicesException,
+                          self.prefetcher.auth_begin, 'black_knight')
+        self.assertEqual(self.client.auth_begin.call_count, 1)
+
+    def test_unreachable_retried(self):
+        self.client.auth_begin.side_effect = [
+            ServerUnreachableException('down'), {'challenge': 'ok'}]
+        self.prefetcher.prefetch_auth('black_knight')
+        self.assertEqual(self.prefetcher.auth_begin('black_knight'),
+                         {'challenge': 'ok'})
@@ -0,0 +1,73 @@
+import unittest
+
+import httpretty
+
+from u2fval_client.client import Client
+from u2fval_client.exc import ServerUnreachableException, U2fValClientException
+from u2fval_client.retry import RetryPolicy
+
+
+class TestRetryPolicy(unittest.TestCase):
+    def test_can_retry(self):
+        policy = RetryPolicy(max_attempts=2)
+        self.assertTrue(policy.can_retry('GET', 0))
+        self.assertTrue(policy.can_retry('DELETE', 0))
+        self.assertFalse(policy.can_retry('GET', 1))
+        self.assertFalse(policy.can_retry('POST', 0))
+
+    def test_retry_unsafe(self):
+        policy = RetryPolicy(retry_unsafe=True)
+        self.assertTrue(policy.can_retry('POST', 0))
+
+    def test_delay_full_jitter(self):
+        policy = RetryPolicy(backoff_base=1, backoff_cap=3)
+        for attempt in range(5):
+            delay = policy.delay(attempt)
+            self.assertGreaterEqual(delay, 0)
+            self.assertLessEqual(delay, min(3, 2 ** attempt))
+
+    def test_delay_retry_after(self):
+        policy = RetryPolicy(max_retry_after=5)
+        self.assertEqual(policy.delay(0, '2'), 2)
+        self.assertEqual(policy.delay(0, '60'), 5)
+        self.assertEqual(policy.delay(0, 'Wed, 21 Oct 2015 07:28:00 GMT'), 0)
+
+
+@httpretty.activate
+class TestClientRetry(unittest.TestCase):
+    def setUp(self):
+        self.policy = RetryPolicy(backoff_base=0)
+        self.client = Client('https://example', retry=self.policy)
+
+    def test_retry_on_status(self):
+        httpretty.register_uri('GET', 'https://example/', responses=[
+            httpretty.Response(body='', status=503),
+            httpretty.Response(body='', status=502,
+                               adding_headers={'Retry-After': '0'}),
+            httpretty.Response(body='{}'),
+        ])
+        self.assertEqual(self.client.get_trusted_facets(), {})
+        self.assertEqual(self.policy.stats()['retries'], 2)
+
+    def test_gives_up(self):
+        httpretty.register_uri('GET', 'https://example/', status=503)
+        self.assertRaises(U2fValClientException,
+                          self.client.get_trusted_facets)
+        self.assertEqual(len(httpretty.latest_requests()), 3)
+
+    def test_post_not_retried(self):
+        calls = []
+
+        def callback(request, uri, headers):
+            calls.append(request)
+            return 503, headers, ''
+        httpretty.register_uri('POST', 'https://example/black_knight/sign',
+                               body=callback)
+        self.assertRaises(U2fValClientException, self.client.auth_complete,
+                          'black_knight', '{}')
+        self.assertEqual(len(calls), 1)
+
+    def test_server_unreachable_retried(self):
+        self.assertRaises(ServerUnreachableException,
+                          self.client.get_trusted_facets)
+        self.assertEqual(self.policy.stats()['retries'], 2)
@@ -0,0 +1,234 @@
+import gzip
+import json
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+import unittest
+
+try:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn
+except ImportError:  # Python 2
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from SocketServer import ThreadingMixIn
+
+from u2fval_client.auth import ApiToken, HttpAuth
+from u2fval_client.client import Client
+from u2fval_client.compression import Compression
+from u2fval_client.exc import (
+    BadInputException,
+    ServerUnreachableException,
+    TimeoutException,
+)
+from u2fval_client.transport import HttpClientTransport
+
+
+class _Server(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def setup(self):
+        BaseHTTPRequestHandler.setup(self)
+        self.server.connections += 1
+
+    def log_message(self, *args):
+        pass
+
+    def _handle(self):
+        length = int(self.headers.get('Content-Length', 0))
+        body = self.rfile.read(length) if length else b''
+        self.server.requests.append((self.command, self.path,
+                                     dict(self.headers), body))
+        if self.server.hangup:
+            # Closes the connection without responding.
+            self.close_connection = True
+            return
+        if self.path.startswith('/slow'):
+            time.sleep(0.5)
+        status, content = self.server.response
+        self.send_response(status)
+        for header in self.server.headers.items():
+            self.send_header(*header)
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+        if self.server.drop:
+            # Closes the connection without telling the client.
+            self.close_connection = True
+
+    do_GET = do_POST = do_DELETE = _handle
+
+
+class _ServerTestCase(unittest.TestCase):
+    def setUp(self):
+        self.server = _Server(('127.0.0.1', 0), _Handler)
+        self.server.connections = 0
+        self.server.requests = []
+        self.server.response = (200, b'{}')
+        self.server.drop = False
+        self.server.hangup = False
+        self.server.headers = {}
+        thread = threading.Thread(target=self.server.serve_forever,
+                                  args=(0.05,))
+        thread.daemon = True
+        thread.start()
+        self.endpoint = 'http://127.0.0.1:%d/' % self.server.server_port
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class TestHttpClientTransport(_ServerTestCase):
+    def setUp(self):
+        super(TestHttpClientTransport, self).setUp()
+        self.transport = HttpClientTransport()
+
+    def tearDown(self):
+        self.transport.close()
+        super(TestHttpClientTransport, self).tearDown()
+
+    def client(self, **kwargs):
+        return Client(self.endpoint, transport=self.transport, **kwargs)
+
+    def test_get(self):
+        self.server.response = (200, b'{"challenge": "c"}')
+        client = self.client(auth=ApiToken('foo'))
+        self.assertEqual(client.auth_begin('user', handles=['a', 'b']),
+                         {'challenge': 'c'})
+        method, path, headers, _ = self.server.requests[0]
+        self.assertEqual(method, 'GET')
+        self.assertEqual(path, '/user/sign?handle=a&handle=b')
+        self.assertEqual(headers['Authorization'], 'Bearer foo')
+
+    def test_post_basic_auth(self):
+        client = self.client(auth=HttpAuth('user', 'pass'))
+        client.update_device('user', 'abc', {'a': 1})
+        method, path, headers, body = self.server.requests[0]
+        self.assertEqual(method, 'POST')
+        self.assertEqual(headers['Authorization'], 'Basic dXNlcjpwYXNz')
+        self.assertEqual(headers['Content-type'], 'application/json')
+        self.assertEqual(json.loads(body.decode('utf-8')), {'a': 1})
+
+    def test_keep_alive(self):
+        client = self.client()
+        for _ in range(5):
+            client.get_trusted_facets()
+        self.assertEqual(self.server.connections, 1)
+
+    def test_stale_connection_retried(self):
+        client = self.client()
+        self.server.drop = True
+        client.get_trusted_facets()
+        time.sleep(0.1)
+        client.get_trusted_facets()
+        self.assertEqual(len(self.server.requests), 2)
+        self.assertEqual(self.server.connections, 2)
+
+    def test_stale_connection_post_not_retried(self):
+        client = self.client()
+        client.get_trusted_facets()
+        self.server.hangup = True
+        self.assertRaises(ServerUnreachableException, client.auth_complete,
+                          'user', '{}')
+        self.assertEqual([r[0] for r in self.server.requests], ['GET', 'POST'])
+
+    def test_stale_connection_get_retried(self):
+        client = self.client()
+        client.get_trusted_facets()
+        self.server.hangup = True
+        self.assertRaises(ServerUnreachableException,
+                          client.get_trusted_facets)
+        self.assertEqual([r[0] for r in self.server.requests],
+                         ['GET', 'GET', 'GET'])
+
+    def test_error_response(self):
+        self.server.response = (400, b'{"errorCode": 10}')
+        self.assertRaises(BadInputException, self.client().list_devices,
+                          'user')
+        self.server.response = (200, b'{}')
+        self.client().list_devices('user')
+        self.assertEqual(self.server.connections, 1)
+
+    def test_read_timeout(self):
+        client = Client(self.endpoint + 'slow', transport=self.transport,
+                        read_timeout=0.1)
+        self.assertRaises(TimeoutException, client.get_trusted_facets)
+
+    def test_unreachable(self):
+        sock = socket.socket()
+        sock.bind(('127.0.0.1', 0))
+        endpoint = 'http://127.0.0.1:%d/' % sock.getsockname()[1]
+        sock.close()
+        client = Client(endpoint, transport=self.transport)
+        self.assertRaises(ServerUnreachableException,
+                          client.get_trusted_facets)
+
+    def test_iter_certificate(self):
+        self.server.response = (200, b'x' * 10)
+        chunks = list(self.client().iter_certificate('user', 'abc', 4))
+        self.assertEqual(chunks, [b'xxxx', b'xxxx', b'xx'])
+        self.client().get_certificate('user', 'abc')
+        self.assertEqual(self.server.connections, 1)
+
+    def test_compressed_response(self):
+        devices = [{'handle': 'h%d' % i} for i in range(100)]
+        body = gzip.compress(json.dumps(devices).encode('utf-8'))
+        self.server.response = (200, body)
+        self.server.headers = {'Content-Encoding': 'gzip'}
+        client = self.client(compression=Compression(accept=['gzip']))
+        self.assertEqual(client.list_devices('user'), devices)
+        self.assertEqual(self.server.requests[0][2]['Accept-Encoding'],
+                         'gzip')
+        chunks = list(client.iter_certificate('user', 'abc', 64))
+        self.assertEqual(b''.join(chunks), json.dumps(devices).encode())
+        self.assertEqual(self.server.connections, 1)
+
+
+_STARTUP = """
+import json, sys, time
+start = time.time()
+from u2fval_client.client import Client
+from u2fval_client.compression import Compression
+from u2fval_client.transport import HttpClientTransport
+imported = time.time()
+requests_imported = 'requests' in sys.modules
+transport = HttpClientTransport() if sys.argv[2] == 'stdlib' else None
+Client(sys.argv[1], transport=transport).get_trusted_facets()
+print(json.dumps({
+    'import_time': imported - start,
+    'first_request_time': time.time() - imported,
+    'requests_imported': requests_imported,
+    'requests_loaded': 'requests' in sys.modules,
+}))
+"""
+
+
+class TestStartup(_ServerTestCase):
+
+    """Measures the import and first request times of a fresh process."""
+
+    def startup(self, transport):
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        output = subprocess.check_output(
+            [sys.executable, '-c', _STARTUP, self.endpoint, transport],
+            cwd=root)
+        return json.loads(output.decode('utf-8'))
+
+    def test_stdlib_transport(self):
+        stdlib = self.startup('stdlib')
+        self.assertFalse(stdlib['requests_imported'])
+        self.assertFalse(stdlib['requests_loaded'])
+
+        default = self.startup('default')
+        self.assertFalse(default['requests_imported'])
+        self.assertTrue(default['requests_loaded'])
+        self.assertLess(stdlib['first_request_time'],
+                        default['first_request_time'],
+                        'stdlib: %r, requests: %r' % (stdlib, default))
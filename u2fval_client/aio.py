@@ -0,0 +1,236 @@
+# Copyright (c) 2014 Yubico AB
+# All rights reserved.
+#
+#   Redistribution and use in source and binary forms, with or
+#   without modification, are permitted provided that the following
+#   conditions are met:
+#
+#    1. Redistributions of source code must retain the above copyright
+#       notice, this list of conditions and the following disclaimer.
+#    2. Redistributions in binary form must reproduce the above
+#       copyright notice, this list of conditions and the following
+#       disclaimer in the documentation and/or other materials provided
+#       with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+"""Asyncio client for the U2FVAL REST API.
+
+Requires Python 3.5+ and aiohttp, which can be installed using the "async"
+extra:
+
+  pip install u2fval-client[async]
+"""
+
+from u2fval_client import auth, coalesce, deadline, exc
+from u2fval_client.client import _parse_response
+from base64 import b64encode
+import aiohttp
+import asyncio
+import json as _json
+
+__all__ = ['AsyncClient']
+
+
+def _to_aiohttp(args):
+    """Translates requests style keyword arguments, as produced by the auth
+    callables and extra_args, into their aiohttp equivalents.
+    """
+    if 'auth' in args:
+        credentials = args.pop('auth')
+        if not isinstance(credentials, tuple):
+            raise ValueError('Only basic authentication is supported')
+        token = b64encode(':'.join(credentials).encode('utf-8'))
+        headers = dict(args.get('headers', {}))
+        headers['Authorization'] = 'Basic ' + token.decode('ascii')
+        args['headers'] = headers
+    if 'params' in args:
+        params = []
+        for key, value in args['params'].items():
+            if isinstance(value, (list, tuple)):
+                params.extend((key, v) for v in value)
+            else:
+                params.append((key, value))
+        args['params'] = params
+    if 'timeout' in args:
+        timeout = args['timeout']
+        if isinstance(timeout, tuple):
+            connect, read = timeout
+            args['timeout'] = aiohttp.ClientTimeout(sock_connect=connect,
+                                                    sock_read=read)
+        elif timeout is not None:
+            args['timeout'] = aiohttp.ClientTimeout(total=timeout)
+    if 'verify' in args:
+        if args.pop('verify') is False:
+            args['ssl'] = False
+    return args
+
+
+class AsyncClient(object):
+
+    """Awaitable counterpart of Client.
+
+    All requests share a single aiohttp.ClientSession, created on first use,
+    whose connector holds at most limit connections in total and
+    limit_per_host connections per host (0 meaning no limit). A custom
+    session may be passed in, in which case it is not closed by close().
+
+    The auth callables and extra_args are the same as for Client. A
+    coalesce.AsyncSingleFlight passed as single_flight lets identical
+    concurrent GET requests share a single server call.
+
+    Calls made within a deadline.scope are limited to its deadline, raising
+    a TimeoutException when it is exceeded. Such calls are not coalesced, as
+    callers sharing a call would also share its deadline.
+    """
+
+    def __init__(self, endpoint, auth=auth.no_auth, extra_args={},
+                 session=None, limit=100, limit_per_host=0,
+                 single_flight=None):
+        if endpoint[-1] != '/':
+            endpoint = endpoint + '/'
+        self._endpoint = endpoint
+        self._auth = auth
+        self._extra_args = extra_args
+        self._session = session
+        self._owns_session = session is None
+        self._limit = limit
+        self._limit_per_host = limit_per_host
+        self._single_flight = single_flight
+
+    def _get_session(self):
+        if self._session is None:
+            connector = aiohttp.TCPConnector(
+                limit=self._limit,
+                limit_per_host=self._limit_per_host
+            )
+            self._session = aiohttp.ClientSession(connector=connector)
+        return self._session
+
+    async def close(self):
+        """Closes all pooled connections held by the client."""
+        if self._owns_session and self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
+
+    async def _req(self, method, url, json=None, resp_is_json=True,
+                   **kwargs):
+        if self._single_flight is not None and method == 'GET' and \
+                deadline.remaining() is None:
+            key = (url, resp_is_json, coalesce.freeze(kwargs))
+            return await self._single_flight.do(key, lambda: self._request(
+                method, url, json, resp_is_json, **kwargs))
+        return await self._request(method, url, json, resp_is_json, **kwargs)
+
+    async def _request(self, method, url, json, resp_is_json, **kwargs):
+        args = dict(self._extra_args)
+        args.update(kwargs)
+        # Copied, as auth plugins add their headers in place.
+        args['headers'] = dict(args.get('headers') or {})
+        args = self._auth(args)
+        if json is not None:
+            headers = dict(args.get('headers', {}))
+            headers['Content-type'] = 'application/json'
+            args['headers'] = headers
+            args['data'] = _json.dumps(json)
+        args = _to_aiohttp(args)
+        expires = deadline.expiry()
+        if expires is not None:
+            timeout = args.get('timeout')
+            total = deadline.clamp(getattr(timeout, 'total', None), expires)
+            args['timeout'] = aiohttp.ClientTimeout(
+                total=total,
+                sock_connect=getattr(timeout, 'sock_connect', None),
+                sock_read=getattr(timeout, 'sock_read', None))
+
+        try:
+            async with self._get_session().request(method, url,
+                                                   **args) as resp:
+                status = resp.status
+                content = await resp.read()
+        except asyncio.TimeoutError as e:
+            raise exc.TimeoutException(str(e) or 'Request timed out')
+        except aiohttp.ClientConnectionError as e:
+            raise exc.ServerUnreachableException(str(e))
+        return _parse_response(status, content, resp_is_json)
+
+    async def get_trusted_facets(self):
+        return await self._req('GET', self._endpoint)
+
+    async def get_device(self, username, handle):
+        url = self._endpoint + username + '/' + handle
+        return await self._req('GET', url)
+
+    async def get_certificate(self, username, handle):
+        url = self._endpoint + username + '/' + handle
+        return await self._req('GET', url, resp_is_json=False)
+
+    async def delete_user(self, username):
+        url = self._endpoint + username + '/'
+        await self._req('DELETE', url, resp_is_json=False)
+
+    async def list_devices(self, username):
+        url = self._endpoint + username + '/'
+        return await self._req('GET', url)
+
+    async def update_device(self, username, handle, properties):
+        url = self._endpoint + username + '/' + handle
+        return await self._req('POST', url, json=properties)
+
+    async def register_begin(self, username, properties=None,
+                             challenge=None):
+        url = self._endpoint + username + '/register'
+        params = {}
+        if properties is not None:
+            params['properties'] = _json.dumps(properties)
+        if challenge is not None:
+            params['challenge'] = challenge
+        return await self._req('GET', url, params=params)
+
+    async def register_complete(self, username, register_response,
+                                properties=None):
+        url = self._endpoint + username + '/register'
+        data = {'registerResponse': _json.loads(register_response)}
+        if properties:
+            data['properties'] = properties
+        return await self._req('POST', url, json=data)
+
+    async def unregister(self, username, handle):
+        url = self._endpoint + username + '/' + handle
+        await self._req('DELETE', url, resp_is_json=False)
+
+    async def auth_begin(self, username, properties=None, challenge=None,
+                         handles=None):
+        url = self._endpoint + username + '/sign'
+        params = {}
+        if properties is not None:
+            params['properties'] = _json.dumps(properties)
+        if challenge is not None:
+            params['challenge'] = challenge
+        if handles is not None:
+            params['handle'] = handles
+        return await self._req('GET', url, params=params)
+
+    async def auth_complete(self, username, sign_response, properties=None):
+        url = self._endpoint + username + '/sign'
+        data = {'signResponse': _json.loads(sign_response)}
+        if properties:
+            data['properties'] = properties
+        return await self._req('POST', url, json=data)
@@ -25,21 +25,42 @@
 # ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
 # POSSIBILITY OF SUCH DAMAGE.
 
-__all__ = ['no_auth', 'ApiToken', 'HttpAuth']
+"""Authentication plugins for Client.
+
+An auth plugin is a callable taking the keyword arguments for a request and
+returning them with authentication added. Plugins whose arguments never
+change may also provide a static_args() method, returning those arguments.
+Client then merges them into its request template once, instead of calling
+the plugin for every request.
+"""
+
+from base64 import b64encode
+import logging
+import threading
+
+__all__ = ['no_auth', 'ApiToken', 'HttpAuth', 'RotatingApiToken']
+
+logger = logging.getLogger(__name__)
 
 
 def no_auth(kwargs):
     return kwargs
 
 
+no_auth.static_args = dict
+
+
 class ApiToken(object):
 
     def __init__(self, api_token):
-        self._token = api_token
+        self._header = 'Bearer %s' % api_token
+
+    def static_args(self):
+        return {'headers': {'Authorization': self._header}}
 
     def __call__(self, kwargs):
         headers = kwargs.get('headers', {})
-        headers['Authorization'] = 'Bearer %s' % self._token
+        headers['Authorization'] = self._header
         kwargs['headers'] = headers
         return kwargs
 
@@ -48,9 +69,58 @@ class HttpAuth(object):
     def __init__(self, username, password, authtype=None):
         if authtype is not None:
             self._auth = authtype(username, password)
+            self._static = {'auth': self._auth}
         else:
             self._auth = (username, password)
+            credentials = ('%s:%s' % self._auth).encode('latin1')
+            self._static = {'headers': {
+                'Authorization': 'Basic ' + b64encode(credentials).decode()
+            }}
+
+    def static_args(self):
+        return self._static
 
     def __call__(self, kwargs):
         kwargs['auth'] = self._auth
         return kwargs
+
+
+class RotatingApiToken(object):
+
+    """API token which is replaced on a schedule.
+
+    fetch is called to get the initial token, and then every interval
+    seconds from a background thread, so that requests never wait for it.
+    If fetching fails, the current token is kept and fetching is retried
+    after retry_interval seconds.
+    """
+
+    def __init__(self, fetch, interval, retry_interval=10):
+        self._fetch = fetch
+        self._interval = interval
+        self._retry_interval = retry_interval
+        self._header = 'Bearer %s' % fetch()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def _run(self):
+        delay = self._interval
+        while not self._stopped.wait(delay):
+            try:
+                self._header = 'Bearer %s' % self._fetch()
+                delay = self._interval
+            except Exception:
+                logger.exception('Unable to refresh API token')
+                delay = self._retry_interval
+
+    def close(self):
+        """Stops refreshing the token."""
+        self._stopped.set()
+
+    def __call__(self, kwargs):
+        headers = kwargs.get('headers', {})
+        headers['Authorization'] = self._header
+        kwargs['headers'] = headers
+        return kwargs
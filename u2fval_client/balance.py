@@ -0,0 +1,187 @@
+# Copyright (c) 2014 Yubico AB
+# All rights reserved.
+#
+#   Redistribution and use in source and binary forms, with or
+#   without modification, are permitted provided that the following
+#   conditions are met:
+#
+#    1. Redistributions of source code must retain the above copyright
+#       notice, this list of conditions and the following disclaimer.
+#    2. Redistributions in binary form must reproduce the above
+#       copyright notice, this list of conditions and the following
+#       disclaimer in the documentation and/or other materials provided
+#       with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+"""Client load balancing requests over several U2FVAL servers."""
+
+from u2fval_client import exc
+from u2fval_client.client import Client
+from u2fval_client.retry import IDEMPOTENT_METHODS
+import itertools
+import threading
+import time
+
+__all__ = [
+    'BalancedClient',
+    'Balancer',
+    'ROUND_ROBIN',
+    'LEAST_OUTSTANDING',
+    'EWMA',
+]
+
+ROUND_ROBIN = 'round_robin'
+LEAST_OUTSTANDING = 'least_outstanding'
+EWMA = 'ewma'
+
+
+class Replica(object):
+
+    __slots__ = ('endpoint', 'outstanding', 'latency', 'ejected_until')
+
+    def __init__(self, endpoint):
+        self.endpoint = endpoint
+        self.outstanding = 0
+        self.latency = 0.0
+        self.ejected_until = 0
+
+
+class Balancer(object):
+
+    """Selects which of several servers to send each request to.
+
+    The strategy is one of ROUND_ROBIN, LEAST_OUTSTANDING (the server with
+    the fewest requests in flight) or EWMA (the server with the lowest
+    exponentially weighted moving average of latency, weighted by its
+    requests in flight). A server which fails is ejected for eject_time
+    seconds, during which it is only used if no other server is available.
+    """
+
+    def __init__(self, endpoints, strategy=ROUND_ROBIN, eject_time=30,
+                 decay=0.3):
+        if not endpoints:
+            raise ValueError('At least one endpoint is required')
+        if strategy not in (ROUND_ROBIN, LEAST_OUTSTANDING, EWMA):
+            raise ValueError('Unknown strategy: %s' % strategy)
+        self.replicas = [Replica(e) for e in endpoints]
+        self._strategy = strategy
+        self._eject_time = eject_time
+        self._decay = decay
+        self._counter = itertools.count()
+        self._lock = threading.Lock()
+
+    def _choose(self, candidates):
+        if self._strategy == LEAST_OUTSTANDING:
+            return min(candidates, key=lambda r: r.outstanding)
+        if self._strategy == EWMA:
+            return min(candidates,
+                       key=lambda r: r.latency * (r.outstanding + 1))
+        return candidates[next(self._counter) % len(candidates)]
+
+    def acquire(self, exclude=()):
+        """Returns a replica to send a request to, skipping those in
+        exclude, or None if there are none left.
+        """
+        now = time.time()
+        with self._lock:
+            candidates = [r for r in self.replicas if r not in exclude]
+            if not candidates:
+                return None
+            healthy = [r for r in candidates if r.ejected_until <= now]
+            replica = self._choose(healthy or candidates)
+            replica.outstanding += 1
+            return replica
+
+    def release(self, replica, latency=None, failed=False):
+        """Records the completion of a request, and its latency if known.
+        A failed request ejects the replica.
+        """
+        with self._lock:
+            replica.outstanding -= 1
+            if failed:
+                replica.ejected_until = time.time() + self._eject_time
+            elif latency is None:
+                pass
+            elif replica.latency:
+                replica.latency += self._decay * (latency - replica.latency)
+            else:
+                replica.latency = latency
+
+
+class BalancedClient(Client):
+
+    """Client spreading requests over several equivalent U2FVAL servers.
+
+    Servers are selected by a Balancer using the given strategy. A server is
+    ejected when it cannot be reached or responds with a 5xx status, and
+    requests which are safe to retry are then sent to another server.
+    Idempotent requests are always safe, POST requests only if the retry
+    policy allows retrying them.
+
+    Other keyword arguments are passed to Client. Any retry policy applies
+    to each server individually, while a circuit breaker covers all of them
+    and probes a server chosen by the balancer.
+    """
+
+    def __init__(self, endpoints, strategy=ROUND_ROBIN, eject_time=30,
+                 **kwargs):
+        endpoints = [e if e.endswith('/') else e + '/' for e in endpoints]
+        kwargs.setdefault('pool_connections', len(endpoints))
+        super(BalancedClient, self).__init__(endpoints[0], **kwargs)
+        self._balancer = Balancer(endpoints, strategy, eject_time)
+
+    def _health_check(self, endpoint=None):
+        # Probe a server picked by the balancer, so that the circuit can
+        # close while the first server is down.
+        replica = self._balancer.acquire()
+        failed = True
+        try:
+            super(BalancedClient, self)._health_check(replica.endpoint)
+            failed = False
+        finally:
+            self._balancer.release(replica, failed=failed)
+
+    def _send(self, method, url, json=None, **kwargs):
+        path = url[len(self._endpoint):]
+        safe = method.upper() in IDEMPOTENT_METHODS or \
+            self._retry is not None and self._retry.retry_unsafe
+        tried = []
+        while True:
+            replica = self._balancer.acquire(tried)
+            tried.append(replica)
+            can_failover = safe and len(tried) < len(self._balancer.replicas)
+            start = time.time()
+            latency = None
+            failed = False
+            try:
+                resp = super(BalancedClient, self)._send(
+                    method, replica.endpoint + path, json, **kwargs)
+            except exc.CircuitOpenException:
+                raise
+            except exc.ServerUnreachableException:
+                failed = True
+                if can_failover:
+                    continue
+                raise
+            else:
+                if resp.status_code >= 500:
+                    failed = True
+                    if can_failover:
+                        continue
+                else:
+                    latency = time.time() - start
+                return resp
+            finally:
+                self._balancer.release(replica, latency, failed)
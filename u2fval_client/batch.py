@@ -0,0 +1,158 @@
+# Copyright (c) 2014 Yubico AB
+# All rights reserved.
+#
+#   Redistribution and use in source and binary forms, with or
+#   without modification, are permitted provided that the following
+#   conditions are met:
+#
+#    1. Redistributions of source code must retain the above copyright
+#       notice, this list of conditions and the following disclaimer.
+#    2. Redistributions in binary form must reproduce the above
+#       copyright notice, this list of conditions and the following
+#       disclaimer in the documentation and/or other materials provided
+#       with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+"""Helpers for running many client calls concurrently."""
+
+from u2fval_client import exc
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from itertools import islice
+import threading
+import time
+
+__all__ = ['run_batch', 'RateLimiter', 'BulkOperation']
+
+_ERRORS = (exc.U2fValException, exc.U2fValClientException)
+
+
+def _call(func, item):
+    try:
+        return func(item)
+    except _ERRORS as e:
+        return e
+
+
+def _run(func, items, workers, rate_limiter=None, start=0):
+    executor = ThreadPoolExecutor(workers)
+    pending = {}
+    try:
+        for index, item in enumerate(items, start):
+            if len(pending) >= workers * 2:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in sorted(done, key=pending.get):
+                    yield pending.pop(future) + (future.result(),)
+            if rate_limiter is not None:
+                rate_limiter.acquire()
+            pending[executor.submit(_call, func, item)] = (index, item)
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in sorted(done, key=pending.get):
+                yield pending.pop(future) + (future.result(),)
+    finally:
+        for future in pending:
+            future.cancel()
+        executor.shutdown(wait=False)
+
+
+def run_batch(func, items, workers=10):
+    """Calls func(item) for each item, using up to workers threads.
+
+    Yields (item, result) tuples in the order the calls complete. Failed
+    calls yield the raised U2fValException or U2fValClientException as
+    their result instead of stopping the batch. Items are consumed lazily,
+    with no more than twice the number of workers outstanding at any time.
+    """
+    for _, item, result in _run(func, items, workers):
+        yield item, result
+
+
+class RateLimiter(object):
+
+    """Token bucket allowing rate calls per second, in bursts of up to burst
+    calls.
+    """
+
+    def __init__(self, rate, burst=1):
+        self._rate = float(rate)
+        self._burst = burst
+        self._tokens = burst
+        self._last = time.time()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Takes a token, sleeping until one is available."""
+        with self._lock:
+            now = time.time()
+            self._tokens = min(self._burst,
+                               self._tokens + (now - self._last) * self._rate)
+            self._last = now
+            self._tokens -= 1
+            delay = -self._tokens / self._rate
+        if delay > 0:
+            time.sleep(delay)
+
+
+class BulkOperation(object):
+
+    """Runs func(item) for each item like run_batch, optionally limited to
+    rate calls per second, while keeping track of progress.
+
+    Iterating over the operation yields (item, result) tuples, where result
+    is an exception for failed items. At any point, checkpoint holds the
+    number of leading items that have all been processed. Passing it as
+    checkpoint to a new operation over the same items resumes the work
+    after an interruption, skipping those items.
+    """
+
+    def __init__(self, func, items, workers=10, rate=None, burst=1,
+                 checkpoint=0):
+        self._func = func
+        self._items = items
+        self._workers = workers
+        self._rate_limiter = RateLimiter(rate, burst) if rate else None
+        self.checkpoint = checkpoint
+        self.succeeded = 0
+        self.failed = 0
+        self._done = set()
+
+    def __iter__(self):
+        items = islice(self._items, self.checkpoint, None)
+        for index, item, result in _run(self._func, items, self._workers,
+                                        self._rate_limiter, self.checkpoint):
+            if isinstance(result, Exception):
+                self.failed += 1
+            else:
+                self.succeeded += 1
+            self._done.add(index)
+            while self.checkpoint in self._done:
+                self._done.remove(self.checkpoint)
+                self.checkpoint += 1
+            yield item, result
+
+    def run(self):
+        """Processes all items, returning a list of the failed (item,
+        exception) tuples.
+        """
+        return [(item, result) for item, result in self
+                if isinstance(result, Exception)]
+
+    def report(self):
+        """Returns the success and failure counts and the checkpoint."""
+        return {
+            'succeeded': self.succeeded,
+            'failed': self.failed,
+            'checkpoint': self.checkpoint,
+        }
@@ -0,0 +1,124 @@
+# Copyright (c) 2014 Yubico AB
+# All rights reserved.
+#
+#   Redistribution and use in source and binary forms, with or
+#   without modification, are permitted provided that the following
+#   conditions are met:
+#
+#    1. Redistributions of source code must retain the above copyright
+#       notice, this list of conditions and the following disclaimer.
+#    2. Redistributions in binary form must reproduce the above
+#       copyright notice, this list of conditions and the following
+#       disclaimer in the documentation and/or other materials provided
+#       with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+"""Circuit breaker for failing fast while the server is down."""
+
+from u2fval_client import exc
+import threading
+import time
+
+__all__ = ['CircuitBreaker', 'CLOSED', 'OPEN', 'HALF_OPEN']
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half-open'
+
+
+class CircuitBreaker(object):
+
+    """Tracks failed requests and stops sending requests after too many.
+
+    The circuit opens after failure_threshold consecutive failures, where a
+    failure is a request which could not reach the server or received a 5xx
+    response. While open, requests fail immediately with a
+    CircuitOpenException. Once reset_timeout seconds have passed the circuit
+    becomes half-open, and a single trial is let through: with probe set
+    this is a get_trusted_facets health check made before the request,
+    otherwise the request itself. A successful trial closes the circuit, a
+    failed one opens it again.
+
+    on_state_change, if given, is called with the old and new state on every
+    transition. A breaker may be shared between clients of the same server.
+    """
+
+    def __init__(self, failure_threshold=5, reset_timeout=30, probe=True,
+                 on_state_change=None):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.probe = probe
+        self.on_state_change = on_state_change
+        self._lock = threading.Lock()
+        self._state = CLOSED
+        self._failures = 0
+        self._opened_at = 0
+
+    @property
+    def state(self):
+        return self._state
+
+    def _transition(self, state):
+        # Called with the lock held, returns the previous state.
+        old, self._state = self._state, state
+        if state == OPEN:
+            self._opened_at = time.time()
+        return old
+
+    def _notify(self, old, new):
+        if old != new and self.on_state_change is not None:
+            self.on_state_change(old, new)
+
+    def before_request(self, probe=None):
+        """Raises CircuitOpenException unless a request may be made.
+
+        probe is a callable performing a health check, used for the trial
+        when the probe setting is enabled.
+        """
+        with self._lock:
+            if self._state == CLOSED:
+                return
+            if self._state == HALF_OPEN or \
+                    time.time() < self._opened_at + self.reset_timeout:
+                raise exc.CircuitOpenException('Circuit breaker is open')
+            old = self._transition(HALF_OPEN)
+        self._notify(old, HALF_OPEN)
+        if self.probe and probe is not None:
+            try:
+                probe()
+            except Exception:
+                self.record_failure()
+                raise
+            self.record_success()
+
+    def record_success(self):
+        with self._lock:
+            if self._state == OPEN:
+                # A request sent before the circuit opened; only the trial
+                # may close it.
+                return
+            self._failures = 0
+            old = self._transition(CLOSED)
+        self._notify(old, CLOSED)
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            old = self._state
+            if old == HALF_OPEN or old == CLOSED and \
+                    self._failures >= self.failure_threshold:
+                self._transition(OPEN)
+            new = self._state
+        self._notify(old, new)
@@ -0,0 +1,574 @@
+# Copyright (c) 2014 Yubico AB
+# All rights reserved.
+#
+#   Redistribution and use in source and binary forms, with or
+#   without modification, are permitted provided that the following
+#   conditions are met:
+#
+#    1. Redistributions of source code must retain the above copyright
+#       notice, this list of conditions and the following disclaimer.
+#    2. Redistributions in binary form must reproduce the above
+#       copyright notice, this list of conditions and the following
+#       disclaimer in the documentation and/or other materials provided
+#       with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+"""Caches that can be plugged into a Client to avoid server round trips."""
+
+from u2fval_client import exc
+from collections import OrderedDict
+import contextlib
+import logging
+import mmap
+import os
+import pickle
+import struct
+import threading
+import time
+import zlib
+
+__all__ = ['FacetCache', 'DeviceCache', 'NegativeCache', 'MemoryBackend',
+           'MmapBackend']
+
+logger = logging.getLogger(__name__)
+
+
+class FacetCache(object):
+
+    """Cache for the trusted facet list.
+
+    The list is considered fresh for ttl seconds after being fetched. After
+    that, it is served stale for up to stale_ttl more seconds while a single
+    background thread revalidates it. Revalidation sends the ETag of the
+    cached list as If-None-Match, so an unchanged list costs only a 304
+    response. Once both periods have passed, the list is fetched
+    synchronously.
+
+    A backend, such as an MmapBackend, may be given to share the list with
+    other processes. A process whose own copy is no longer fresh first
+    looks for a newer one in the backend.
+    """
+
+    _KEY = '\0trusted_facets'
+
+    def __init__(self, ttl=300, stale_ttl=3600, backend=None):
+        self._ttl = ttl
+        self._stale_ttl = stale_ttl
+        self._backend = backend
+        self._lock = threading.Lock()
+        self._value = None
+        self._etag = None
+        self._fetched = 0
+        self._thread = None
+
+    def invalidate(self):
+        """Discards the cached facet list, forcing it to be fetched again."""
+        with self._lock:
+            self._value = None
+            self._etag = None
+        if self._backend is not None:
+            self._backend.delete(self._KEY)
+
+    def _load(self):
+        entry = self._backend.get(self._KEY)
+        if entry is not None and entry[2] > self._fetched:
+            self._value, self._etag, self._fetched = entry
+
+    def _store(self):
+        if self._backend is not None:
+            self._backend.set(self._KEY,
+                              (self._value, self._etag, self._fetched),
+                              self._ttl + self._stale_ttl)
+
+    def get(self, fetch):
+        """Returns the cached facet list, using fetch to update it if needed.
+
+        fetch is called with the current ETag (or None) and returns a tuple
+        of the new value (None if not modified) and its ETag.
+        """
+        with self._lock:
+            if self._backend is not None and (
+                    time.time() - self._fetched >= self._ttl):
+                self._load()
+            if self._value is not None:
+                age = time.time() - self._fetched
+                if age < self._ttl:
+                    return self._value
+                if age < self._ttl + self._stale_ttl:
+                    if self._thread is None:
+                        self._thread = threading.Thread(
+                            target=self._background_refresh, args=(fetch,))
+                        self._thread.daemon = True
+                        self._thread.start()
+                    return self._value
+        return self._refresh(fetch)
+
+    def _background_refresh(self, fetch):
+        try:
+            self._refresh(fetch)
+        except Exception:
+            logger.exception('Unable to refresh trusted facets')
+        finally:
+            with self._lock:
+                self._thread = None
+
+    def _refresh(self, fetch):
+        value, etag = fetch(self._etag)
+        if value is None:
+            with self._lock:
+                if self._value is not None:
+                    self._fetched = time.time()
+                    self._store()
+                    return self._value
+            # Invalidated while the conditional request was in flight.
+            value, etag = fetch(None)
+        with self._lock:
+            self._value = value
+            self._etag = etag
+            self._fetched = time.time()
+            self._store()
+        return value
+
+
+class _Generations(object):
+
+    """Counts the deletions of keys, so that a value fetched from the server
+    while its key was deleted is not stored afterwards.
+
+    Keys share a fixed number of counters by their hash, so a deletion may
+    also skip storing a value of another key, but memory use stays bounded.
+    """
+
+    def __init__(self, slots=1024):
+        self._counts = [0] * slots
+
+    def get(self, key):
+        return self._counts[hash(key) % len(self._counts)]
+
+    def bump(self, key):
+        # Called with the lock of the backend held.
+        self._counts[hash(key) % len(self._counts)] += 1
+
+
+class MemoryBackend(object):
+
+    """In-process LRU storage with a per-entry time to live.
+
+    Holds at most maxsize entries, evicting the least recently used one when
+    full. Any object with the same get, set, delete and generation methods
+    can be used as a backend for DeviceCache, such as MmapBackend which
+    shares entries between processes.
+    """
+
+    def __init__(self, maxsize=1024, ttl=60):
+        self._maxsize = maxsize
+        self._ttl = ttl
+        self._data = OrderedDict()
+        self._generations = _Generations()
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def get(self, key):
+        """Returns the value stored for key, or None."""
+        with self._lock:
+            entry = self._data.pop(key, None)
+            if entry is None:
+                return None
+            if entry[0] <= time.time():
+                return None
+            self._data[key] = entry
+            return entry[1]
+
+    def generation(self, key):
+        """Returns a value to pass to set, which changes when key is
+        deleted.
+        """
+        return self._generations.get(key)
+
+    def set(self, key, value, ttl=None, generation=None):
+        """Stores value for key, for ttl seconds if given. Nothing is stored
+        if key has been deleted since generation was read.
+        """
+        with self._lock:
+            if generation is not None and \
+                    generation != self._generations.get(key):
+                return
+            self._data.pop(key, None)
+            while len(self._data) >= self._maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+            if ttl is None:
+                ttl = self._ttl
+            self._data[key] = (time.time() + ttl, value)
+
+    def delete(self, key):
+        """Removes any value stored for key."""
+        with self._lock:
+            self._generations.bump(key)
+            self._data.pop(key, None)
+
+
+_MAGIC = b'U2FVALC2'
+_HEADER = struct.Struct('<8sII')
+_HEADER_SIZE = 64
+# Counters of deletions, shared by keys as for _Generations.
+_GENERATIONS = 1024
+_COUNTER = struct.Struct('<Q')
+_TABLE_START = _HEADER_SIZE + _GENERATIONS * _COUNTER.size
+# Sequence number, expiry time, key hash, key length, value length.
+_SLOT = struct.Struct('<QdIHI')
+_SEQ = struct.Struct('<Q')
+_PROBES = 8
+
+
+class MmapBackend(object):
+
+    """Storage shared by all processes on a host, for prefork servers.
+
+    Entries are kept in a fixed size hash table in a memory mapped file at
+    path, which is created if needed and kept when processes exit, so that
+    recycled workers start with a warm cache. The table has a number of
+    slots of slot_size bytes each. Values are pickled, and values too large
+    for a slot are not stored. When the slots a key can be stored in are
+    all taken, the entry closest to expiry is evicted.
+
+    Reads take no lock: each slot carries a sequence number which writers
+    make odd while modifying the slot, and readers retry if it changes.
+    Writers are serialized by an exclusive lock on the file, which is
+    reopened in a forked child. The counters behind generation are kept in
+    the file too, so a value is not stored after its key was deleted by
+    any process. The file is only readable by its owner, as its contents
+    are unpickled. Requires a POSIX system.
+    """
+
+    def __init__(self, path, slots=4096, slot_size=4096, ttl=60):
+        self._path = path
+        self._slots = slots
+        self._slot_size = slot_size
+        self._ttl = ttl
+        self.evictions = 0
+        self._open_lock()
+        size = _TABLE_START + slots * slot_size
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            with self._locked():
+                if os.fstat(fd).st_size == 0:
+                    os.ftruncate(fd, size)
+                    os.write(fd, _HEADER.pack(_MAGIC, slots, slot_size))
+                elif os.fstat(fd).st_size != size or _HEADER.unpack(
+                        os.read(fd, _HEADER.size)) != (_MAGIC, slots,
+                                                       slot_size):
+                    raise ValueError('%s is not a cache with %d slots of %d '
+                                     'bytes' % (path, slots, slot_size))
+            self._map = mmap.mmap(fd, size)
+        finally:
+            os.close(fd)
+
+    def _open_lock(self):
+        self._pid = os.getpid()
+        self._lock = threading.Lock()
+        self._lock_fd = os.open(self._path, os.O_RDWR | os.O_CREAT, 0o600)
+
+    @contextlib.contextmanager
+    def _locked(self):
+        import fcntl
+        if self._pid != os.getpid():
+            # A forked child shares the open file, and so the lock, with
+            # its parent.
+            os.close(self._lock_fd)
+            self._open_lock()
+        with self._lock:
+            fcntl.flock(self._lock_fd, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(self._lock_fd, fcntl.LOCK_UN)
+
+    def _offsets(self, key_hash):
+        for i in range(min(_PROBES, self._slots)):
+            yield (_TABLE_START +
+                   (key_hash + i) % self._slots * self._slot_size)
+
+    def _counter(self, key_hash):
+        return _HEADER_SIZE + key_hash % _GENERATIONS * _COUNTER.size
+
+    def _read(self, offset):
+        """Reads a consistent copy of a slot, or None if it keeps changing.
+        """
+        for _ in range(10):
+            seq = _SEQ.unpack_from(self._map, offset)[0]
+            if seq % 2 == 0:
+                header = _SLOT.unpack_from(self._map, offset)
+                start = offset + _SLOT.size
+                data = self._map[start:start + header[3] + header[4]]
+                if _SEQ.unpack_from(self._map, offset)[0] == seq:
+                    return header, data
+        return None
+
+    def _write(self, offset, expires, key_hash, key, value):
+        seq = _SEQ.unpack_from(self._map, offset)[0]
+        seq += 1 if seq % 2 == 0 else 2  # Recovers from a crashed writer.
+        _SEQ.pack_into(self._map, offset, seq)
+        _SLOT.pack_into(self._map, offset, seq, expires, key_hash, len(key),
+                        len(value))
+        start = offset + _SLOT.size
+        self._map[start:start + len(key) + len(value)] = key + value
+        _SEQ.pack_into(self._map, offset, seq + 1)
+
+    def _find(self, key, key_hash):
+        for offset in self._offsets(key_hash):
+            slot = self._read(offset)
+            if slot is not None:
+                header, data = slot
+                if header[2] == key_hash and data[:header[3]] == key:
+                    return offset, header, data[header[3]:]
+        return None
+
+    def get(self, key):
+        """Returns the value stored for key, or None."""
+        key = key.encode('utf-8')
+        found = self._find(key, zlib.crc32(key) & 0xffffffff)
+        if found is None or found[1][1] <= time.time():
+            return None
+        return pickle.loads(found[2])
+
+    def generation(self, key):
+        """Returns a value to pass to set, which changes when key is
+        deleted.
+        """
+        key = key.encode('utf-8')
+        return _COUNTER.unpack_from(
+            self._map, self._counter(zlib.crc32(key) & 0xffffffff))[0]
+
+    def set(self, key, value, ttl=None, generation=None):
+        """Stores value for key, for ttl seconds if given. Nothing is stored
+        if key has been deleted since generation was read.
+        """
+        key = key.encode('utf-8')
+        key_hash = zlib.crc32(key) & 0xffffffff
+        value = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        expires = time.time() + (self._ttl if ttl is None else ttl)
+        with self._locked():
+            if generation is not None and generation != _COUNTER.unpack_from(
+                    self._map, self._counter(key_hash))[0]:
+                return
+            found = self._find(key, key_hash)
+            if _SLOT.size + len(key) + len(value) > self._slot_size:
+                if found is not None:
+                    self._write(found[0], 0, 0, b'', b'')
+                return
+            if found is not None:
+                offset = found[0]
+            else:
+                now = time.time()
+                offset = min(self._offsets(key_hash), key=lambda o: (
+                    _SLOT.unpack_from(self._map, o)[1]))
+                if _SLOT.unpack_from(self._map, offset)[1] > now:
+                    self.evictions += 1
+            self._write(offset, expires, key_hash, key, value)
+
+    def delete(self, key):
+        """Removes any value stored for key."""
+        key = key.encode('utf-8')
+        key_hash = zlib.crc32(key) & 0xffffffff
+        with self._locked():
+            counter = self._counter(key_hash)
+            _COUNTER.pack_into(self._map, counter,
+                               _COUNTER.unpack_from(self._map, counter)[0] + 1)
+            found = self._find(key, key_hash)
+            if found is not None:
+                self._write(found[0], 0, 0, b'', b'')
+
+    def close(self):
+        """Unmaps the file, which is kept for other processes."""
+        self._map.close()
+        os.close(self._lock_fd)
+
+
+class DeviceCache(object):
+
+    """Cache for the devices of users, as returned by list_devices and
+    get_device.
+
+    Everything cached for a user is stored as a single backend entry keyed
+    by the username, which is dropped by any Client call that modifies the
+    devices of that user. Cached values are shared between callers and must
+    not be modified.
+
+    To avoid caching a stale value fetched while the user was invalidated,
+    read generation(username) before fetching, and pass it when caching
+    the result, which is then skipped if the user has been invalidated
+    since, including by another process sharing an MmapBackend.
+    """
+
+    def __init__(self, maxsize=1024, ttl=60, backend=None):
+        self._backend = backend or MemoryBackend(maxsize, ttl)
+        self._ttl = ttl
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _get(self, username, handle=None):
+        entry = self._backend.get(username)
+        value = None
+        if entry is not None:
+            if handle is None:
+                value = entry['devices']
+            else:
+                value = entry['handles'].get(handle)
+                if value is None and entry['devices'] is not None:
+                    for device in entry['devices']:
+                        if device.get('handle') == handle:
+                            value = device
+                            break
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    def _update(self, username, generation, devices=None, handle=None,
+                device=None):
+        with self._lock:
+            entry = self._backend.get(username) or {'devices': None,
+                                                    'handles': {}}
+            entry = {'devices': entry['devices'],
+                     'handles': dict(entry['handles'])}
+            if devices is not None:
+                entry['devices'] = devices
+            if handle is not None:
+                entry['handles'][handle] = device
+            self._backend.set(username, entry, self._ttl, generation)
+
+    def generation(self, username):
+        """Returns a value to pass to set_devices or set_device, read before
+        fetching what is to be cached.
+        """
+        return self._backend.generation(username)
+
+    def get_devices(self, username):
+        """Returns the cached device list of a user, or None."""
+        return self._get(username)
+
+    def set_devices(self, username, devices, generation=None):
+        """Caches the device list of a user, unless the user has been
+        invalidated since generation was read.
+        """
+        self._update(username, generation, devices=devices)
+
+    def get_device(self, username, handle):
+        """Returns a cached device of a user, or None."""
+        return self._get(username, handle)
+
+    def set_device(self, username, handle, device, generation=None):
+        """Caches a single device of a user, unless the user has been
+        invalidated since generation was read.
+        """
+        self._update(username, generation, handle=handle, device=device)
+
+    def invalidate(self, username):
+        """Drops everything cached for a user. Call this when the devices of
+        a user are modified outside of this client.
+        """
+        self._backend.delete(username)
+
+    def stats(self):
+        """Returns the hit, miss and eviction counters of the cache."""
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': getattr(self._backend, 'evictions', 0),
+        }
+
+
+class NegativeCache(object):
+
+    """Cache for users which do not exist or have no devices.
+
+    Remembers, for ttl seconds, the NotFoundException or
+    NoEligableDevicesException (when the user has no devices at all) that
+    list_devices or auth_begin failed with for a user, which is raised
+    again for later calls without contacting the server. At most maxsize
+    users are kept by the default backend.
+
+    Entries are dropped by any Client call that modifies the devices of the
+    user, such as register_complete. Call invalidate when devices are
+    registered elsewhere, e.g. by another service. Pass a shared backend,
+    such as an MmapBackend, to share entries between processes. As for a
+    DeviceCache, a failure is not cached if the user was invalidated while
+    the call was made, given the generation read before it.
+    """
+
+    def __init__(self, maxsize=10000, ttl=30, backend=None):
+        self._backend = backend or MemoryBackend(maxsize, ttl)
+        self._ttl = ttl
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _key(username):
+        # Kept apart from the keys of a DeviceCache sharing the backend.
+        return '\0negative:' + username
+
+    def get(self, username, operation):
+        """Returns a new copy of the exception cached for an operation on a
+        user, or None.
+        """
+        entry = self._backend.get(self._key(username))
+        error = entry.get(operation) if entry is not None else None
+        if error is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return type(error)(*error.args)
+
+    def generation(self, username):
+        """Returns a value to pass to add, read before making the call."""
+        return self._backend.generation(self._key(username))
+
+    def add(self, username, operation, error, generation=None):
+        """Caches the exception an operation on a user failed with, if it
+        means that the user does not exist or has no devices, and the user
+        has not been invalidated since generation was read.
+        """
+        if isinstance(error, exc.NoEligableDevicesException):
+            if error.has_devices():
+                return
+        elif not isinstance(error, exc.NotFoundException):
+            return
+        key = self._key(username)
+        with self._lock:
+            entry = dict(self._backend.get(key) or {})
+            entry[operation] = error
+            self._backend.set(key, entry, self._ttl, generation)
+
+    def invalidate(self, username):
+        """Drops everything cached for a user. Call this when devices are
+        registered for the user outside of this client.
+        """
+        self._backend.delete(self._key(username))
+
+    def stats(self):
+        """Returns the hit, miss and eviction counters of the cache, and
+        its hit rate.
+        """
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': getattr(self._backend, 'evictions', 0),
+            'hit_rate': float(self.hits) / lookups if lookups else 0.0,
+        }
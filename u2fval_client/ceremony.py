@@ -0,0 +1,179 @@
+# Copyright (c) 2014 Yubico AB
+# All rights reserved.
+#
+#   Redistribution and use in source and binary forms, with or
+#   without modification, are permitted provided that the following
+#   conditions are met:
+#
+#    1. Redistributions of source code must retain the above copyright
+#       notice, this list of conditions and the following disclaimer.
+#    2. Redistributions in binary form must reproduce the above
+#       copyright notice, this list of conditions and the following
+#       disclaimer in the documentation and/or other materials provided
+#       with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+"""Login ceremonies overlapping the calls made to the U2FVAL server."""
+
+from u2fval_client import exc
+from concurrent.futures import Future, ThreadPoolExecutor
+import json as _json
+
+__all__ = ['LoginCeremony', 'Login', 'LoginState']
+
+
+def _no_devices(future):
+    if future.cancelled():
+        return False
+    e = future.exception()
+    return isinstance(e, exc.NoEligableDevicesException) and \
+        not e.has_devices()
+
+
+def _copy(source, target):
+    if source.exception() is not None:
+        target.set_exception(source.exception())
+    else:
+        target.set_result(source.result())
+
+
+class LoginState(object):
+
+    """What needs to be kept between auth_begin and auth_complete.
+
+    Serializes to compact bytes with to_bytes(), e.g. for session storage.
+    """
+
+    __slots__ = ('username', 'properties')
+
+    def __init__(self, username, properties=None):
+        self.username = username
+        self.properties = properties
+
+    def to_bytes(self):
+        data = [self.username]
+        if self.properties is not None:
+            data.append(self.properties)
+        return _json.dumps(data, separators=(',', ':')).encode('utf-8')
+
+    @classmethod
+    def from_bytes(cls, data):
+        return cls(*_json.loads(data.decode('utf-8')))
+
+    def __eq__(self, other):
+        if type(self) is not type(other):
+            return NotImplemented
+        return (self.username, self.properties) == \
+            (other.username, other.properties)
+
+    def __ne__(self, other):
+        result = self.__eq__(other)
+        return result if result is NotImplemented else not result
+
+    __hash__ = None
+
+
+class Login(object):
+
+    """A login ceremony in progress, as returned by LoginCeremony.begin.
+
+    sign_request is a future of the auth_begin result, and devices a future
+    of the list_devices result, or None if it was not requested. state is
+    the LoginState to keep until the ceremony is completed.
+    """
+
+    __slots__ = ('state', 'sign_request', 'devices')
+
+    def __init__(self, state, sign_request, devices=None):
+        self.state = state
+        self.sign_request = sign_request
+        self.devices = devices
+
+    def has_devices(self):
+        """Waits for auth_begin, returning whether the user has any devices
+        registered, which decides whether to ask for one.
+        """
+        try:
+            self.sign_request.result()
+            return True
+        except exc.NoEligableDevicesException as e:
+            return e.has_devices()
+
+
+class LoginCeremony(object):
+
+    """Runs the server calls of U2F logins concurrently.
+
+    begin starts auth_begin right away, for instance as soon as the
+    password of a user has been verified, and returns a Login holding
+    futures of its result. Whether the user has any devices follows from
+    the result of auth_begin (see Login.has_devices), so the device list is
+    only fetched when asked for, for display. It is fetched concurrently
+    with auth_begin, and skipped (resolving to an empty list) if auth_begin
+    fails with NoEligableDevicesException before the call has started.
+
+    The Login.state, or its to_bytes() output, is then passed to complete
+    along with the response from the browser.
+    """
+
+    def __init__(self, client, workers=4):
+        self._client = client
+        self._executor = ThreadPoolExecutor(workers)
+
+    def close(self):
+        """Stops the worker threads, once pending calls are done."""
+        self._executor.shutdown(wait=False)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def begin(self, username, properties=None, challenge=None,
+              handles=None, devices=False):
+        """Starts a login, calling auth_begin and, with devices set,
+        list_devices in the background.
+
+        As both calls start right away, devices normally costs the extra
+        call even for users without devices: list_devices is only skipped
+        when auth_begin fails before a worker has picked it up.
+        """
+        sign_request = self._executor.submit(
+            self._client.auth_begin, username, properties, challenge,
+            handles)
+        device_list = None
+        if devices:
+            device_list = Future()
+            call = self._executor.submit(self._client.list_devices,
+                                         username)
+            call.add_done_callback(
+                lambda f: f.cancelled() or _copy(f, device_list))
+
+            def skip(f):
+                if _no_devices(f) and call.cancel():
+                    device_list.set_result([])
+            sign_request.add_done_callback(skip)
+        return Login(LoginState(username, properties), sign_request,
+                     device_list)
+
+    def complete(self, state, sign_response):
+        """Completes a login, given its LoginState (or the bytes it was
+        serialized to) and the response from the browser.
+        """
+        if isinstance(state, bytes):
+            state = LoginState.from_bytes(state)
+        return self._client.auth_complete(state.username, sign_response,
+                                          state.properties)
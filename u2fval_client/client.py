@@ -25,71 +25,537 @@
 # ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
 # POSSIBILITY OF SUCH DAMAGE.
 
-from u2fval_client import auth, exc
-import requests
+from u2fval_client import (auth, batch, codec, coalesce, deadline, exc,
+                           instrument, models)
+from u2fval_client.transport import RequestsTransport
+from timeit import default_timer as _timer
+import io
+import tarfile
+import threading
+import time
 import json as _json
 
 
+_DEFAULT_CODEC = codec.JsonCodec()
+
+
+def _parse_response(status, content, resp_is_json=True,
+                    codec=_DEFAULT_CODEC):
+    """Turns a raw response into a return value, or raises the corresponding
+    exception for an error response.
+    """
+    try:
+        if status < 400:
+            if resp_is_json:
+                return codec.loads(content)
+            return content
+        data = codec.loads(content)
+        if not isinstance(data, dict) or 'errorCode' not in data:
+            raise ValueError('Missing errorCode')
+    except ValueError:
+        if status == 401:
+            raise exc.BadAuthException('Access denied')
+        elif status == 404:
+            raise exc.NotFoundException('Not found')
+        else:
+            raise exc.InvalidResponseException(
+                'The server responded with invalid data')
+    raise exc.from_response(data)
+
+
 class Client(object):
 
-    def __init__(self, endpoint, auth=auth.no_auth, extra_args={}):
+    """Client for the U2FVAL REST API.
+
+    Requests are sent over a pooled requests.Session so that connections to
+    the server are kept alive and reused between calls. The pool is sized by
+    pool_connections (number of hosts to keep pools for) and pool_maxsize
+    (number of connections kept alive per host). With pool_block set, no more
+    than pool_maxsize concurrent connections are opened to a single host.
+    Pooled connections left idle for longer than idle_timeout seconds are
+    discarded before the next request is made.
+
+    A custom session may be passed in, in which case the pool settings are
+    ignored and the session is not closed by close(). requests is only
+    imported when the first request is made. Alternatively, another
+    transport (see the transport module) may be passed as transport, such
+    as transport.HttpClientTransport, which only uses the standard library,
+    or http2.Http2Transport.
+
+    Passing a cache.FacetCache as facet_cache makes get_trusted_facets serve
+    the facet list from the cache. Likewise, a cache.DeviceCache passed as
+    device_cache is used by list_devices and get_device, and is invalidated
+    by the calls that modify devices.
+
+    Failed requests are retried according to retry, a retry.RetryPolicy, if
+    given. A breaker.CircuitBreaker passed as breaker makes requests fail
+    fast while the server is down. An instrument.Instrument passed as
+    instrument is notified before and after every request.
+
+    JSON is encoded and decoded using codec (see the codec module), the
+    standard library by default. With passthrough set, the browser responses
+    given to register_complete and auth_complete are sent to the server as
+    is, once checked to be a single JSON object, instead of being parsed
+    and serialized again. With models set,
+    responses are returned as the slotted classes of the models module
+    instead of dicts. A coalesce.SingleFlight passed as single_flight lets
+    identical concurrent GET requests share a single server call.
+
+    connect_timeout and read_timeout limit the time spent connecting to the
+    server and waiting for it to send data, while total_timeout limits the
+    time of a whole call, including any retries. Calls are also limited by
+    any deadline set using deadline.scope. When a limit is exceeded, a
+    TimeoutException is raised.
+
+    A compression.Compression passed as compression makes the client ask
+    for compressed responses, and optionally compress large request bodies.
+
+    A cache.NegativeCache passed as negative_cache remembers users which do
+    not exist or have no devices, failing list_devices and auth_begin for
+    them without a server call. It is invalidated by the calls that modify
+    devices.
+    """
+
+    def __init__(self, endpoint, auth=auth.no_auth, extra_args={},
+                 session=None, pool_connections=1, pool_maxsize=10,
+                 pool_block=False, idle_timeout=None, facet_cache=None,
+                 device_cache=None, retry=None, breaker=None,
+                 instrument=None, codec=None, passthrough=False,
+                 models=False, single_flight=None, connect_timeout=None,
+                 read_timeout=None, total_timeout=None, transport=None,
+                 compression=None, negative_cache=None):
         if endpoint[-1] != '/':
             endpoint = endpoint + '/'
         self._endpoint = endpoint
         self._auth = auth
         self._extra_args = extra_args
 
-    def _req(self, method, url, json=None, resp_is_json=True, **kwargs):
-        args = dict(self._extra_args)
-        args.update(kwargs)
-        args = self._auth(args)
-        if json is not None:
-            headers = args.get('headers', {})
-            headers['Content-type'] = 'application/json'
-            args['headers'] = headers
-            args['data'] = _json.dumps(json)
+        # Arguments common to all requests are computed once, and only
+        # copied per request when they need to change.
+        template = dict(extra_args)
+        headers = dict(extra_args.get('headers', {}))
+        static_args = getattr(auth, 'static_args', None)
+        if static_args is not None:
+            static = dict(static_args())
+            headers.update(static.pop('headers', {}))
+            template.update(static)
+            self._dynamic_auth = None
+        else:
+            self._dynamic_auth = auth
+        if transport is None:
+            transport = RequestsTransport(session, pool_connections,
+                                          pool_maxsize, pool_block)
+        if compression is not None:
+            headers['Accept-Encoding'] = compression.accept_encoding(
+                getattr(transport, 'encodings', None))
+        template['headers'] = self._headers = headers
+        self._json_headers = dict(headers, **{'Content-type':
+                                              'application/json'})
+        self._template = template
 
-        status = -1
-        try:
-            resp = requests.request(method, url, **args)
-            status = resp.status_code
-            if status < 400:
-                return resp.json() if resp_is_json else resp.content
+        self._transport = transport
+        self._idle_timeout = idle_timeout
+        self._last_used = time.time()
+        self._lock = threading.Lock()
+        self._facet_cache = facet_cache
+        self._device_cache = device_cache
+        self._retry = retry
+        self._breaker = breaker
+        self._instrument = instrument
+        self._codec = codec or _DEFAULT_CODEC
+        self._passthrough = passthrough
+        self._models = models
+        self._single_flight = single_flight
+        if connect_timeout is not None or read_timeout is not None:
+            self._timeout = (connect_timeout, read_timeout)
+        else:
+            self._timeout = extra_args.get('timeout')
+        self._total_timeout = total_timeout
+        self._compression = compression
+        self._negative_cache = negative_cache
+
+    def close(self):
+        """Closes all pooled connections held by the client."""
+        self._transport.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _evict_idle(self):
+        now = time.time()
+        with self._lock:
+            if now - self._last_used > self._idle_timeout:
+                self._transport.close_idle()
+            self._last_used = now
+
+    def _build_args(self, json=None, **kwargs):
+        args = self._template.copy()
+        headers = kwargs.pop('headers', None)
+        if kwargs:
+            args.update(kwargs)
+        if headers:
+            args['headers'] = dict(self._headers, **headers)
+            if json is not None:
+                args['headers']['Content-type'] = 'application/json'
+        elif json is not None:
+            args['headers'] = self._json_headers
+        if self._dynamic_auth is not None:
+            args['headers'] = dict(args['headers'])
+            args = self._dynamic_auth(args)
+        if json is not None:
+            if isinstance(json, bytes):
+                args['data'] = json
             else:
-                raise exc.from_response(resp.json())
-        except requests.ConnectionError as e:
-            raise exc.ServerUnreachableException(str(e))
-        except ValueError:
-            if status == 401:
-                raise exc.BadAuthException('Access denied')
-            elif status == 404:
-                raise exc.U2fValClientException('Not found')
+                args['data'] = self._codec.dumps(json)
+            if self._compression is not None:
+                args['data'], encoding = self._compression.compress(
+                    args['data'])
+                if encoding is not None:
+                    args['headers'] = dict(args['headers'])
+                    args['headers']['Content-Encoding'] = encoding
+        return args
+
+    def _time_left(self):
+        # Seconds left for a call started now, or None if it is unlimited.
+        return deadline.left(deadline.expiry(self._total_timeout))
+
+    def _health_check(self, endpoint=None):
+        args = self._build_args()
+        expires = deadline.expiry(self._total_timeout)
+        if expires is not None or self._timeout is not None:
+            args['timeout'] = deadline.clamp(self._timeout, expires)
+        resp = self._transport.request('GET', endpoint or self._endpoint,
+                                       **args)
+        if resp.status_code >= 500:
+            raise exc.ServerUnreachableException(
+                'Health check failed with status %d' % resp.status_code)
+
+    def _send(self, method, url, json=None, event=None, **kwargs):
+        args = self._build_args(json, **kwargs)
+        if event is not None and 'data' in args:
+            event.bytes_out = len(args['data'])
+
+        if self._idle_timeout is not None:
+            self._evict_idle()
+
+        expires = deadline.expiry(self._total_timeout)
+        attempt = 0
+        while True:
+            if self._breaker is not None:
+                self._breaker.before_request(self._health_check)
+            if expires is not None or self._timeout is not None:
+                args['timeout'] = deadline.clamp(self._timeout, expires)
+            if event is not None:
+                start = _timer()
+            try:
+                resp = self._transport.request(method, url, **args)
+            except exc.ServerUnreachableException:
+                if event is not None:
+                    event.transport_time += _timer() - start
+                    event.retries = attempt
+                if self._breaker is not None:
+                    self._breaker.record_failure()
+                if self._retry is None or \
+                        not self._retry.can_retry(method, attempt) or \
+                        not self._retry.wait(attempt,
+                                             limit=deadline.left(expires)):
+                    raise
+            except Exception:
+                # Any other error fails a half-open trial too, or the circuit
+                # would stay half-open and reject every later request.
+                if self._breaker is not None:
+                    self._breaker.record_failure()
+                raise
             else:
-                raise exc.InvalidResponseException(
-                    'The server responded with invalid data')
+                if event is not None:
+                    elapsed = _timer() - start
+                    event.transport_time += elapsed
+                    event.headers_time = resp.elapsed.total_seconds()
+                    event.read_time = max(0, elapsed - event.headers_time)
+                    event.retries = attempt
+                    event.status = resp.status_code
+                    if args.get('stream'):
+                        event.bytes_in = int(
+                            resp.headers.get('Content-Length', 0))
+                    else:
+                        event.bytes_in = len(resp.content)
+                if self._compression is not None and not args.get('stream'):
+                    size = len(resp.content)
+                    self._compression.record_response(
+                        int(resp.headers.get('Content-Length', size)), size)
+                if self._breaker is not None:
+                    if resp.status_code >= 500:
+                        self._breaker.record_failure()
+                    else:
+                        self._breaker.record_success()
+                if self._retry is None or \
+                        resp.status_code not in self._retry.retry_on_status \
+                        or not self._retry.can_retry(method, attempt) or \
+                        not self._retry.wait(attempt,
+                                             resp.headers.get('Retry-After'),
+                                             deadline.left(expires)):
+                    return resp
+            attempt += 1
+
+    def _req(self, method, url, json=None, resp_is_json=True, op=None,
+             handler=None, model=None, cache=None, **kwargs):
+        """Makes a request and parses the response, or passes it to handler
+        if given. op names the operation for instrumentation, and model the
+        class to wrap the response in when models are enabled.
+
+        cache, if given, is called with a function making the request and
+        returns its result, caching it. When requests are coalesced it is
+        only called by the caller making the request, so that the cache
+        generation it reads is that of the request.
+        """
+        def call():
+            def fetch():
+                return self._request(method, url, json, resp_is_json, op,
+                                     handler, model, **kwargs)
+            return fetch() if cache is None else cache(fetch)
+        if self._single_flight is not None and method == 'GET' and \
+                handler is None:
+            key = (url, resp_is_json, model, coalesce.freeze(kwargs))
+            return self._single_flight.do(key, call, self._time_left())
+        return call()
+
+    def _request(self, method, url, json, resp_is_json, op, handler, model,
+                 **kwargs):
+        event = None
+        if self._instrument is not None:
+            event = instrument.RequestEvent(op, method, url, _timer())
+            self._instrument.before_request(event)
+        decode_start = None
+        try:
+            resp = self._send(method, url, json, event=event, **kwargs)
+            if event is not None:
+                decode_start = _timer()
+            if handler is not None:
+                return handler(resp)
+            data = _parse_response(resp.status_code, resp.content,
+                                   resp_is_json, self._codec)
+            if model is not None and self._models:
+                return models.wrap(model, data)
+            return data
+        except Exception as e:
+            if event is not None:
+                event.exception = type(e)
+            raise
+        finally:
+            if event is not None:
+                end = _timer()
+                if decode_start is not None:
+                    event.decode_time = end - decode_start
+                event.total_time = end - event.start
+                self._instrument.after_request(event)
+
+    def _fetch_trusted_facets(self, etag=None):
+        def handler(resp):
+            if resp.status_code == 304:
+                return None, etag
+            data = _parse_response(resp.status_code, resp.content,
+                                   codec=self._codec)
+            if self._models:
+                data = models.TrustedFacets.from_dict(data)
+            return data, resp.headers.get('ETag')
+        headers = {'If-None-Match': etag} if etag else {}
+
+        def fetch():
+            return self._req('GET', self._endpoint, op='get_trusted_facets',
+                             handler=handler, headers=headers)
+        if self._single_flight is not None:
+            return self._single_flight.do(('trusted_facets', etag), fetch,
+                                          self._time_left())
+        return fetch()
 
     def get_trusted_facets(self):
-        return self._req('GET', self._endpoint)
+        if self._facet_cache is not None:
+            return self._facet_cache.get(self._fetch_trusted_facets)
+        return self._req('GET', self._endpoint, op='get_trusted_facets',
+                         model=models.TrustedFacets)
+
+    def _invalidate_devices(self, username):
+        if self._device_cache is not None:
+            self._device_cache.invalidate(username)
+        if self._negative_cache is not None:
+            self._negative_cache.invalidate(username)
+
+    def _negative(self, username, op, func):
+        """Calls func, unless its failure for the user is cached."""
+        if self._negative_cache is None:
+            return func()
+        error = self._negative_cache.get(username, op)
+        if error is not None:
+            raise error
+        generation = self._negative_cache.generation(username)
+        try:
+            return func()
+        except (exc.NotFoundException, exc.NoEligableDevicesException) as e:
+            self._negative_cache.add(username, op, e, generation)
+            raise
 
     def get_device(self, username, handle):
+        if self._device_cache is not None:
+            device = self._device_cache.get_device(username, handle)
+            if device is not None:
+                return device
+
+        def cached(fetch):
+            if self._device_cache is None:
+                return fetch()
+            generation = self._device_cache.generation(username)
+            device = fetch()
+            self._device_cache.set_device(username, handle, device,
+                                          generation)
+            return device
         url = self._endpoint + username + '/' + handle
-        return self._req('GET', url)
+        return self._req('GET', url, op='get_device', model=models.Device,
+                         cache=cached)
 
     def get_certificate(self, username, handle):
         url = self._endpoint + username + '/' + handle
-        return self._req('GET', url, resp_is_json=False)
+        return self._req('GET', url, op='get_certificate', resp_is_json=False)
+
+    def iter_certificate(self, username, handle, chunk_size=8192):
+        """Streams the certificate of a device, returning an iterator over
+        chunks of at most chunk_size bytes.
+        """
+        url = self._endpoint + username + '/' + handle
+
+        def handler(resp):
+            if resp.status_code >= 400:
+                _parse_response(resp.status_code, resp.content, False)
+            return resp
+        resp = self._req('GET', url, op='get_certificate', handler=handler,
+                         stream=True)
+        return self._transport.iter_content(resp, chunk_size)
+
+    def download_certificate(self, username, handle, fileobj,
+                             chunk_size=8192):
+        """Writes the certificate of a device to a file-like object, or any
+        object with a write method. Returns the number of bytes written.
+        """
+        written = 0
+        for chunk in self.iter_certificate(username, handle, chunk_size):
+            fileobj.write(chunk)
+            written += len(chunk)
+        return written
+
+    def export_certificates(self, usernames, fileobj, workers=10):
+        """Writes the certificates of all devices of the given users to a tar
+        archive, as username/handle.crt.
+
+        Devices are listed and certificates fetched concurrently, but only a
+        bounded number of certificates is held in memory at once. The two
+        run at the same time and share workers threads between them, so that
+        no more requests are in flight than a pool of workers connections
+        holds (two, when workers is 1). fileobj does not need to be
+        seekable. Returns a list of (item, exception) tuples for the users or
+        devices which failed, where item is a username or a (username,
+        handle) tuple.
+        """
+        failures = []
+        listers = max(1, workers // 2)
+        fetchers = max(1, workers - listers)
+
+        def devices():
+            for username, result in self.list_devices_many(usernames,
+                                                           listers):
+                if isinstance(result, Exception):
+                    failures.append((username, result))
+                    continue
+                for device in result:
+                    yield username, device['handle']
+
+        archive = tarfile.open(fileobj=fileobj, mode='w|')
+        try:
+            results = batch.run_batch(
+                lambda item: self.get_certificate(*item), devices(), fetchers)
+            for (username, handle), result in results:
+                if isinstance(result, Exception):
+                    failures.append(((username, handle), result))
+                    continue
+                info = tarfile.TarInfo('%s/%s.crt' % (username, handle))
+                info.size = len(result)
+                info.mtime = time.time()
+                archive.addfile(info, io.BytesIO(result))
+        finally:
+            archive.close()
+        return failures
 
     def delete_user(self, username):
         url = self._endpoint + username + '/'
-        self._req('DELETE', url, resp_is_json=False)
+        try:
+            self._req('DELETE', url, op='delete_user', resp_is_json=False)
+        finally:
+            self._invalidate_devices(username)
+
+    def delete_user_many(self, usernames, workers=10, rate=None, burst=1,
+                         checkpoint=0):
+        """Deletes many users concurrently, at most rate per second.
+
+        Returns a batch.BulkOperation, which performs the deletions as it is
+        iterated over, or when its run() method is called.
+        """
+        return batch.BulkOperation(self.delete_user, usernames, workers,
+                                   rate, burst, checkpoint)
 
     def list_devices(self, username):
+        if self._device_cache is not None:
+            devices = self._device_cache.get_devices(username)
+            if devices is not None:
+                return devices
+
+        def cached(fetch):
+            if self._device_cache is None:
+                return self._negative(username, 'list_devices', fetch)
+            generation = self._device_cache.generation(username)
+            devices = self._negative(username, 'list_devices', fetch)
+            self._device_cache.set_devices(username, devices, generation)
+            return devices
         url = self._endpoint + username + '/'
-        return self._req('GET', url)
+        return self._req('GET', url, op='list_devices', model=models.Device,
+                         cache=cached)
+
+    def list_devices_many(self, usernames, workers=10):
+        """Lists the devices of many users concurrently.
+
+        Yields (username, devices) tuples as they complete, see
+        batch.run_batch. All workers share the connection pool of the
+        client, which should hold at least workers connections.
+        """
+        return batch.run_batch(self.list_devices, usernames, workers)
+
+    def get_device_many(self, devices, workers=10):
+        """Gets many devices concurrently, given (username, handle) tuples.
+
+        Yields ((username, handle), device) tuples as they complete, see
+        batch.run_batch.
+        """
+        return batch.run_batch(lambda item: self.get_device(*item), devices,
+                               workers)
 
     def update_device(self, username, handle, properties):
         url = self._endpoint + username + '/' + handle
-        return self._req('POST', url, json=properties)
+        try:
+            return self._req('POST', url, op='update_device', json=properties,
+                             model=models.Device)
+        finally:
+            self._invalidate_devices(username)
+
+    def _completion(self, key, response, properties):
+        if self._passthrough:
+            try:
+                return codec.splice(self._codec, key, response, properties)
+            except ValueError:
+                pass  # Not an object, parsed below like any other response.
+        data = {key: _json.loads(response)}
+        if properties:
+            data['properties'] = properties
+        return data
 
     def register_begin(self, username, properties=None, challenge=None):
         url = self._endpoint + username + '/register'
@@ -98,19 +564,34 @@ class Client(object):
             params['properties'] = _json.dumps(properties)
         if challenge is not None:
             params['challenge'] = challenge
-        return self._req('GET', url, params=params)
+        return self._req('GET', url, op='register_begin', params=params,
+                         model=models.RegisterRequest)
 
     def register_complete(self, username, register_response, properties=None):
         url = self._endpoint + username + '/register'
-        data = {'registerResponse': _json.loads(register_response)}
-        if properties:
-            data['properties'] = properties
+        data = self._completion('registerResponse', register_response,
+                                properties)
 
-        return self._req('POST', url, json=data)
+        try:
+            return self._req('POST', url, op='register_complete', json=data,
+                             model=models.Device)
+        finally:
+            self._invalidate_devices(username)
 
     def unregister(self, username, handle):
         url = self._endpoint + username + '/' + handle
-        self._req('DELETE', url, resp_is_json=False)
+        try:
+            self._req('DELETE', url, op='unregister', resp_is_json=False)
+        finally:
+            self._invalidate_devices(username)
+
+    def unregister_many(self, devices, workers=10, rate=None, burst=1,
+                        checkpoint=0):
+        """Unregisters many devices concurrently, given (username, handle)
+        tuples, at most rate per second. See delete_user_many.
+        """
+        return batch.BulkOperation(lambda item: self.unregister(*item),
+                                   devices, workers, rate, burst, checkpoint)
 
     def auth_begin(self, username, properties=None, challenge=None,
                    handles=None):
@@ -122,11 +603,19 @@ class Client(object):
             params['challenge'] = challenge
         if handles is not None:
             params['handle'] = handles
-        return self._req('GET', url, params=params)
+
+        def cached(fetch):
+            return self._negative(username, 'auth_begin', fetch)
+        # With handles, the outcome only applies to the given devices.
+        return self._req('GET', url, op='auth_begin', params=params,
+                         model=models.SignRequest,
+                         cache=cached if handles is None else None)
 
     def auth_complete(self, username, sign_response, properties=None):
         url = self._endpoint + username + '/sign'
-        data = {'signResponse': _json.loads(sign_response)}
-        if properties:
-            data['properties'] = properties
-        return self._req('POST', url, json=data)
+        data = self._completion('signResponse', sign_response, properties)
+        try:
+            return self._req('POST', url, op='auth_complete', json=data,
+                             model=models.Device)
+        finally:
+            self._invalidate_devices(username)
@@ -0,0 +1,160 @@
+# Copyright (c) 2014 Yubico AB
+# All rights reserved.
+#
+#   Redistribution and use in source and binary forms, with or
+#   without modification, are permitted provided that the following
+#   conditions are met:
+#
+#    1. Redistributions of source code must retain the above copyright
+#       notice, this list of conditions and the following disclaimer.
+#    2. Redistributions in binary form must reproduce the above
+#       copyright notice, this list of conditions and the following
+#       disclaimer in the documentation and/or other materials provided
+#       with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+"""Coalescing of identical concurrent requests ("single flight")."""
+
+from u2fval_client import exc
+import copy
+import threading
+import time
+
+__all__ = ['SingleFlight', 'AsyncSingleFlight']
+
+
+def freeze(value):
+    """Turns request arguments into a hashable key."""
+    if isinstance(value, dict):
+        return tuple(sorted((k, freeze(v)) for k, v in value.items()))
+    if isinstance(value, (list, tuple)):
+        return tuple(freeze(v) for v in value)
+    return value
+
+
+_now = getattr(time, 'monotonic', time.time)
+
+
+def _copy(error):
+    """Returns a copy of a shared exception to raise, so that each caller
+    raising it does not add to the traceback of the others.
+    """
+    try:
+        return copy.copy(error)
+    except Exception:
+        return error
+
+
+class _Call(object):
+
+    __slots__ = ('event', 'result', 'error')
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight(object):
+
+    """Lets concurrent callers with the same key share a single call.
+
+    The first caller for a key makes the call, while any others arriving
+    before it completes wait for it and receive the same result, or have the
+    same exception raised, as a copy. Results are shared between callers and
+    must not be modified.
+
+    A TimeoutException is not shared, as it depends on the deadline of the
+    caller making the call: a waiting caller makes the call again instead.
+    """
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.coalesced = 0
+
+    def do(self, key, func, timeout=None):
+        """Returns func(), or the result of an identical call in flight.
+
+        timeout limits the time spent waiting for a call made by another
+        caller, after which TimeoutException is raised.
+        """
+        expires = None if timeout is None else _now() + timeout
+        while True:
+            with self._lock:
+                call = self._calls.get(key)
+                leader = call is None
+                if leader:
+                    call = self._calls[key] = _Call()
+                    self.calls += 1
+                else:
+                    self.coalesced += 1
+            if leader:
+                break
+            if not call.event.wait(None if expires is None
+                                   else max(0, expires - _now())):
+                raise exc.TimeoutException('Deadline exceeded')
+            if isinstance(call.error, exc.TimeoutException):
+                continue
+            if call.error is not None:
+                raise _copy(call.error)
+            return call.result
+        try:
+            call.result = func()
+            return call.result
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.event.set()
+
+    def stats(self):
+        """Returns the number of calls made and calls coalesced into them."""
+        return {'calls': self.calls, 'coalesced': self.coalesced}
+
+
+class AsyncSingleFlight(object):
+
+    """Like SingleFlight, for coroutines running on an asyncio event loop.
+
+    The shared call is shielded, so a caller being cancelled does not cancel
+    it for the others.
+    """
+
+    def __init__(self):
+        self._calls = {}
+        self.calls = 0
+        self.coalesced = 0
+
+    def do(self, key, func):
+        """Returns an awaitable for the result of the coroutine func(), or of
+        an identical call in flight.
+        """
+        import asyncio
+        future = self._calls.get(key)
+        if future is not None:
+            self.coalesced += 1
+        else:
+            future = self._calls[key] = asyncio.ensure_future(func())
+            future.add_done_callback(lambda _: self._calls.pop(key, None))
+            self.calls += 1
+        return asyncio.shield(future)
+
+    def stats(self):
+        """Returns the number of calls made and calls coalesced into them."""
+        return {'calls': self.calls, 'coalesced': self.coalesced}
@@ -0,0 +1,97 @@
+# Copyright (c) 2014 Yubico AB
+# All rights reserved.
+#
+#   Redistribution and use in source and binary forms, with or
+#   without modification, are permitted provided that the following
+#   conditions are met:
+#
+#    1. Redistributions of source code must retain the above copyright
+#       notice, this list of conditions and the following disclaimer.
+#    2. Redistributions in binary form must reproduce the above
+#       copyright notice, this list of conditions and the following
+#       disclaimer in the documentation and/or other materials provided
+#       with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+"""JSON codecs used by the Client to encode requests and decode responses.
+
+A codec has a dumps method turning an object into UTF-8 encoded bytes, and
+a loads method doing the reverse. JsonCodec uses the standard library, and
+is the default. OrjsonCodec uses orjson, if installed, and best_available()
+returns the fastest codec which can be used.
+"""
+
+import json as _json
+
+__all__ = ['JsonCodec', 'OrjsonCodec', 'best_available', 'splice']
+
+
+class JsonCodec(object):
+
+    def dumps(self, obj):
+        return _json.dumps(obj).encode('utf-8')
+
+    def loads(self, data):
+        return _json.loads(data.decode('utf-8'))
+
+
+class OrjsonCodec(object):
+
+    def __init__(self):
+        import orjson
+        self.dumps = orjson.dumps
+        self.loads = orjson.loads
+
+
+def best_available():
+    """Returns an instance of the fastest available codec."""
+    try:
+        return OrjsonCodec()
+    except ImportError:
+        return JsonCodec()
+
+
+_decoder = _json.JSONDecoder()
+
+
+def _is_object(text):
+    # True if text is a single JSON object, with nothing but whitespace
+    # around it.
+    text = text.strip(' \t\n\r')
+    if not text.startswith('{'):
+        return False
+    try:
+        _, end = _decoder.raw_decode(text)
+    except ValueError:
+        return False
+    return end == len(text)
+
+
+def splice(codec, key, response, properties=None):
+    """Builds the body of a register or sign completion request.
+
+    The response, as received from the browser, is inserted under key
+    without being serialized again. As it comes from an untrusted source,
+    ValueError is raised unless it is a single JSON object, so that it
+    cannot add keys of its own to the body.
+    """
+    if isinstance(response, bytes):
+        response = response.decode('utf-8')
+    if not _is_object(response):
+        raise ValueError('Response is not a single JSON object')
+    body = b'{"' + key.encode('ascii') + b'": ' + response.encode('utf-8')
+    if properties:
+        body += b', "properties": ' + codec.dumps(properties)
+    return body + b'}'
@@ -0,0 +1,198 @@
+# Copyright (c) 2014 Yubico AB
+# All rights reserved.
+#
+#   Redistribution and use in source and binary forms, with or
+#   without modification, are permitted provided that the following
+#   conditions are met:
+#
+#    1. Redistributions of source code must retain the above copyright
+#       notice, this list of conditions and the following disclaimer.
+#    2. Redistributions in binary form must reproduce the above
+#       copyright notice, this list of conditions and the following
+#       disclaimer in the documentation and/or other materials provided
+#       with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+"""Compression of request and response bodies.
+
+Responses can be compressed with gzip or deflate, and with brotli (br) or
+zstd when the brotli or zstandard packages are installed. requests and
+httpx decompress responses themselves, while HttpClientTransport uses
+Decompressor. Passing a Compression to Client makes it ask for compressed
+responses, optionally compress large request bodies, and count the bytes
+saved. Unless told otherwise, it only asks for the encodings listed by the
+encodings attribute of the transport, or gzip and deflate if it has none.
+"""
+
+import threading
+import zlib
+
+__all__ = ['Compression', 'Decompressor', 'available_encodings']
+
+
+def _brotli():
+    try:
+        import brotli
+    except ImportError:
+        import brotlicffi as brotli
+    return brotli
+
+
+def available_encodings():
+    """Returns the encodings which can be decompressed, most preferred
+    first.
+    """
+    encodings = []
+    try:
+        import zstandard  # noqa: F401
+        encodings.append('zstd')
+    except ImportError:
+        pass
+    try:
+        _brotli()
+        encodings.append('br')
+    except ImportError:
+        pass
+    return encodings + ['gzip', 'deflate']
+
+
+class Decompressor(object):
+
+    """Incrementally decompresses a body with the given Content-Encoding.
+
+    Data is fed to decompress as it arrives, which returns whatever can be
+    decompressed so far, and flush returns the remainder.
+    """
+
+    def __init__(self, encoding):
+        encoding = encoding.strip().lower()
+        self._raw_deflate = False
+        if encoding == 'gzip':
+            obj = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        elif encoding == 'deflate':
+            # Servers send either zlib wrapped or raw deflate data.
+            obj = zlib.decompressobj()
+            self._raw_deflate = True
+        elif encoding == 'br':
+            obj = _brotli().Decompressor()
+            self.decompress = getattr(obj, 'process', None) or obj.decompress
+            self.flush = lambda: b''
+            return
+        elif encoding == 'zstd':
+            import zstandard
+            obj = zstandard.ZstdDecompressor().decompressobj()
+        else:
+            raise ValueError('Unsupported Content-Encoding: ' + encoding)
+        self._obj = obj
+
+    def decompress(self, data):
+        if self._raw_deflate and data:
+            self._raw_deflate = False
+            try:
+                return self._obj.decompress(data)
+            except zlib.error:
+                self._obj = zlib.decompressobj(-zlib.MAX_WBITS)
+        return self._obj.decompress(data)
+
+    def flush(self):
+        return self._obj.flush()
+
+
+def _compress(encoding, data, level):
+    if encoding == 'gzip':
+        obj = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+        return obj.compress(data) + obj.flush()
+    if encoding == 'deflate':
+        return zlib.compress(data, level)
+    if encoding == 'br':
+        return _brotli().compress(data, quality=min(level, 11))
+    if encoding == 'zstd':
+        import zstandard
+        return zstandard.ZstdCompressor(level=level).compress(data)
+    raise ValueError('Unsupported Content-Encoding: ' + encoding)
+
+
+class Compression(object):
+
+    """Compression settings for a Client.
+
+    Responses are requested compressed with any of accept, by default the
+    encodings which the transport of the Client decompresses (see
+    accept_encoding). With compress_requests set, request bodies of
+    at least min_size bytes are compressed with encoding at the given
+    level, which the server must support.
+
+    The number of bytes sent and received, before and after compression,
+    is available through stats(), counting response bodies which are not
+    streamed. A Compression may be shared between clients.
+    """
+
+    def __init__(self, accept=None, compress_requests=False, min_size=1024,
+                 encoding='gzip', level=6):
+        self.accept = tuple(accept) if accept else None
+        self.compress_requests = compress_requests
+        self.min_size = min_size
+        self.encoding = encoding
+        self.level = level
+        self._lock = threading.Lock()
+        self.bytes_out = 0
+        self.wire_bytes_out = 0
+        self.bytes_in = 0
+        self.wire_bytes_in = 0
+
+    def accept_encoding(self, encodings=None):
+        """Returns the Accept-Encoding header to send, listing accept if
+        given, or else encodings, those which the transport decompresses
+        (gzip and deflate if None).
+        """
+        return ', '.join(self.accept or encodings or ('gzip', 'deflate'))
+
+    def compress(self, data):
+        """Compresses a request body if it is large enough, returning the
+        body to send and its Content-Encoding, or None if not compressed.
+        """
+        encoding = None
+        size = len(data)
+        if self.compress_requests and size >= self.min_size:
+            compressed = _compress(self.encoding, data, self.level)
+            if len(compressed) < size:
+                data = compressed
+                encoding = self.encoding
+        with self._lock:
+            self.bytes_out += size
+            self.wire_bytes_out += len(data)
+        return data, encoding
+
+    def record_response(self, wire_size, size):
+        """Counts a response body of size bytes, of which wire_size bytes
+        were received.
+        """
+        with self._lock:
+            self.bytes_in += size
+            self.wire_bytes_in += wire_size
+
+    def stats(self):
+        """Returns the numbers of bytes sent and received before and after
+        compression, and the number of bytes saved by it.
+        """
+        with self._lock:
+            return {
+                'bytes_out': self.bytes_out,
+                'wire_bytes_out': self.wire_bytes_out,
+                'bytes_in': self.bytes_in,
+                'wire_bytes_in': self.wire_bytes_in,
+                'bytes_saved': (self.bytes_out - self.wire_bytes_out +
+                                self.bytes_in - self.wire_bytes_in),
+            }
@@ -0,0 +1,171 @@
+# Copyright (c) 2014 Yubico AB
+# All rights reserved.
+#
+#   Redistribution and use in source and binary forms, with or
+#   without modification, are permitted provided that the following
+#   conditions are met:
+#
+#    1. Redistributions of source code must retain the above copyright
+#       notice, this list of conditions and the following disclaimer.
+#    2. Redistributions in binary form must reproduce the above
+#       copyright notice, this list of conditions and the following
+#       disclaimer in the documentation and/or other materials provided
+#       with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+"""Deadlines shared by all client calls made within a scope.
+
+    with deadline.scope(2.0):
+        client.auth_begin(username)
+        ...
+        client.auth_complete(username, response)
+
+Calls made inside the with block, including nested scopes, must complete
+before the deadline, or raise a TimeoutException. The deadline follows the
+current thread, or the current task when using asyncio. Before Python 3.7,
+which lacks contextvars, tasks do not inherit the deadline of the task
+creating them.
+"""
+
+from u2fval_client import exc
+from contextlib import contextmanager
+import sys
+import threading
+import time
+import weakref
+
+__all__ = ['scope', 'remaining', 'expiry', 'clamp', 'left']
+
+_now = getattr(time, 'monotonic', time.time)
+
+
+
+def _current_task():
+    """Returns the asyncio task running in this thread, or None."""
+    asyncio = sys.modules.get('asyncio')
+    # Tasks can't be told apart before Python 3.5.3, nor before asyncio is
+    # imported.
+    get_loop = getattr(asyncio, '_get_running_loop', None)
+    loop = get_loop() if get_loop is not None else None
+    if loop is None:
+        return None
+    current_task = getattr(asyncio, 'current_task', None) or \
+        asyncio.Task.current_task
+    return current_task(loop=loop)
+
+
+class _TaskLocal(object):
+
+    """Holds a value per thread, or per asyncio task inside of one, in place
+    of a ContextVar.
+    """
+
+    def __init__(self):
+        self._local = threading.local()
+        self._tasks = weakref.WeakKeyDictionary()
+
+    def get(self):
+        task = _current_task()
+        if task is not None:
+            return self._tasks.get(task)
+        return getattr(self._local, 'value', None)
+
+    def set(self, value):
+        task = _current_task()
+        if task is not None:
+            token = (task, self._tasks.get(task))
+            self._tasks[task] = value
+        else:
+            token = (None, getattr(self._local, 'value', None))
+            self._local.value = value
+        return token
+
+    def reset(self, token):
+        task, value = token
+        if task is None:
+            self._local.value = value
+        elif value is None:
+            self._tasks.pop(task, None)
+        else:
+            self._tasks[task] = value
+
+
+try:
+    from contextvars import ContextVar
+    _current = ContextVar('u2fval_deadline', default=None)
+except ImportError:  # Python < 3.7
+    _current = _TaskLocal()
+_get = _current.get
+_set = _current.set
+_reset = _current.reset
+
+
+@contextmanager
+def scope(seconds):
+    """Sets a deadline seconds from now, for calls made within the scope. An
+    earlier deadline set by an enclosing scope is kept.
+    """
+    expires = _now() + seconds
+    current = _get()
+    if current is not None:
+        expires = min(expires, current)
+    token = _set(expires)
+    try:
+        yield
+    finally:
+        _reset(token)
+
+
+def remaining():
+    """Returns the number of seconds left before the current deadline, or
+    None if there is none.
+    """
+    current = _get()
+    if current is None:
+        return None
+    return current - _now()
+
+
+def expiry(timeout=None):
+    """Returns the time by which a call must complete, considering both the
+    current deadline and a per-call timeout, or None.
+    """
+    expires = _get()
+    if timeout is not None:
+        call_expires = _now() + timeout
+        if expires is None or call_expires < expires:
+            expires = call_expires
+    return expires
+
+
+def clamp(timeout, expires):
+    """Limits a requests style timeout, None, a number or a (connect, read)
+    tuple, to the time left before expires.
+
+    Raises TimeoutException if no time is left.
+    """
+    if expires is None:
+        return timeout
+    left = expires - _now()
+    if left <= 0:
+        raise exc.TimeoutException('Deadline exceeded')
+    if isinstance(timeout, tuple):
+        return tuple(left if t is None else min(t, left) for t in timeout)
+    return left if timeout is None else min(timeout, left)
+
+
+def left(expires):
+    """Returns the seconds left before expires, or None."""
+    return None if expires is None else expires - _now()
@@ -28,7 +28,10 @@
 __all__ = [
     'U2fValClientException',
     'ServerUnreachableException',
+    'CircuitOpenException',
+    'TimeoutException',
     'BadAuthException',
+    'NotFoundException',
     'U2fValException',
     'BadInputException',
     'NoEligableDevicesException',
@@ -47,6 +50,16 @@ class ServerUnreachableException(U2fValClientException):
     "The U2FVAL server cannot be reached"
 
 
+class TimeoutException(ServerUnreachableException):
+
+    "The U2FVAL server did not respond within the allowed time"
+
+
+class CircuitOpenException(ServerUnreachableException):
+
+    "The U2FVAL server is considered down, no request was made"
+
+
 class InvalidResponseException(U2fValClientException):
 
     "The server sent something which is not valid"
@@ -57,6 +70,11 @@ class BadAuthException(U2fValClientException):
     "Access was denied"
 
 
+class NotFoundException(U2fValClientException):
+
+    "The requested user or device does not exist"
+
+
 class U2fValException(Exception):
 
     "Exception sent from the U2FVAL server"
@@ -0,0 +1,492 @@
+# Copyright (c) 2014 Yubico AB
+# All rights reserved.
+#
+#   Redistribution and use in source and binary forms, with or
+#   without modification, are permitted provided that the following
+#   conditions are met:
+#
+#    1. Redistributions of source code must retain the above copyright
+#       notice, this list of conditions and the following disclaimer.
+#    2. Redistributions in binary form must reproduce the above
+#       copyright notice, this list of conditions and the following
+#       disclaimer in the documentation and/or other materials provided
+#       with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+"""Fake U2FVAL server, for load and soak testing clients.
+
+FakeServer implements the REST API used by Client, keeping users and their
+devices in memory. It does not verify any cryptographic data: any
+registerResponse creates a device, and any signResponse naming the
+keyHandle of a device (or any device, if none is named) authenticates.
+Responses can be delayed according to a latency distribution, and errors
+injected at random, including the error codes of the exc module.
+
+The server is built on asyncio, so that slow responses do not tie up
+threads, and can run in a background thread or, to keep its load out of
+the measured process, in a subprocess. Requires Python 3.5+.
+
+    with FakeServer(latency=lognormal(0.01, 0.5), errors={503: 0.01}) as s:
+        client = Client(s.endpoint)
+        ...
+"""
+
+from base64 import urlsafe_b64encode
+from functools import partial
+from http.client import responses as _reasons
+from urllib.parse import unquote_plus
+import asyncio
+import gzip
+import json
+import math
+import multiprocessing
+import os
+import random
+import threading
+import time
+
+__all__ = ['FakeServer', 'constant', 'uniform', 'exponential', 'lognormal']
+
+_MESSAGES = {
+    10: 'Invalid input',
+    11: 'No eligable devices',
+    12: 'Device compromised',
+    401: 'Access denied',
+}
+
+
+# The distributions are partials of module level functions, rather than
+# lambdas, so that they can be pickled for a subprocess.
+def _constant(seconds):
+    return seconds
+
+
+def _uniform(low, high):
+    return random.uniform(low, high)
+
+
+def _exponential(rate):
+    return random.expovariate(rate)
+
+
+def _lognormal(mu, sigma):
+    return random.lognormvariate(mu, sigma)
+
+
+def constant(seconds):
+    """Latency distribution always delaying for the given time."""
+    return partial(_constant, seconds)
+
+
+def uniform(low, high):
+    """Latency distribution delaying uniformly between low and high."""
+    return partial(_uniform, low, high)
+
+
+def exponential(mean):
+    """Exponentially distributed latency, with the given mean."""
+    return partial(_exponential, 1.0 / mean)
+
+
+def lognormal(median, sigma):
+    """Log-normally distributed latency, with the given median. sigma sets
+    the length of the tail, e.g. 0.5 gives a p99 of about 3.2 times the
+    median.
+    """
+    return partial(_lognormal, math.log(median), sigma)
+
+
+def _now():
+    return time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime())
+
+
+def _random_id(size):
+    return urlsafe_b64encode(os.urandom(size)).rstrip(b'=').decode('ascii')
+
+
+class _HttpError(Exception):
+
+    def __init__(self, status, code=None, data=None):
+        self.status = status
+        self.code = code
+        self.data = data
+
+
+class _State(object):
+
+    """Users and devices of a FakeServer, and the API operating on them."""
+
+    def __init__(self, app_id, facets):
+        self.app_id = app_id
+        self.facets = json.dumps({'trustedFacets': [{
+            'version': {'major': 1, 'minor': 0},
+            'ids': list(facets or [app_id]),
+        }]}).encode('utf-8')
+        self.etag = '"%s"' % _random_id(6)
+        self.users = {}
+
+    def add_device(self, username, handle=None, properties=None,
+                   compromised=False):
+        now = _now()
+        device = {
+            'handle': handle or os.urandom(16).hex(),
+            'metadata': {'displayName': 'Fake U2F device',
+                         'vendor': 'Fake'},
+            'properties': dict(properties or {}),
+            'created': now,
+            'lastUsed': None,
+            'compromised': compromised,
+        }
+        self.users.setdefault(username, {})[device['handle']] = device
+        return device
+
+    def _devices(self, username):
+        devices = self.users.get(username)
+        if devices is None:
+            raise _HttpError(404)
+        return devices
+
+    def _device(self, username, handle):
+        device = self._devices(username).get(handle)
+        if device is None:
+            raise _HttpError(404)
+        return device
+
+    def _keys(self, devices):
+        return [{'version': 'U2F_V2', 'keyHandle': device['handle'],
+                 'appId': self.app_id}
+                for device in devices if not device['compromised']]
+
+    def _update(self, device, properties):
+        for key, value in (properties or {}).items():
+            if value is None:
+                device['properties'].pop(key, None)
+            else:
+                device['properties'][key] = value
+
+    def handle(self, method, path, params, headers, body):
+        """Returns the status, extra headers and JSON body of a response.
+        """
+        parts = path.strip('/').split('/') if path != '/' else []
+        data = json.loads(body.decode('utf-8')) if body else None
+        if not parts:
+            if method != 'GET':
+                raise _HttpError(405)
+            if headers.get('if-none-match') == self.etag:
+                return 304, {'ETag': self.etag}, None
+            return 200, {'ETag': self.etag}, self.facets
+        username = parts[0]
+        if len(parts) == 1:
+            if method == 'GET':
+                return 200, {}, list(self._devices(username).values())
+            if method == 'DELETE':
+                self._devices(username)
+                del self.users[username]
+                return 204, {}, None
+        elif parts[1] == 'register':
+            if method == 'GET':
+                return 200, {}, {
+                    'appId': self.app_id,
+                    'registerRequests': [{
+                        'version': 'U2F_V2',
+                        'challenge': params.get('challenge', _random_id(32)),
+                    }],
+                    'registeredKeys': self._keys(
+                        self.users.get(username, {}).values()),
+                }
+            if method == 'POST':
+                if not isinstance(data, dict) or \
+                        'registerResponse' not in data:
+                    raise _HttpError(400, 10)
+                device = self.add_device(username)
+                self._update(device, data.get('properties'))
+                return 200, {}, device
+        elif parts[1] == 'sign':
+            devices = self.users.get(username, {}).values()
+            handles = params.get('handle')
+            if handles:
+                devices = [d for d in devices if d['handle'] in handles]
+            if method == 'GET':
+                keys = self._keys(devices)
+                if not keys:
+                    raise _HttpError(400, 11, [d['handle'] for d in devices])
+                return 200, {}, {
+                    'appId': self.app_id,
+                    'challenge': params.get('challenge', _random_id(32)),
+                    'registeredKeys': keys,
+                }
+            if method == 'POST':
+                if not isinstance(data, dict) or \
+                        not isinstance(data.get('signResponse'), dict):
+                    raise _HttpError(400, 10)
+                handle = data['signResponse'].get('keyHandle')
+                if handle is None and devices:
+                    handle = next(iter(devices))['handle']
+                device = self.users.get(username, {}).get(handle)
+                if device is None:
+                    raise _HttpError(400, 10)
+                if device['compromised']:
+                    raise _HttpError(400, 12)
+                device['lastUsed'] = _now()
+                self._update(device, data.get('properties'))
+                return 200, {}, device
+        elif len(parts) == 2:
+            if method == 'GET':
+                return 200, {}, self._device(username, parts[1])
+            if method == 'POST':
+                device = self._device(username, parts[1])
+                self._update(device, data)
+                return 200, {}, device
+            if method == 'DELETE':
+                devices = self._devices(username)
+                if devices.pop(parts[1], None) is None:
+                    raise _HttpError(404)
+                return 204, {}, None
+        elif len(parts) == 3 and parts[2] == 'certificate' and \
+                method == 'GET':
+            device = self._device(username, parts[1])
+            pem = ('-----BEGIN CERTIFICATE-----\n%s\n'
+                   '-----END CERTIFICATE-----\n' % device['handle'])
+            return 200, {'Content-Type': 'application/x-pem-file'}, \
+                pem.encode('ascii')
+        raise _HttpError(404 if method in ('GET', 'DELETE') else 405)
+
+
+class FakeServer(object):
+
+    """Fake U2FVAL server, listening on host and port (by default a free
+    port on the loopback interface).
+
+    latency is a function returning the number of seconds to delay each
+    response by, such as those of this module, or a constant number of
+    seconds. When running in a subprocess it must be picklable, as those
+    of this module are. errors maps error codes to the probability of a
+    request failing with them. The codes of exc._ERRORS (10, 11, 12 and
+    401) are returned like the real server does, other codes as an empty
+    response with that HTTP status. If api_token is set, requests must
+    carry it as a bearer token.
+
+    Responses of at least compress_min_size bytes are gzip compressed for
+    clients accepting it, and gzip compressed request bodies are accepted.
+
+    Devices can be added directly using add_device, before starting the
+    server if it runs in a subprocess. stats() returns the number of
+    connections accepted and requests handled.
+    """
+
+    def __init__(self, host='127.0.0.1', port=0, latency=None, errors=None,
+                 api_token=None, app_id='https://example.com', facets=None,
+                 compress_min_size=1024, backlog=4096):
+        if latency is not None and not callable(latency):
+            latency = constant(latency)
+        self._host = host
+        self._port = port
+        self._latency = latency
+        self._errors = sorted((errors or {}).items())
+        self._auth = None if api_token is None else 'Bearer ' + api_token
+        self._compress_min_size = compress_min_size
+        self._backlog = backlog
+        self._state = _State(app_id, facets)
+        self._connections = multiprocessing.Value('l', 0, lock=False)
+        self._requests = multiprocessing.Value('l', 0, lock=False)
+        self._process = None
+        self._thread = None
+        self._loop = None
+        self._writers = set()
+        self.endpoint = None
+
+    def add_device(self, username, handle=None, properties=None,
+                   compromised=False):
+        """Registers a device for a user, returning it."""
+        if self._process is not None:
+            raise ValueError('The server runs in a subprocess')
+        return self._state.add_device(username, handle, properties,
+                                      compromised)
+
+    def stats(self):
+        """Returns the number of connections and requests handled."""
+        return {'connections': self._connections.value,
+                'requests': self._requests.value}
+
+    def _error(self):
+        if self._errors:
+            value = random.random()
+            for code, probability in self._errors:
+                if value < probability:
+                    return code
+                value -= probability
+        return None
+
+    async def _respond(self, method, target, headers, body):
+        if self._latency is not None:
+            await asyncio.sleep(self._latency())
+        path, _, query = target.partition('?')
+        params = {}
+        for pair in query.split('&') if query else ():
+            key, _, value = pair.partition('=')
+            params.setdefault(unquote_plus(key), []).append(
+                unquote_plus(value))
+        params = dict((k, v if k == 'handle' else v[0])
+                      for k, v in params.items())
+        extra = {}
+        try:
+            if self._auth is not None and \
+                    headers.get('authorization') != self._auth:
+                raise _HttpError(401, 401)
+            code = self._error()
+            if code == 401:
+                raise _HttpError(401, 401)
+            elif code in _MESSAGES:
+                raise _HttpError(400, code)
+            elif code is not None:
+                raise _HttpError(code)
+            if headers.get('content-encoding') == 'gzip':
+                body = gzip.decompress(body)
+            status, extra, data = self._state.handle(
+                method, unquote_plus(path), params, headers, body)
+        except _HttpError as e:
+            status, data = e.status, None
+            if e.code is not None:
+                data = {'errorCode': e.code,
+                        'errorMessage': _MESSAGES.get(e.code)}
+                if e.data is not None:
+                    data['errorData'] = e.data
+        except (ValueError, OSError):
+            status, data = 400, {'errorCode': 10,
+                                 'errorMessage': _MESSAGES[10]}
+        if data is None:
+            content = b''
+        elif isinstance(data, bytes):
+            content = data
+        else:
+            content = json.dumps(data).encode('utf-8')
+            extra.setdefault('Content-Type', 'application/json')
+        if len(content) >= self._compress_min_size and \
+                'gzip' in headers.get('accept-encoding', ''):
+            content = gzip.compress(content)
+            extra['Content-Encoding'] = 'gzip'
+        return status, extra, content
+
+    async def _serve_connection(self, reader, writer):
+        self._connections.value += 1
+        self._writers.add(writer)
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                method, target, version = line.decode('latin-1').split()
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    key, _, value = line.decode('latin-1').partition(':')
+                    headers[key.strip().lower()] = value.strip()
+                length = int(headers.get('content-length', 0))
+                body = await reader.readexactly(length) if length else b''
+                self._requests.value += 1
+
+                status, extra, content = await self._respond(
+                    method, target, headers, body)
+                keep_alive = version == 'HTTP/1.1' and \
+                    headers.get('connection', '').lower() != 'close'
+                head = ['HTTP/1.1 %d %s' % (status,
+                                            _reasons.get(status, 'Unknown')),
+                        'Content-Length: %d' % len(content),
+                        'Connection: %s' % ('keep-alive' if keep_alive
+                                            else 'close')]
+                head.extend('%s: %s' % item for item in extra.items())
+                writer.write(('\r\n'.join(head) + '\r\n\r\n')
+                             .encode('latin-1') + content)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ValueError, ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            self._writers.discard(writer)
+            writer.close()
+
+    def _listen(self, loop):
+        return loop.run_until_complete(asyncio.start_server(
+            self._serve_connection, self._host, self._port,
+            backlog=self._backlog))
+
+    def _run(self, started):
+        loop = self._loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        try:
+            server = self._listen(loop)
+        except Exception as e:
+            started.put(e)
+            raise
+        started.put(server.sockets[0].getsockname()[1])
+        try:
+            loop.run_forever()
+        finally:
+            server.close()
+            for writer in list(self._writers):
+                writer.close()
+            loop.run_until_complete(server.wait_closed())
+            if hasattr(asyncio, 'all_tasks'):
+                pending = asyncio.all_tasks(loop)
+            else:  # Python < 3.7
+                pending = [t for t in asyncio.Task.all_tasks(loop)
+                           if not t.done()]
+            if pending:
+                loop.run_until_complete(asyncio.wait(pending))
+            loop.close()
+
+    def start(self, subprocess=False):
+        """Starts serving in a background thread, or in a subprocess."""
+        if subprocess:
+            started = multiprocessing.Queue()
+            self._process = multiprocessing.Process(target=self._run,
+                                                    args=(started,))
+            self._process.daemon = True
+            self._process.start()
+        else:
+            import queue
+            started = queue.Queue()
+            self._thread = threading.Thread(target=self._run,
+                                            args=(started,))
+            self._thread.daemon = True
+            self._thread.start()
+        port = started.get(timeout=10)
+        if isinstance(port, Exception):
+            raise port
+        self.endpoint = 'http://%s:%d/' % (self._host, port)
+        return self
+
+    def stop(self):
+        """Stops the server."""
+        if self._process is not None:
+            self._process.terminate()
+            self._process.join()
+            self._process = None
+        elif self._thread is not None:
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join()
+            self._thread = None
+
+    def __enter__(self):
+        if self.endpoint is None:
+            self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
@@ -0,0 +1,252 @@
+# Copyright (c) 2014 Yubico AB
+# All rights reserved.
+#
+#   Redistribution and use in source and binary forms, with or
+#   without modification, are permitted provided that the following
+#   conditions are met:
+#
+#    1. Redistributions of source code must retain the above copyright
+#       notice, this list of conditions and the following disclaimer.
+#    2. Redistributions in binary form must reproduce the above
+#       copyright notice, this list of conditions and the following
+#       disclaimer in the documentation and/or other materials provided
+#       with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+"""HTTP/2 transports, multiplexing concurrent requests over few connections.
+
+Requires httpx with HTTP/2 support, which can be installed using the
+"http2" extra:
+
+  pip install u2fval-client[http2]
+
+Http2Transport can be passed to Client as transport, and AsyncHttp2Session
+to AsyncClient as session. Over https, HTTP/2 is negotiated with the
+server, falling back to HTTP/1.1. With prior_knowledge set, HTTP/2 is used
+without negotiation, which is required for plain http.
+
+The auth callables and extra_args are the same as for Client, except that
+requests auth objects (such as requests.auth.HTTPDigestAuth) cannot be
+used. TLS verification is configured through the verify and cert arguments
+of the transport, which replace those in extra_args.
+"""
+
+from u2fval_client import exc
+from base64 import b64encode
+from datetime import timedelta
+from timeit import default_timer as _timer
+import httpx
+
+__all__ = ['Http2Transport', 'AsyncHttp2Session']
+
+
+def _encodings():
+    """Returns the Content-Encodings which httpx decompresses, which depend
+    on its version and on the packages installed.
+    """
+    try:
+        from httpx._decoders import SUPPORTED_DECODERS
+    except ImportError:
+        return ('gzip', 'deflate')
+    return tuple(encoding for encoding in SUPPORTED_DECODERS
+                 if encoding != 'identity')
+
+
+def _timeout(timeout):
+    if isinstance(timeout, httpx.Timeout):
+        return timeout
+    if isinstance(timeout, tuple):
+        connect, read = timeout
+        return httpx.Timeout(None, connect=connect, read=read)
+    return httpx.Timeout(timeout)
+
+
+def _to_httpx(args):
+    """Translates requests style keyword arguments into arguments for
+    httpx build_request, returning them and whether to stream the response.
+    """
+    args = dict(args)
+    stream = args.pop('stream', False)
+    args.pop('verify', None)
+    args.pop('cert', None)
+    if 'data' in args:
+        args['content'] = args.pop('data')
+    args['timeout'] = _timeout(args.get('timeout'))
+    if 'auth' in args:
+        credentials = args.pop('auth')
+        if not isinstance(credentials, tuple):
+            raise ValueError('Only basic authentication is supported')
+        token = b64encode(':'.join(credentials).encode('utf-8'))
+        headers = dict(args.get('headers', {}))
+        headers['Authorization'] = 'Basic ' + token.decode('ascii')
+        args['headers'] = headers
+    return args, stream
+
+
+def _limits(max_connections):
+    return httpx.Limits(max_connections=max_connections,
+                        max_keepalive_connections=max_connections)
+
+
+class _Response(object):
+
+    """Wraps a httpx.Response in the interface used by Client."""
+
+    __slots__ = ('_resp', 'status_code', 'headers', 'elapsed')
+
+    def __init__(self, resp, elapsed):
+        self._resp = resp
+        self.status_code = resp.status_code
+        self.headers = resp.headers
+        self.elapsed = elapsed
+
+    @property
+    def content(self):
+        try:
+            return self._resp.read()
+        except httpx.TransportError as e:
+            raise exc.ServerUnreachableException(str(e))
+
+    def close(self):
+        self._resp.close()
+
+
+class Http2Transport(object):
+
+    """Transport for Client sending requests over HTTP/2.
+
+    Concurrent requests to a host share its connections as separate
+    streams, with at most max_connections connections in total. A custom
+    httpx.Client may be passed as client, in which case the other settings
+    are ignored and it is not closed by close().
+    """
+
+    def __init__(self, max_connections=10, prior_knowledge=False,
+                 verify=True, cert=None, client=None):
+        if client is None:
+            client = httpx.Client(http1=not prior_knowledge, http2=True,
+                                  limits=_limits(max_connections),
+                                  verify=verify, cert=cert)
+            self._owns_client = True
+        else:
+            self._owns_client = False
+        self._client = client
+        self.encodings = _encodings()
+
+    def request(self, method, url, **kwargs):
+        args, stream = _to_httpx(kwargs)
+        start = _timer()
+        try:
+            # Sent streaming, so that elapsed ends at the response headers
+            # like for the other transports.
+            resp = self._client.send(
+                self._client.build_request(method, url, **args),
+                stream=True)
+            elapsed = timedelta(seconds=_timer() - start)
+            if not stream:
+                try:
+                    resp.read()
+                finally:
+                    resp.close()
+        except httpx.TimeoutException as e:
+            raise exc.TimeoutException(str(e) or 'Request timed out')
+        except httpx.TransportError as e:
+            raise exc.ServerUnreachableException(str(e))
+        return _Response(resp, elapsed)
+
+    def iter_content(self, resp, chunk_size):
+        try:
+            for chunk in resp._resp.iter_bytes(chunk_size):
+                yield chunk
+        except httpx.TransportError as e:
+            raise exc.ServerUnreachableException(str(e))
+        finally:
+            resp.close()
+
+    def close_idle(self):
+        # Idle HTTP/2 connections are few, and closed by the pool itself.
+        pass
+
+    def close(self):
+        if self._owns_client:
+            self._client.close()
+
+
+class _AsyncResponse(object):
+
+    __slots__ = ('_resp', 'status')
+
+    def __init__(self, resp):
+        self._resp = resp
+        self.status = resp.status_code
+
+    async def read(self):
+        return self._resp.content
+
+
+class _AsyncRequest(object):
+
+    def __init__(self, client, method, url, args):
+        self._client = client
+        self._method = method
+        self._url = url
+        self._args = args
+
+    async def __aenter__(self):
+        try:
+            resp = await self._client.request(self._method, self._url,
+                                              **self._args)
+        except httpx.TimeoutException as e:
+            raise exc.TimeoutException(str(e) or 'Request timed out')
+        except httpx.TransportError as e:
+            raise exc.ServerUnreachableException(str(e))
+        return _AsyncResponse(resp)
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        pass
+
+
+class AsyncHttp2Session(object):
+
+    """Session for AsyncClient sending requests over HTTP/2.
+
+    Takes the same arguments as Http2Transport, and implements the subset
+    of aiohttp.ClientSession used by AsyncClient. As AsyncClient does not
+    close sessions passed to it, close must be awaited separately.
+    """
+
+    def __init__(self, max_connections=10, prior_knowledge=False,
+                 verify=True, cert=None, client=None):
+        if client is None:
+            client = httpx.AsyncClient(http1=not prior_knowledge, http2=True,
+                                       limits=_limits(max_connections),
+                                       verify=verify, cert=cert)
+        self._client = client
+
+    def request(self, method, url, **kwargs):
+        # AsyncClient has translated the arguments for aiohttp.
+        timeout = kwargs.pop('timeout', None)
+        if timeout is not None:
+            timeout = httpx.Timeout(timeout.total,
+                                    connect=timeout.sock_connect,
+                                    read=timeout.sock_read)
+        kwargs.pop('ssl', None)
+        if 'data' in kwargs:
+            kwargs['content'] = kwargs.pop('data')
+        return _AsyncRequest(self._client, method, url,
+                             dict(kwargs, timeout=_timeout(timeout)))
+
+    async def close(self):
+        await self._client.aclose()
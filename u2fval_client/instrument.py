@@ -0,0 +1,149 @@
+# Copyright (c) 2014 Yubico AB
+# All rights reserved.
+#
+#   Redistribution and use in source and binary forms, with or
+#   without modification, are permitted provided that the following
+#   conditions are met:
+#
+#    1. Redistributions of source code must retain the above copyright
+#       notice, this list of conditions and the following disclaimer.
+#    2. Redistributions in binary form must reproduce the above
+#       copyright notice, this list of conditions and the following
+#       disclaimer in the documentation and/or other materials provided
+#       with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+"""Instrumentation of the requests made by a Client."""
+
+from collections import defaultdict
+import math
+import threading
+
+__all__ = ['Instrument', 'RequestEvent', 'LatencyHistogram']
+
+
+class RequestEvent(object):
+
+    """Describes a single client call, as passed to an Instrument.
+
+    operation is the name of the Client method, e.g. 'auth_begin'. Times
+    are in seconds: transport_time is spent inside the HTTP library
+    (connecting, sending and receiving, for all attempts). Of the last
+    attempt, headers_time is the time until the response headers were
+    received, which includes any connection setup (DNS, TCP and TLS) as
+    well as the time taken by the server, and read_time the rest, mostly
+    spent reading the response body. decode_time is spent parsing the
+    response. retries is the number of attempts made beyond the first.
+    exception is the class of any exception raised.
+    """
+
+    __slots__ = ('operation', 'method', 'url', 'start', 'status', 'retries',
+                 'bytes_out', 'bytes_in', 'transport_time', 'headers_time',
+                 'read_time', 'decode_time', 'total_time', 'exception')
+
+    def __init__(self, operation, method, url, start):
+        self.operation = operation
+        self.method = method
+        self.url = url
+        self.start = start
+        self.status = None
+        self.retries = 0
+        self.bytes_out = 0
+        self.bytes_in = 0
+        self.transport_time = 0.0
+        self.headers_time = 0.0
+        self.read_time = 0.0
+        self.decode_time = 0.0
+        self.total_time = 0.0
+        self.exception = None
+
+
+class Instrument(object):
+
+    """Base class for instruments, which are notified of every request.
+
+    Instruments are called from the thread making the request, and must be
+    thread safe when the client is shared between threads.
+    """
+
+    def before_request(self, event):
+        """Called before a request is made, with a partial event."""
+
+    def after_request(self, event):
+        """Called once a call has completed, successfully or not."""
+
+
+class LatencyHistogram(Instrument):
+
+    """Aggregates total call latency per operation into histograms.
+
+    Latencies are counted in logarithmic buckets, each growth times wider
+    than the previous one, from min_latency up to max_latency seconds. This
+    keeps memory constant, with percentiles accurate to within the bucket
+    width.
+    """
+
+    def __init__(self, min_latency=0.0001, max_latency=60, growth=1.1):
+        self._min = min_latency
+        self._log_growth = math.log(growth)
+        self._growth = growth
+        self._size = int(math.log(max_latency / min_latency) /
+                          self._log_growth) + 2
+        self._counts = defaultdict(lambda: [0] * self._size)
+        self._errors = defaultdict(int)
+        self._lock = threading.Lock()
+
+    def _bucket(self, latency):
+        if latency <= self._min:
+            return 0
+        index = int(math.log(latency / self._min) / self._log_growth) + 1
+        return min(index, self._size - 1)
+
+    def after_request(self, event):
+        bucket = self._bucket(event.total_time)
+        with self._lock:
+            self._counts[event.operation][bucket] += 1
+            if event.exception is not None:
+                self._errors[event.operation] += 1
+
+    def percentile(self, operation, percent):
+        """Returns the upper bound of the latency below which the given
+        percentage of calls to operation completed, or None.
+        """
+        with self._lock:
+            counts = list(self._counts.get(operation, ()))
+        total = sum(counts)
+        if not total:
+            return None
+        target = total * percent / 100.0
+        seen = 0
+        for index, count in enumerate(counts):
+            seen += count
+            if seen >= target:
+                return self._min * self._growth ** index
+        return self._min * self._growth ** (self._size - 1)
+
+    def summary(self):
+        """Returns count, error count and p50/p95/p99 latency per operation.
+        """
+        with self._lock:
+            operations = list(self._counts)
+        return dict((op, {
+            'count': sum(self._counts[op]),
+            'errors': self._errors.get(op, 0),
+            'p50': self.percentile(op, 50),
+            'p95': self.percentile(op, 95),
+            'p99': self.percentile(op, 99),
+        }) for op in operations)
@@ -0,0 +1,270 @@
+# Copyright (c) 2014 Yubico AB
+# All rights reserved.
+#
+#   Redistribution and use in source and binary forms, with or
+#   without modification, are permitted provided that the following
+#   conditions are met:
+#
+#    1. Redistributions of source code must retain the above copyright
+#       notice, this list of conditions and the following disclaimer.
+#    2. Redistributions in binary form must reproduce the above
+#       copyright notice, this list of conditions and the following
+#       disclaimer in the documentation and/or other materials provided
+#       with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+"""Compact, slotted representations of the data returned by the server.
+
+Models can be used in place of the plain dicts returned by Client, by
+passing models=True to it. They keep their fields in __slots__ and support
+read access by the original JSON keys (model['handle'], model.get(...)), so
+most code written against the dicts keeps working.
+
+Models round-trip to and from compact bytes with to_bytes() and
+from_bytes(), e.g. for session storage. Nested fields (such as the
+metadata and properties of a device) are kept as raw JSON by from_bytes,
+and only decoded when first accessed.
+
+Fields missing from the data read as None through their attributes, but
+unlike fields which are null, are not present for item access and are left
+out by to_dict().
+"""
+
+import json as _json
+
+__all__ = ['Model', 'Device', 'RegisterRequest', 'SignRequest',
+           'TrustedFacets', 'wrap']
+
+
+class _Raw(bytes):
+    """Undecoded JSON."""
+    __slots__ = ()
+
+
+class _Missing(object):
+    """The value of a field missing from the data."""
+    __slots__ = ()
+
+    def __reduce__(self):
+        # Unpickled as the module global, so identity checks keep working.
+        return '_MISSING'
+
+    def __repr__(self):
+        return '<missing>'
+
+
+_MISSING = _Missing()
+
+
+def _encode(value):
+    if isinstance(value, _Raw):
+        return value
+    if value is _MISSING:
+        return b''
+    return _json.dumps(value, separators=(',', ':')).encode('utf-8')
+
+
+class _Field(object):
+    """Descriptor reading a field, as None when it is missing."""
+
+    def __init__(self, slot):
+        self.slot = slot
+
+    def __get__(self, obj, cls):
+        if obj is None:
+            return self
+        value = getattr(obj, self.slot)
+        return None if value is _MISSING else value
+
+
+class _Lazy(_Field):
+    """Descriptor decoding a nested field on first access."""
+
+    def __get__(self, obj, cls):
+        if obj is None:
+            return self
+        value = getattr(obj, self.slot)
+        if isinstance(value, _Raw):
+            value = _json.loads(value.decode('utf-8'))
+            setattr(obj, self.slot, value)
+        return None if value is _MISSING else value
+
+
+class _ModelType(type):
+    def __new__(mcs, name, bases, attrs):
+        scalars = attrs.get('_scalars', ())
+        nested = attrs.get('_nested', ())
+        slots = []
+        for _, attr in scalars:
+            slots.append('_' + attr)
+            attrs[attr] = _Field('_' + attr)
+        for _, attr in nested:
+            slots.append('_' + attr)
+            attrs[attr] = _Lazy('_' + attr)
+        if not any(hasattr(base, '_extra') for base in bases):
+            slots.append('_extra')
+            attrs['extra'] = _Lazy('_extra')
+        attrs['__slots__'] = tuple(slots)
+        cls = type.__new__(mcs, name, bases, attrs)
+        cls._keys = dict((key, attr) for key, attr in
+                         getattr(cls, '_scalars', ()) +
+                         getattr(cls, '_nested', ()))
+        return cls
+
+
+# Python 2 and 3 compatible way of applying the metaclass.
+_Base = _ModelType('_Base', (object,), {'__slots__': ()})
+
+
+class Model(_Base):
+
+    """Base class for models.
+
+    Subclasses list their top level scalar fields in _scalars and their
+    nested fields in _nested, as (JSON key, attribute name) tuples. Any other
+    keys present in the data are kept in extra.
+    """
+
+    __slots__ = ()
+    _scalars = ()
+    _nested = ()
+
+    @classmethod
+    def from_dict(cls, data):
+        """Creates a model from the decoded JSON data."""
+        self = cls.__new__(cls)
+        data = dict(data)
+        for key, attr in cls._scalars + cls._nested:
+            setattr(self, '_' + attr, data.pop(key, _MISSING))
+        self._extra = data or None
+        return self
+
+    @classmethod
+    def from_bytes(cls, data):
+        """Creates a model from the output of to_bytes."""
+        self = cls.__new__(cls)
+        parts = data.split(b'\n')
+        scalars = _json.loads(parts[0].decode('utf-8'))
+        missing = ()
+        if len(parts) > len(cls._nested) + 2:
+            missing = _json.loads(parts[-1].decode('utf-8'))
+        for i, ((_, attr), value) in enumerate(zip(cls._scalars, scalars)):
+            setattr(self, '_' + attr, _MISSING if i in missing else value)
+        for (_, attr), raw in zip(cls._nested + (('', 'extra'),), parts[1:]):
+            setattr(self, '_' + attr, _Raw(raw) if raw else _MISSING)
+        return self
+
+    def to_bytes(self):
+        """Serializes the model into compact bytes. Nested fields which have
+        not been accessed are written out without being decoded.
+        """
+        scalars = [getattr(self, '_' + attr) for _, attr in self._scalars]
+        missing = [i for i, value in enumerate(scalars) if value is _MISSING]
+        parts = [_encode([None if i in missing else value
+                          for i, value in enumerate(scalars)])]
+        for _, attr in self._nested + (('', 'extra'),):
+            parts.append(_encode(getattr(self, '_' + attr)))
+        if missing:
+            # Only written when needed, as an extra line listing the
+            # positions of the missing scalars.
+            parts.append(_encode(missing))
+        return b'\n'.join(parts)
+
+    def to_dict(self):
+        """Returns the data of the model as a plain dict."""
+        data = dict(self.extra or {})
+        for key, attr in self._scalars + self._nested:
+            if getattr(self, '_' + attr) is not _MISSING:
+                data[key] = getattr(self, attr)
+        return data
+
+    def __getitem__(self, key):
+        attr = self._keys.get(key)
+        if attr is None:
+            return (self.extra or {})[key]
+        if getattr(self, '_' + attr) is _MISSING:
+            raise KeyError(key)
+        return getattr(self, attr)
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def __contains__(self, key):
+        try:
+            self[key]
+        except KeyError:
+            return False
+        return True
+
+    def __eq__(self, other):
+        if type(self) is not type(other):
+            return NotImplemented
+        return self.to_dict() == other.to_dict()
+
+    def __ne__(self, other):
+        result = self.__eq__(other)
+        return result if result is NotImplemented else not result
+
+    __hash__ = None
+
+    def __repr__(self):
+        return '%s(%r)' % (type(self).__name__, self.to_dict())
+
+
+class Device(Model):
+
+    """A registered device, as returned by list_devices and get_device."""
+
+    __slots__ = ()
+    _scalars = (('handle', 'handle'), ('created', 'created'),
+                ('lastUsed', 'last_used'), ('compromised', 'compromised'))
+    _nested = (('metadata', 'metadata'), ('properties', 'properties'))
+
+
+class RegisterRequest(Model):
+
+    """Registration request data, as returned by register_begin."""
+
+    __slots__ = ()
+    _scalars = (('appId', 'app_id'),)
+    _nested = (('registerRequests', 'register_requests'),
+               ('registeredKeys', 'registered_keys'))
+
+
+class SignRequest(Model):
+
+    """Authentication request data, as returned by auth_begin."""
+
+    __slots__ = ()
+    _scalars = (('appId', 'app_id'), ('challenge', 'challenge'))
+    _nested = (('registeredKeys', 'registered_keys'),)
+
+
+class TrustedFacets(Model):
+
+    """The trusted facet list, as returned by get_trusted_facets."""
+
+    __slots__ = ()
+    _nested = (('trustedFacets', 'trusted_facets'),)
+
+
+def wrap(cls, data):
+    """Wraps decoded JSON data, a dict or a list of dicts, in models."""
+    if isinstance(data, list):
+        return [cls.from_dict(item) for item in data]
+    return cls.from_dict(data)
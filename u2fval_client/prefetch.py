@@ -0,0 +1,142 @@
+# Copyright (c) 2014 Yubico AB
+# All rights reserved.
+#
+#   Redistribution and use in source and binary forms, with or
+#   without modification, are permitted provided that the following
+#   conditions are met:
+#
+#    1. Redistributions of source code must retain the above copyright
+#       notice, this list of conditions and the following disclaimer.
+#    2. Redistributions in binary form must reproduce the above
+#       copyright notice, this list of conditions and the following
+#       disclaimer in the documentation and/or other materials provided
+#       with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+"""Prefetching of registration and authentication requests."""
+
+from u2fval_client import exc
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import threading
+import time
+
+__all__ = ['Prefetcher']
+
+
+class _Entry(object):
+
+    __slots__ = ('future', 'args', 'expires')
+
+    def __init__(self, future, args, expires):
+        self.future = future
+        self.args = args
+        self.expires = expires
+
+
+class Prefetcher(object):
+
+    """Fetches challenges for users ahead of when they are needed.
+
+    Calling prefetch_auth (or prefetch_register) starts the corresponding
+    auth_begin (or register_begin) call in the background, for instance as
+    soon as the password of a user has been verified. A later call to
+    auth_begin (or register_begin) with the same arguments hands out the
+    prefetched result, waiting for it if it is still in flight, and falls
+    back to calling the server directly otherwise.
+
+    Each prefetched result is handed out at most once, and is discarded
+    lifetime seconds after the request was made. This should not exceed the
+    time the server keeps challenges for. At most maxsize results are kept,
+    dropping the oldest ones when full.
+    """
+
+    def __init__(self, client, lifetime=60, maxsize=10000, workers=4):
+        self._client = client
+        self._lifetime = lifetime
+        self._maxsize = maxsize
+        self._executor = ThreadPoolExecutor(workers)
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def close(self):
+        """Stops the prefetcher, discarding all prefetched results."""
+        with self._lock:
+            for entry in self._entries.values():
+                entry.future.cancel()
+            self._entries.clear()
+        self._executor.shutdown(wait=False)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _prefetch(self, key, func, args):
+        expires = time.time() + self._lifetime
+        future = self._executor.submit(func, *args)
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                old.future.cancel()
+            while len(self._entries) >= self._maxsize:
+                _, evicted = self._entries.popitem(last=False)
+                evicted.future.cancel()
+            self._entries[key] = _Entry(future, args, expires)
+
+    def _take(self, key, func, args):
+        with self._lock:
+            entry = self._entries.pop(key, None)
+        if entry is not None and entry.args == args and \
+                entry.expires > time.time():
+            try:
+                result = entry.future.result()
+            except exc.U2fValClientException:
+                pass  # Failed to reach the server, try again.
+            except exc.U2fValException:
+                self.hits += 1
+                raise
+            else:
+                self.hits += 1
+                return result
+        self.misses += 1
+        return func(*args)
+
+    def prefetch_auth(self, username, properties=None, challenge=None,
+                      handles=None):
+        """Starts fetching authentication request data for a user."""
+        self._prefetch(('auth', username), self._client.auth_begin,
+                       (username, properties, challenge, handles))
+
+    def auth_begin(self, username, properties=None, challenge=None,
+                   handles=None):
+        """Like Client.auth_begin, using prefetched data when possible."""
+        return self._take(('auth', username), self._client.auth_begin,
+                          (username, properties, challenge, handles))
+
+    def prefetch_register(self, username, properties=None, challenge=None):
+        """Starts fetching registration request data for a user."""
+        self._prefetch(('register', username), self._client.register_begin,
+                       (username, properties, challenge))
+
+    def register_begin(self, username, properties=None, challenge=None):
+        """Like Client.register_begin, using prefetched data when possible.
+        """
+        return self._take(('register', username),
+                          self._client.register_begin,
+                          (username, properties, challenge))
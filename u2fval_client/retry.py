@@ -0,0 +1,117 @@
+# Copyright (c) 2014 Yubico AB
+# All rights reserved.
+#
+#   Redistribution and use in source and binary forms, with or
+#   without modification, are permitted provided that the following
+#   conditions are met:
+#
+#    1. Redistributions of source code must retain the above copyright
+#       notice, this list of conditions and the following disclaimer.
+#    2. Redistributions in binary form must reproduce the above
+#       copyright notice, this list of conditions and the following
+#       disclaimer in the documentation and/or other materials provided
+#       with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+"""Retry policies for failed requests."""
+
+from email.utils import parsedate_tz, mktime_tz
+import random
+import threading
+import time
+
+__all__ = ['RetryPolicy']
+
+IDEMPOTENT_METHODS = frozenset(['GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE'])
+
+
+def _parse_retry_after(value):
+    if value is None:
+        return None
+    try:
+        return max(0, int(value))
+    except ValueError:
+        date = parsedate_tz(value)
+        if date is None:
+            return None
+        return max(0, mktime_tz(date) - time.time())
+
+
+class RetryPolicy(object):
+
+    """Decides when and how long to wait before a failed request is retried.
+
+    A request is attempted at most max_attempts times. It is retried when the
+    server cannot be reached, or responds with a status in retry_on_status.
+    The wait before retry n is drawn uniformly between zero and
+    min(backoff_cap, backoff_base * 2 ** n) (full jitter), unless the server
+    sent a Retry-After header, which is then honored up to max_retry_after
+    seconds.
+
+    Only idempotent requests are retried. Setting retry_unsafe also allows
+    POST requests to be retried, which may cause them to be processed twice
+    by the server.
+
+    The total number of retries and seconds spent waiting are available
+    through stats(). A policy may be shared between clients.
+    """
+
+    def __init__(self, max_attempts=3, backoff_base=0.1, backoff_cap=2.0,
+                 retry_on_status=(502, 503, 504), max_retry_after=10,
+                 retry_unsafe=False):
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self.retry_on_status = frozenset(retry_on_status)
+        self.max_retry_after = max_retry_after
+        self.retry_unsafe = retry_unsafe
+        self._lock = threading.Lock()
+        self.retries = 0
+        self.retry_time = 0.0
+
+    def can_retry(self, method, attempt):
+        """Returns True if a request which failed on the given attempt
+        (starting at 0) may be retried.
+        """
+        if attempt + 1 >= self.max_attempts:
+            return False
+        return self.retry_unsafe or method.upper() in IDEMPOTENT_METHODS
+
+    def delay(self, attempt, retry_after=None):
+        """Returns the number of seconds to wait before retrying."""
+        seconds = _parse_retry_after(retry_after)
+        if seconds is not None:
+            return min(seconds, self.max_retry_after)
+        return random.uniform(
+            0, min(self.backoff_cap, self.backoff_base * 2 ** attempt))
+
+    def wait(self, attempt, retry_after=None, limit=None):
+        """Sleeps before retrying, keeping count of retries and time spent.
+
+        Returns False without sleeping if the wait would exceed limit
+        seconds, in which case the request should not be retried.
+        """
+        seconds = self.delay(attempt, retry_after)
+        if limit is not None and seconds >= limit:
+            return False
+        with self._lock:
+            self.retries += 1
+            self.retry_time += seconds
+        time.sleep(seconds)
+        return True
+
+    def stats(self):
+        """Returns the number of retries made and seconds spent waiting."""
+        return {'retries': self.retries, 'retry_time': self.retry_time}
@@ -0,0 +1,357 @@
+# Copyright (c) 2014 Yubico AB
+# All rights reserved.
+#
+#   Redistribution and use in source and binary forms, with or
+#   without modification, are permitted provided that the following
+#   conditions are met:
+#
+#    1. Redistributions of source code must retain the above copyright
+#       notice, this list of conditions and the following disclaimer.
+#    2. Redistributions in binary form must reproduce the above
+#       copyright notice, this list of conditions and the following
+#       disclaimer in the documentation and/or other materials provided
+#       with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+"""Transports carrying the requests made by Client.
+
+A transport has a request method taking the method, URL and requests style
+keyword arguments (headers, params, data, timeout, auth, verify, stream,
+...) and returning a response with status_code, headers, content and
+elapsed attributes, elapsed being the time until the response headers were
+received. Transport errors are raised as
+exc.ServerUnreachableException, or exc.TimeoutException for timeouts.
+iter_content streams the body of a response made with stream=True, and
+close_idle and close release the connections held by the transport. The
+encodings attribute lists the Content-Encodings which the transport
+decompresses, for Client to ask for when given a compression.Compression.
+
+Importing this module does not import requests, which RequestsTransport
+only loads when it makes its first request. HttpClientTransport only uses
+the standard library.
+"""
+
+from u2fval_client import exc
+from u2fval_client.compression import Decompressor, available_encodings
+from u2fval_client.retry import IDEMPOTENT_METHODS
+from base64 import b64encode
+from datetime import timedelta
+from timeit import default_timer as _timer
+import errno
+import select
+import socket
+import threading
+
+try:
+    import http.client as http_client
+    from urllib.parse import urlencode, urlsplit
+except ImportError:  # Python 2
+    import httplib as http_client
+    from urllib import urlencode
+    from urlparse import urlsplit
+
+__all__ = ['RequestsTransport', 'HttpClientTransport']
+
+
+class RequestsTransport(object):
+
+    """HTTP/1.1 transport over a pooled requests.Session.
+
+    The pool is sized by pool_connections (number of hosts to keep pools
+    for) and pool_maxsize (number of connections kept alive per host). With
+    pool_block set, no more than pool_maxsize concurrent connections are
+    opened to a single host. A custom session may be passed in, in which
+    case the pool settings are ignored and the session is not closed by
+    close().
+    """
+
+    # urllib3 may decompress more, depending on its version and on the
+    # packages installed, but is not imported until the first request.
+    encodings = ('gzip', 'deflate')
+
+    def __init__(self, session=None, pool_connections=1, pool_maxsize=10,
+                 pool_block=False):
+        self._session = session
+        self._owns_session = session is None
+        self._pool_args = (pool_connections, pool_maxsize, pool_block)
+        self._requests = None
+        self._lock = threading.Lock()
+
+    def _get_session(self):
+        if self._requests is None:
+            with self._lock:
+                if self._requests is None:
+                    import requests
+                    from requests.adapters import HTTPAdapter
+                    if self._session is None:
+                        session = requests.Session()
+                        adapter = HTTPAdapter(*self._pool_args)
+                        session.mount('http://', adapter)
+                        session.mount('https://', adapter)
+                        self._session = session
+                    self._requests = requests
+        return self._session
+
+    def request(self, method, url, **kwargs):
+        session = self._get_session()
+        requests = self._requests
+        try:
+            return session.request(method, url, **kwargs)
+        except requests.Timeout as e:
+            raise exc.TimeoutException(str(e))
+        except requests.ConnectionError as e:
+            raise exc.ServerUnreachableException(str(e))
+
+    def iter_content(self, resp, chunk_size):
+        try:
+            for chunk in resp.iter_content(chunk_size):
+                yield chunk
+        except self._requests.RequestException as e:
+            raise exc.ServerUnreachableException(str(e))
+        finally:
+            resp.close()
+
+    def close_idle(self):
+        if self._session is not None:
+            for adapter in set(self._session.adapters.values()):
+                adapter.close()
+
+    def close(self):
+        if self._owns_session and self._session is not None:
+            self._session.close()
+
+
+def _is_stale(e):
+    """Tells if an error means that a kept alive connection was closed by
+    the server, which may have happened after it read the request.
+    """
+    return isinstance(e, http_client.BadStatusLine) or \
+        getattr(e, 'errno', None) in (errno.EPIPE, errno.ECONNRESET)
+
+
+def _is_dropped(sock):
+    """Tells if an idle connection has been closed by the server, in which
+    case it is readable (at EOF), as checked by urllib3 before reuse.
+    """
+    try:
+        if hasattr(select, 'poll'):
+            poller = select.poll()
+            poller.register(sock, select.POLLIN)
+            return bool(poller.poll(0))
+        return bool(select.select([sock], [], [], 0)[0])
+    except (ValueError, select.error):
+        return True
+
+
+class _Response(object):
+
+    """A response read by HttpClientTransport."""
+
+    __slots__ = ('status_code', 'headers', 'elapsed', '_resp', '_release',
+                 '_content')
+
+    def __init__(self, resp, elapsed, release):
+        self.status_code = resp.status
+        self.headers = resp.msg
+        self.elapsed = elapsed
+        self._resp = resp
+        self._release = release
+        self._content = None
+
+    def _decoder(self):
+        encoding = self.headers.get('Content-Encoding')
+        if encoding is None or encoding.strip().lower() == 'identity':
+            return None
+        try:
+            return Decompressor(encoding)
+        except (ValueError, ImportError) as e:
+            self.close(False)
+            raise exc.InvalidResponseException(str(e))
+
+    def _decode(self, func, *args):
+        try:
+            return func(*args)
+        except Exception as e:
+            self.close(False)
+            raise exc.InvalidResponseException(
+                'Unable to decompress response: %s' % e)
+
+    @property
+    def content(self):
+        if self._content is None:
+            decoder = self._decoder()
+            try:
+                content = self._resp.read()
+            except (http_client.HTTPException, socket.error) as e:
+                self.close(False)
+                raise exc.ServerUnreachableException(str(e))
+            if decoder is not None:
+                content = self._decode(decoder.decompress, content) + \
+                    self._decode(decoder.flush)
+            self._content = content
+            self.close()
+        return self._content
+
+    def close(self, reusable=True):
+        """Releases the connection, which is kept alive if the response was
+        read completely.
+        """
+        if self._release is not None:
+            resp = self._resp
+            self._release(reusable and resp.isclosed() and
+                          not resp.will_close)
+            self._release = None
+
+
+class HttpClientTransport(object):
+
+    """Minimal HTTP/1.1 transport built on the standard library http.client.
+
+    Keeps at most maxsize idle connections alive per host. TLS certificates
+    are verified unless verify is False, against the CA bundle at verify if
+    it is a path, and cert is a client certificate (a path or a tuple of
+    certificate and key paths). These replace any verify and cert in
+    extra_args. Only basic authentication is supported. Compressed responses
+    (see the compression module) are decompressed as they are read.
+    """
+
+    def __init__(self, maxsize=10, verify=True, cert=None):
+        self.encodings = tuple(available_encodings())
+        self._maxsize = maxsize
+        self._verify = verify
+        self._cert = cert
+        self._context = None
+        self._pools = {}
+        self._lock = threading.Lock()
+
+    def _ssl_context(self):
+        if self._context is None:
+            import ssl
+            if isinstance(self._verify, str):
+                context = ssl.create_default_context(cafile=self._verify)
+            else:
+                context = ssl.create_default_context()
+            if self._verify is False:
+                context.check_hostname = False
+                context.verify_mode = ssl.CERT_NONE
+            if isinstance(self._cert, tuple):
+                context.load_cert_chain(*self._cert)
+            elif self._cert is not None:
+                context.load_cert_chain(self._cert)
+            self._context = context
+        return self._context
+
+    def _connection(self, scheme, netloc, timeout):
+        if scheme == 'https':
+            return http_client.HTTPSConnection(netloc, timeout=timeout,
+                                               context=self._ssl_context())
+        return http_client.HTTPConnection(netloc, timeout=timeout)
+
+    def _release(self, pool, conn, reusable):
+        if reusable:
+            with self._lock:
+                if len(pool) < self._maxsize:
+                    pool.append(conn)
+                    return
+        conn.close()
+
+    def request(self, method, url, params=None, data=None, headers=None,
+                timeout=None, auth=None, stream=False, verify=None,
+                cert=None):
+        scheme, netloc, path, query, _ = urlsplit(url)
+        if params:
+            query = (query + '&' if query else '') + urlencode(params, True)
+        if query:
+            path += '?' + query
+        if auth is not None:
+            if not isinstance(auth, tuple):
+                raise ValueError('Only basic authentication is supported')
+            token = b64encode(':'.join(auth).encode('utf-8'))
+            headers = dict(headers or {})
+            headers['Authorization'] = 'Basic ' + token.decode('ascii')
+        if isinstance(timeout, tuple):
+            connect_timeout, read_timeout = timeout
+        else:
+            connect_timeout = read_timeout = timeout
+
+        with self._lock:
+            pool = self._pools.setdefault((scheme, netloc), [])
+            conn = pool.pop() if pool else None
+        if conn is not None and (conn.sock is None or _is_dropped(conn.sock)):
+            conn.close()
+            conn = None
+        start = _timer()
+        while True:
+            reused = conn is not None
+            if conn is None:
+                conn = self._connection(scheme, netloc, connect_timeout)
+            try:
+                if conn.sock is None:
+                    conn.connect()
+                conn.sock.settimeout(read_timeout)
+                conn.request(method, path, data, headers or {})
+                resp = conn.getresponse()
+            except socket.timeout as e:
+                conn.close()
+                raise exc.TimeoutException(str(e) or 'Request timed out')
+            except (http_client.HTTPException, socket.error) as e:
+                conn.close()
+                # The server may already have processed the request, so it
+                # is only sent again if that is safe.
+                if reused and _is_stale(e) and \
+                        method.upper() in IDEMPOTENT_METHODS:
+                    conn = None
+                    continue
+                raise exc.ServerUnreachableException(str(e))
+            break
+
+        response = _Response(resp, timedelta(seconds=_timer() - start),
+                             lambda reusable: self._release(pool, conn,
+                                                            reusable))
+        if not stream:
+            response.content
+        return response
+
+    def iter_content(self, resp, chunk_size):
+        try:
+            decoder = resp._decoder()
+            while True:
+                chunk = resp._resp.read(chunk_size)
+                if not chunk:
+                    break
+                if decoder is not None:
+                    chunk = resp._decode(decoder.decompress, chunk)
+                if chunk:
+                    yield chunk
+            if decoder is not None:
+                chunk = resp._decode(decoder.flush)
+                if chunk:
+                    yield chunk
+        except (http_client.HTTPException, socket.error) as e:
+            resp.close(False)
+            raise exc.ServerUnreachableException(str(e))
+        finally:
+            resp.close()
+
+    def close_idle(self):
+        with self._lock:
+            idle = []
+            for pool in self._pools.values():
+                idle.extend(pool)
+                del pool[:]
+        for conn in idle:
+            conn.close()
+
+    close = close_idle